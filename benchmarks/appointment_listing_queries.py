@@ -0,0 +1,81 @@
+"""Statement budget for the appointment listing pages.
+
+Seeds patients and appointments, then renders every listing page and counts
+the SQL statements it issues. Exits non-zero if a page goes over budget,
+which is what happens as soon as a template starts lazy loading per row.
+"""
+import sys
+from datetime import date, datetime, time, timedelta
+
+from benchmarks.common import count_statements, load_app, login
+
+APPOINTMENTS = 40
+
+# Statements per page, including the identity lookup of the role guard
+# (local_services.identity): one query for the user and, for a doctor,
+# their profile, which the doctor pages would otherwise load themselves.
+BUDGETS = {
+    '/admin': 3,
+    '/admin/appointments': 2,
+    '/doctor': 3,
+    '/doctor/appointments': 2,
+    '/my-appointments': 2,
+}
+
+
+def seed(db):
+    from local_models import Appointment, Doctor, TimeSlot, User
+
+    doctor = Doctor.query.first()
+    patient = None
+    for i in range(APPOINTMENTS):
+        patient = User(
+            username=f'bench{i}', email=f'bench{i}@example.com',
+            name=f'Bench Patient {i}', role='patient',
+        )
+        patient.set_password('password1')
+        db.session.add(patient)
+        starts_at = datetime.combine(date.today() + timedelta(days=i % 5), time(8 + i % 10, i % 60))
+        slot = TimeSlot(
+            doctor_id=doctor.id, starts_at=starts_at, ends_at=starts_at + timedelta(minutes=30),
+            is_available=False,
+        )
+        db.session.add(slot)
+        db.session.flush()
+        db.session.add(Appointment(patient_id=patient.id, doctor_id=doctor.id, time_slot_id=slot.id))
+    db.session.commit()
+    return patient.email
+
+
+def main():
+    app = load_app()
+    from local_db import db
+
+    with app.app_context():
+        patient_email = seed(db)
+        engine = db.engine
+
+    logins = {
+        '/admin': ('admin@clinic.com', 'admin123', 'admin'),
+        '/admin/appointments': ('admin@clinic.com', 'admin123', 'admin'),
+        '/doctor': ('doctor@clinic.com', 'doctor123', 'doctor'),
+        '/doctor/appointments': ('doctor@clinic.com', 'doctor123', 'doctor'),
+        '/my-appointments': (patient_email, 'password1', 'patient'),
+    }
+
+    failures = 0
+    for path, budget in BUDGETS.items():
+        client = app.test_client()
+        login(client, *logins[path])
+        with count_statements(engine) as statements:
+            response = client.get(path)
+        used = len(statements)
+        ok = response.status_code == 200 and used <= budget
+        failures += not ok
+        print(f"{'ok  ' if ok else 'FAIL'} {path:<24} {used:>3} statements (budget {budget}, HTTP {response.status_code})")
+
+    return 1 if failures else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
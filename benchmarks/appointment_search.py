@@ -0,0 +1,182 @@
+"""Appointment search box: indexed search vs. ILIKE over the joined tables.
+
+Bulk-loads N appointments spread over P patients and D doctors in a few
+clinics, builds the search index, then times the admin appointment
+search (best of three) for a handful of terms two ways:
+
+* ilike: the joins and '%term%' ILIKEs the route would need without an
+  index (patient name/email/phone, doctor name, clinic name), and
+* indexed: local_services.search.matching() as the routes use it,
+
+and finally checks that the index follows ORM writes: a new booking, a
+patient rename, a clinic rename and a deleted appointment.
+
+    python -m benchmarks.appointment_search --appointments 1000000
+"""
+import argparse
+import random
+import sys
+import time
+from datetime import date, datetime, timedelta
+
+from benchmarks.common import load_app
+
+FIRST = ('James', 'Mary', 'Robert', 'Patricia', 'John', 'Jennifer', 'Michael', 'Linda', 'David', 'Elizabeth',
+         'William', 'Barbara', 'Richard', 'Susan', 'Joseph', 'Jessica', 'Thomas', 'Sarah', 'Charles', 'Karen')
+LAST = ('Smith', 'Johnson', 'Williams', 'Brown', 'Jones', 'Garcia', 'Miller', 'Davis', 'Rodriguez', 'Martinez',
+        'Hernandez', 'Lopez', 'Gonzalez', 'Wilson', 'Anderson', 'Thomas', 'Taylor', 'Moore', 'Jackson', 'Martin')
+
+
+def seed(db, appointments, patients, doctors, clinics):
+    from local_models import Appointment, Clinic, Doctor, TimeSlot, User
+    from local_services.search import rebuild
+    from local_services.stats import reconcile
+
+    rng = random.Random(7)
+    next_user = (db.session.query(db.func.max(User.id)).scalar() or 0) + 1
+    first_clinic = (db.session.query(db.func.max(Clinic.id)).scalar() or 0) + 1
+    db.session.execute(db.insert(Clinic), [
+        {'id': first_clinic + i, 'name': f'{LAST[i % len(LAST)]} Medical Center {i}', 'address': 'x'}
+        for i in range(clinics)
+    ])
+    users = []
+    for i in range(patients):
+        first, last = rng.choice(FIRST), rng.choice(LAST)
+        users.append({'id': next_user + i, 'username': f'p{i}', 'email': f'{first}.{last}{i}@example.com'.lower(),
+                      'name': f'{first} {last}', 'phone': f'555-{i:07d}', 'role': 'patient', 'password_hash': 'x'})
+    for i in range(doctors):
+        users.append({'id': next_user + patients + i, 'username': f'd{i}', 'email': f'doc{i}@example.com',
+                      'name': f'Dr. {rng.choice(FIRST)} {rng.choice(LAST)}', 'role': 'doctor', 'password_hash': 'x'})
+    db.session.execute(db.insert(User), users)
+    first_doctor = (db.session.query(db.func.max(Doctor.id)).scalar() or 0) + 1
+    db.session.execute(db.insert(Doctor), [
+        {'id': first_doctor + i, 'user_id': next_user + patients + i, 'clinic_id': first_clinic + i % clinics,
+         'specialization': 'General Medicine'} for i in range(doctors)
+    ])
+
+    first_slot = (db.session.query(db.func.max(TimeSlot.id)).scalar() or 0) + 1
+    start = datetime.combine(date.today(), datetime.min.time()) - timedelta(days=365)
+    for chunk in range(0, appointments, 50000):
+        slots, rows = [], []
+        for i in range(chunk, min(chunk + 50000, appointments)):
+            doctor_id = first_doctor + i % doctors
+            starts_at = start + timedelta(minutes=30 * (i // doctors))
+            slots.append({'id': first_slot + i, 'doctor_id': doctor_id, 'starts_at': starts_at,
+                          'ends_at': starts_at + timedelta(minutes=30), 'is_available': False})
+            rows.append({'patient_id': next_user + rng.randrange(patients), 'doctor_id': doctor_id,
+                         'time_slot_id': first_slot + i, 'status': 'completed',
+                         'created_at': starts_at - timedelta(days=7)})
+        db.session.execute(db.insert(TimeSlot), slots)
+        db.session.execute(db.insert(Appointment), rows)
+    reconcile()
+    started = time.perf_counter()
+    rebuild()
+    db.session.commit()
+    return time.perf_counter() - started
+
+
+def ilike_search(term):
+    from sqlalchemy.orm import aliased
+    from local_db import db
+    from local_models import Appointment, Clinic, Doctor, User
+    from local_services.appointments import appointment_listing_query
+
+    patient, doctor_user = aliased(User), aliased(User)
+    pattern = f'%{term}%'
+    return (
+        appointment_listing_query()
+        .join(patient, Appointment.patient_id == patient.id)
+        .join(Doctor, Appointment.doctor_id == Doctor.id)
+        .join(doctor_user, Doctor.user_id == doctor_user.id)
+        .join(Clinic, Doctor.clinic_id == Clinic.id)
+        .filter(db.or_(patient.name.ilike(pattern), patient.email.ilike(pattern), patient.phone.ilike(pattern),
+                       doctor_user.name.ilike(pattern), Clinic.name.ilike(pattern)))
+    )
+
+
+def indexed_search(term):
+    from local_services.appointments import appointment_listing_query
+    from local_services.search import matching
+
+    return appointment_listing_query().filter(matching(term))
+
+
+def timed_page(make_query, term, repeat=3):
+    from local_services.appointments import paginate_appointments
+
+    best = None
+    for _ in range(repeat):
+        started = time.perf_counter()
+        page = paginate_appointments(make_query(term), per_page=10)
+        elapsed = (time.perf_counter() - started) * 1000
+        best = elapsed if best is None else min(best, elapsed)
+    return best, [appointment.id for appointment in page.items]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--appointments', type=int, default=200000)
+    parser.add_argument('--patients', type=int, default=50000)
+    parser.add_argument('--doctors', type=int, default=200)
+    parser.add_argument('--clinics', type=int, default=10)
+    args = parser.parse_args()
+
+    app = load_app()
+    from local_db import db
+    from local_models import Appointment, Clinic, User
+
+    failures = 0
+    with app.app_context():
+        rebuild_seconds = seed(db, args.appointments, args.patients, args.doctors, args.clinics)
+        print(f'index built for {args.appointments} appointments in {rebuild_seconds:.1f}s')
+
+        patient = User.query.filter_by(role='patient', username='p123').first()
+        # Single words: for several words the index ANDs them anywhere in the
+        # document while the ILIKE baseline looks for the phrase in one column
+        terms = [patient.name.split()[0], patient.email.split('@')[0], patient.phone, 'Garcia', 'ja',
+                 'zzz-no-match']
+        print(f"{'term':28} {'ilike ms':>9} {'indexed ms':>11}")
+        for term in terms:
+            ilike_ms, ilike_ids = timed_page(ilike_search, term)
+            indexed_ms, indexed_ids = timed_page(indexed_search, term)
+            same = ilike_ids == indexed_ids
+            failures += not same
+            print(f"{term:28} {ilike_ms:9.1f} {indexed_ms:11.1f}{'' if same else '  FAIL results differ'}")
+
+        # The index follows ORM writes
+        from local_services.booking import book_slot
+        from local_models import Doctor, TimeSlot
+        doctor = Doctor.query.first()
+        slot = TimeSlot(doctor_id=doctor.id, starts_at=datetime(2031, 1, 1, 9), ends_at=datetime(2031, 1, 1, 9, 30))
+        db.session.add(slot)
+        newcomer = User(username='zoe', email='zq@example.com', name='Zoe Quinn', role='patient',
+                        password_hash='x')
+        db.session.add(newcomer)
+        db.session.flush()
+        booked = book_slot(slot.id, doctor.id, newcomer.id)
+        db.session.commit()
+
+        def found(term, appointment_id):
+            return appointment_id in {a.id for a in indexed_search(term).limit(1000)}
+
+        checks = [('new booking is searchable', found('Zoe Quinn', booked.id))]
+        newcomer.name = 'Zoe Whitfield'
+        db.session.commit()
+        checks.append(('patient rename is searchable', found('Whitfield', booked.id)
+                       and not found('Quinn', booked.id)))
+        doctor.clinic.name = 'Riverside Health'
+        db.session.commit()
+        checks.append(('clinic rename is searchable', found('Riverside', booked.id)))
+        appointment = db.session.get(Appointment, booked.id)
+        db.session.delete(appointment)
+        db.session.commit()
+        checks.append(('deleted appointment is gone', not found('Whitfield', booked.id)))
+        for label, ok in checks:
+            failures += not ok
+            print(f"{'ok  ' if ok else 'FAIL'} {label}")
+
+    return 1 if failures else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
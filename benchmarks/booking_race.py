@@ -0,0 +1,109 @@
+"""Concurrency stress test for slot booking.
+
+Fires N threads at the same open slot at once, for several rounds, and
+reports booking throughput and how many slots ended up double-booked.
+With the atomic claim in local_services.booking the double-booking count
+must be zero; ``--naive`` runs the old read-then-write flow for contrast.
+
+    python -m benchmarks.booking_race --threads 16 --rounds 50
+"""
+import argparse
+import sys
+import threading
+import time
+from datetime import date, datetime, timedelta
+
+from benchmarks.common import load_app
+
+
+def naive_book(db, Appointment, TimeSlot, slot_id, doctor_id, patient_id):
+    # The pre-fix confirm_booking: check, then write in a separate step.
+    slot = db.session.get(TimeSlot, slot_id)
+    if not slot.is_available:
+        return None
+    time.sleep(0.001)
+    slot.is_available = False
+    appointment = Appointment(patient_id=patient_id, doctor_id=doctor_id, time_slot_id=slot_id)
+    db.session.add(appointment)
+    return appointment
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--threads', type=int, default=16)
+    parser.add_argument('--rounds', type=int, default=50)
+    parser.add_argument('--naive', action='store_true', help='use the old read-then-write booking flow')
+    args = parser.parse_args()
+
+    app = load_app()
+    from local_db import db
+    from local_models import Appointment, Doctor, TimeSlot, User
+    from local_services.booking import book_slot
+
+    with app.app_context():
+        doctor_id = Doctor.query.first().id
+        patient_ids = []
+        for i in range(args.threads):
+            user = User(username=f'race{i}', email=f'race{i}@example.com',
+                        name=f'Race Patient {i}', role='patient', password_hash='x')
+            db.session.add(user)
+            db.session.flush()
+            patient_ids.append(user.id)
+        slot_ids = []
+        for i in range(args.rounds):
+            starts_at = datetime.combine(date.today(), datetime.min.time()) + timedelta(days=30 + i, hours=10)
+            slot = TimeSlot(doctor_id=doctor_id, starts_at=starts_at,
+                            ends_at=starts_at + timedelta(minutes=30), is_available=True)
+            db.session.add(slot)
+            db.session.flush()
+            slot_ids.append(slot.id)
+        db.session.commit()
+
+    won = [0] * args.threads
+    errors = [0] * args.threads
+
+    def worker(index, barrier):
+        for slot_id in slot_ids:
+            barrier.wait()
+            with app.app_context():
+                try:
+                    if args.naive:
+                        appointment = naive_book(db, Appointment, TimeSlot, slot_id, doctor_id, patient_ids[index])
+                    else:
+                        appointment = book_slot(slot_id, doctor_id, patient_ids[index])
+                    if appointment is None:
+                        db.session.rollback()
+                    else:
+                        db.session.commit()
+                        won[index] += 1
+                except Exception:
+                    db.session.rollback()
+                    errors[index] += 1
+
+    barrier = threading.Barrier(args.threads)
+    threads = [threading.Thread(target=worker, args=(i, barrier)) for i in range(args.threads)]
+    started = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    elapsed = time.perf_counter() - started
+
+    with app.app_context():
+        per_slot = db.session.query(Appointment.time_slot_id, db.func.count()).filter(
+            Appointment.time_slot_id.in_(slot_ids)
+        ).group_by(Appointment.time_slot_id).all()
+    double_booked = sum(1 for _, count in per_slot if count > 1)
+    attempts = args.threads * args.rounds
+
+    print(f"mode:            {'naive read-then-write' if args.naive else 'atomic claim'}")
+    print(f'threads x slots: {args.threads} x {args.rounds}')
+    print(f'attempts/sec:    {attempts / elapsed:,.0f}')
+    print(f'bookings:        {sum(won)} (slots booked: {len(per_slot)}/{args.rounds})')
+    print(f'errors:          {sum(errors)}')
+    print(f'double-booked:   {double_booked}')
+    return 1 if double_booked else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,98 @@
+"""Back/forward through the booking pages: full render vs. revalidation.
+
+Seeds D doctors with a month of slots, then for select-clinic,
+select-doctor and select-time compares a plain GET with a GET carrying
+the ETag of the previous answer (what the browser sends when it
+revalidates), by statements, bytes and time. Then checks the tags go
+stale when they should: a booking with the doctor, and a tag whose
+first slot has started.
+
+    python -m benchmarks.booking_revalidation --doctors 20 --iterations 200
+"""
+import argparse
+import sys
+import time
+
+from benchmarks.common import count_statements, load_app, login
+from benchmarks.serving_throughput import seed
+
+
+def measure(app, client, label, path, iterations, headers=None):
+    from local_db import db
+
+    with app.app_context():
+        engine = db.engine
+    response = client.get(path, headers=headers)
+    with count_statements(engine) as statements:
+        client.get(path, headers=headers)
+    started = time.perf_counter()
+    for _ in range(iterations):
+        client.get(path, headers=headers)
+    per_call = (time.perf_counter() - started) / iterations * 1000
+    print(f'{label:<44} {response.status_code:4} {len(statements):6} {len(response.data):8} {per_call:8.2f}')
+    return response
+
+
+def check(label, status, expected):
+    print(f'{label:<60} {status} ({"ok" if status == expected else "WRONG"})')
+    return status == expected
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--doctors', type=int, default=20, help='doctors in the clinic')
+    parser.add_argument('--iterations', type=int, default=200)
+    args = parser.parse_args()
+
+    app = load_app(config={'METRICS_ENABLED': False, 'SQL_PROFILE': False})
+    from local_db import db
+    from local_models import Doctor, TimeSlot, User
+    from local_services.booking import book_slot
+    with app.app_context():
+        clinic_id = seed(db, 1, args.doctors, 1)[0]
+        doctor_id = Doctor.query.filter_by(clinic_id=clinic_id).first().id
+        other_doctor_id = Doctor.query.filter(Doctor.clinic_id == clinic_id, Doctor.id != doctor_id).first().id
+
+    client = app.test_client()
+    login(client, 'pat0@example.com', 'patient123', 'patient')
+    pages = {
+        'select-clinic': '/book/select-clinic',
+        'select-doctor': f'/book/select-doctor/{clinic_id}',
+        'select-time': f'/book/select-time/{doctor_id}',
+    }
+    print(f"{'request':<44} {'code':>4} {'stmts':>6} {'bytes':>8} {'ms':>8}")
+    etags = {}
+    for name, path in pages.items():
+        response = measure(app, client, f'GET {path}', path, args.iterations)
+        etags[name] = response.headers['ETag']
+        measure(app, client, f'GET {path} (If-None-Match)', path, args.iterations,
+                headers={'If-None-Match': etags[name]})
+    print()
+
+    ok = True
+    select_time = pages['select-time']
+    with app.app_context():
+        slot = TimeSlot.query.filter_by(doctor_id=other_doctor_id, is_available=True).first()
+        book_slot(slot.id, other_doctor_id, User.query.filter_by(email='pat0@example.com').one().id)
+        db.session.commit()
+    ok &= check('select-time after a booking with another doctor',
+                client.get(select_time, headers={'If-None-Match': etags['select-time']}).status_code, 304)
+    with app.app_context():
+        slot = TimeSlot.query.filter_by(doctor_id=doctor_id, is_available=True).first()
+        book_slot(slot.id, doctor_id, User.query.filter_by(email='pat0@example.com').one().id)
+        db.session.commit()
+    response = client.get(select_time, headers={'If-None-Match': etags['select-time']})
+    ok &= check('select-time after a booking with this doctor', response.status_code, 200)
+    # The same versions, but the first slot listed started a second ago
+    base = response.headers['ETag'].strip('"').rpartition('-')[0]
+    started = f'"{base}-{int(time.time()) - 1}"'
+    ok &= check('select-time with a tag whose first slot has started',
+                client.get(select_time, headers={'If-None-Match': started}).status_code, 200)
+    ok &= check('select-clinic after bookings',
+                client.get(pages['select-clinic'], headers={'If-None-Match': etags['select-clinic']}).status_code,
+                304)
+    return 0 if ok else 1
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,133 @@
+"""Worker cold start: time from process start to the first served request.
+
+Starts W worker processes at once, as gunicorn does, each of which
+builds the app, serves it on its own port and answers GET /login. Three
+ways of booting are compared:
+
+* factory: create_app() only, on an already prepared database (what
+  workers do now),
+* setup on boot, existing db: create_app() plus create_schema() and
+  seed_demo_data() in every worker, as importing local_app used to do,
+* setup on boot, fresh db: the same against an empty database, where
+  the workers race each other to create and seed it.
+
+For each it prints the median and worst time to first response, the
+statements every worker ran before serving, and how many workers died.
+
+    python -m benchmarks.cold_start --workers 4 --rounds 5
+"""
+import argparse
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+import urllib.request
+
+from benchmarks.common import ROOT, load_app
+
+
+def serve(database_url, setup):
+    # Child process: one "worker"
+    from sqlalchemy import event
+    from sqlalchemy.engine import Engine
+    from werkzeug.serving import make_server
+
+    statements = []
+    event.listen(Engine, 'before_cursor_execute', lambda *args: statements.append(args[2]))
+
+    from local_app import create_app
+    app = create_app({'SQLALCHEMY_DATABASE_URI': database_url})
+    if setup:
+        from local_services.seed import create_schema, seed_demo_data
+        with app.app_context():
+            create_schema()
+            seed_demo_data()
+
+    server = make_server('127.0.0.1', 0, app, threaded=True)
+    print(f'ready {server.port} {len(statements)}', flush=True)
+    server.serve_forever()
+
+
+def scratch_database():
+    handle, path = tempfile.mkstemp(suffix='.db', prefix='clinic-bench-')
+    os.close(handle)
+    os.remove(path)  # an empty file is fine for SQLite, but start truly fresh
+    return f'sqlite:///{path}'
+
+
+def start_workers(database_url, setup, workers):
+    """Start the workers together; return (seconds to first response,
+    statements before serving) per worker, and the number that failed."""
+    command = [sys.executable, '-m', 'benchmarks.cold_start', '--serve', database_url]
+    if setup:
+        command.append('--setup')
+    started = time.perf_counter()
+    processes = [subprocess.Popen(command, cwd=ROOT, stdout=subprocess.PIPE, stderr=subprocess.DEVNULL, text=True)
+                 for _ in range(workers)]
+    results, failed = [], 0
+    try:
+        for process in processes:
+            # Seeding prints progress first; EOF means the worker died
+            line = ['']
+            while line and line[0] != 'ready':
+                line = process.stdout.readline().split() or None
+            if not line:
+                failed += 1
+                continue
+            port, statements = int(line[1]), int(line[2])
+            while True:
+                try:
+                    urllib.request.urlopen(f'http://127.0.0.1:{port}/login', timeout=5).read()
+                    break
+                except OSError:
+                    time.sleep(0.002)
+            results.append((time.perf_counter() - started, statements))
+    finally:
+        for process in processes:
+            process.kill()
+            process.wait()
+    return results, failed
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--workers', type=int, default=4)
+    parser.add_argument('--rounds', type=int, default=5)
+    parser.add_argument('--serve', metavar='DATABASE_URL', help=argparse.SUPPRESS)
+    parser.add_argument('--setup', action='store_true', help=argparse.SUPPRESS)
+    args = parser.parse_args()
+    if args.serve:
+        return serve(args.serve, args.setup)
+
+    prepared = scratch_database()
+    load_app(prepared)  # schema and demo data, outside the timings
+
+    modes = (
+        ('factory', lambda: prepared, False),
+        ('setup on boot, existing db', lambda: prepared, True),
+        ('setup on boot, fresh db', scratch_database, True),
+    )
+    print(f"{'boot':28} {'median ms':>10} {'worst ms':>9} {'statements':>11} {'failed':>7}")
+    failures = 0
+    for label, database, setup in modes:
+        times, statements, failed = [], [], 0
+        for _ in range(args.rounds):
+            results, round_failed = start_workers(database(), setup, args.workers)
+            times += [seconds for seconds, _ in results]
+            statements += [count for _, count in results]
+            failed += round_failed
+        if not times:
+            print(f'{label:28} {"-":>10} {"-":>9} {"-":>11} {failed:7}')
+            continue
+        print(f'{label:28} {statistics.median(times) * 1000:10.0f} {max(times) * 1000:9.0f} '
+              f'{statistics.median(statements):11.0f} {failed:7}')
+        if not setup:
+            failures += failed + any(statements)
+
+    return 1 if failures else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,63 @@
+"""Shared helpers for the benchmark scripts in this directory.
+
+Each script runs against a throwaway SQLite database so it never touches
+clinic_appointments.db. Run them from the repository root, e.g.
+
+    python -m benchmarks.appointment_listing_queries
+"""
+import os
+import sys
+import tempfile
+from contextlib import contextmanager
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if ROOT not in sys.path:
+    sys.path.insert(0, ROOT)
+
+
+def load_app(database_url=None, config=None):
+    """Build the application on a scratch database with the demo data.
+
+    Without ``database_url`` that is a new SQLite file. A PostgreSQL URL
+    must name a scratch database: everything in it is dropped first.
+    """
+    if database_url is None:
+        handle, path = tempfile.mkstemp(suffix='.db', prefix='clinic-bench-')
+        os.close(handle)
+        database_url = f'sqlite:///{path}'
+    from local_app import create_app
+    from local_db import db
+    from local_services.database import database_url as normalize_url
+    from local_services.seed import create_schema, seed_demo_data
+
+    app = create_app({'SQLALCHEMY_DATABASE_URI': normalize_url(database_url), **(config or {})})
+    with app.app_context():
+        if db.engine.dialect.name == 'postgresql':
+            with db.engine.begin() as connection:
+                connection.exec_driver_sql('DROP SCHEMA public CASCADE; CREATE SCHEMA public')
+        create_schema()
+        seed_demo_data()
+    return app
+
+
+@contextmanager
+def count_statements(engine):
+    """Collect every SQL statement executed on ``engine`` inside the block."""
+    from sqlalchemy import event
+
+    statements = []
+
+    def before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        statements.append(statement)
+
+    event.listen(engine, 'before_cursor_execute', before_cursor_execute)
+    try:
+        yield statements
+    finally:
+        event.remove(engine, 'before_cursor_execute', before_cursor_execute)
+
+
+def login(client, email, password, role):
+    response = client.post('/login', data={'email': email, 'password': password, 'role': role})
+    assert response.status_code == 302, f'login failed for {email}'
+    return response
@@ -0,0 +1,118 @@
+"""Connection pool sizing and server-side prepared statements.
+
+* Pool wait: THREADS threads run the patient booking pages against a
+  pool of DB_POOL_SIZE connections (no overflow), then against one
+  connection per thread, and print the checkout wait per request that
+  /metrics records (http_request_db_pool_wait_seconds) and the timeouts.
+* Prepared statements (PostgreSQL with psycopg 3 only): the same pages
+  with DB_PREPARE_THRESHOLD=2 and with it off.
+
+SQLite always runs against a scratch file; PostgreSQL runs against the
+given (scratch!) database, which is wiped first.
+
+    python -m benchmarks.database_pool --threads 8 --pool-size 2
+    python -m benchmarks.database_pool --postgres postgresql://user:pw@localhost/scratch
+"""
+import argparse
+import sys
+import threading
+import time
+
+from benchmarks.common import load_app, login
+
+
+def pages(app):
+    from local_models import Doctor
+    with app.app_context():
+        doctor = Doctor.query.first()
+        return ['/book/select-clinic', f'/book/select-doctor/{doctor.clinic_id}',
+                f'/book/select-time/{doctor.id}', '/my-appointments', '/']
+
+
+def add_patients(app, count):
+    from local_db import db
+    from local_models import User
+    with app.app_context():
+        for i in range(count):
+            user = User(username=f'pool{i}', email=f'pool{i}@example.com', name=f'Pool Patient {i}',
+                        role='patient')
+            user.set_password('pool12345')
+            db.session.add(user)
+        db.session.commit()
+
+
+def run(app, threads, rounds):
+    """Requests/s with ``threads`` patients browsing at once."""
+    paths = pages(app)
+    clients = []
+    for i in range(threads):
+        client = app.test_client()
+        login(client, f'pool{i}@example.com', 'pool12345', 'patient')
+        clients.append(client)
+    errors = []
+
+    def browse(client):
+        for _ in range(rounds):
+            for path in paths:
+                status = client.get(path).status_code
+                if status != 200:
+                    errors.append(status)
+
+    workers = [threading.Thread(target=browse, args=(client,)) for client in clients]
+    started = time.perf_counter()
+    for worker in workers:
+        worker.start()
+    for worker in workers:
+        worker.join()
+    elapsed = time.perf_counter() - started
+    return threads * rounds * len(paths) / elapsed, errors
+
+
+def pool_wait(database_url, threads, pool_size, rounds):
+    from local_services.metrics import request_metrics
+
+    app = load_app(database_url, config={
+        'METRICS_ENABLED': True, 'DB_POOL_SIZE': pool_size, 'DB_MAX_OVERFLOW': 0})
+    add_patients(app, threads)
+    request_metrics.reset()
+    rate, errors = run(app, threads, rounds)
+    waits = request_metrics.histograms['http_request_db_pool_wait_seconds']
+    count = sum(sum(series[:-1]) for series in waits.values())
+    total = sum(series[-1] for series in waits.values())
+    print(f'  pool {pool_size:2} for {threads} threads: {rate:6.0f} req/s, '
+          f'wait {total / count * 1000:6.2f} ms/request, '
+          f'{request_metrics.pool_timeouts} timeouts, {len(errors)} errors')
+
+
+def prepared(database_url, threads, rounds):
+    for threshold in (None, 2):
+        app = load_app(database_url, config={'DB_PREPARE_THRESHOLD': threshold})
+        add_patients(app, threads)
+        run(app, threads, 1)  # warm the pool and the prepared statements
+        best = max(run(app, threads, rounds)[0] for _ in range(3))
+        print(f"  prepare threshold {threshold if threshold is not None else 'off'}: {best:6.0f} req/s")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--threads', type=int, default=8)
+    parser.add_argument('--pool-size', type=int, default=2)
+    parser.add_argument('--rounds', type=int, default=20)
+    parser.add_argument('--postgres', metavar='URL', help='scratch PostgreSQL database to run as well')
+    args = parser.parse_args()
+
+    from local_services.database import database_url
+    targets = [('sqlite', None)]
+    if args.postgres:
+        targets.append(('postgresql', database_url(args.postgres)))
+    for name, url in targets:
+        print(f'== {name}')
+        for pool_size in (args.pool_size, args.threads):
+            pool_wait(url, args.threads, pool_size, args.rounds)
+        if url and url.startswith('postgresql+psycopg://'):
+            prepared(url, args.threads, args.rounds)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
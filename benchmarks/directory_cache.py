@@ -0,0 +1,132 @@
+"""Clinic/doctor directory cache: cost per page and cross-worker invalidation.
+
+Seeds C clinics with D doctors each, then:
+
+* times select_clinic and select_doctor with the cache disabled (TTL 0)
+  and warm, counting statements per request,
+* starts a second worker process on the same database, warms its cache,
+  edits a clinic and a doctor through the admin routes in this process,
+  and checks that the other worker serves the new data on its next
+  request,
+* prints the hit/miss stats.
+
+    python -m benchmarks.directory_cache --clinics 20 --doctors 25
+"""
+import argparse
+import multiprocessing
+import sys
+import time
+
+from benchmarks.common import count_statements, load_app, login
+
+
+def seed(db, clinics, doctors_per_clinic):
+    from local_models import Clinic, Doctor, User
+
+    first_clinic = (db.session.query(db.func.max(Clinic.id)).scalar() or 0) + 1
+    db.session.execute(db.insert(Clinic), [
+        {'id': first_clinic + i, 'name': f'Clinic {i}', 'address': f'{i} Main Street'} for i in range(clinics)
+    ])
+    count = clinics * doctors_per_clinic
+    first_user = (db.session.query(db.func.max(User.id)).scalar() or 0) + 1
+    db.session.execute(db.insert(User), [
+        {'id': first_user + i, 'username': f'dir{i}', 'email': f'dir{i}@example.com',
+         'name': f'Dr. Directory {i}', 'role': 'doctor', 'password_hash': 'x'} for i in range(count)
+    ])
+    db.session.execute(db.insert(Doctor), [
+        {'user_id': first_user + i, 'clinic_id': first_clinic + i % clinics,
+         'specialization': 'General Medicine'} for i in range(count)
+    ])
+    patient = User(username='browser', email='browser@example.com', name='Browsing Patient', role='patient')
+    patient.set_password('browser123')
+    db.session.add(patient)
+    db.session.commit()
+    return list(range(first_clinic, first_clinic + clinics))
+
+
+def browse(client, clinic_ids):
+    client.get('/book/select-clinic')
+    for clinic_id in clinic_ids:
+        client.get(f'/book/select-doctor/{clinic_id}')
+
+
+def other_worker(database_url, clinic_id, conn):
+    # A second "gunicorn worker": same database, its own process and cache
+    app = load_app(database_url)
+    client = app.test_client()
+    login(client, 'browser@example.com', 'browser123', 'patient')
+    while True:
+        command = conn.recv()
+        if command is None:
+            break
+        conn.send(client.get(f'/book/select-doctor/{clinic_id}').get_data(as_text=True))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--clinics', type=int, default=20)
+    parser.add_argument('--doctors', type=int, default=25, help='doctors per clinic')
+    parser.add_argument('--rounds', type=int, default=20)
+    args = parser.parse_args()
+
+    app = load_app()
+    from local_db import db
+    from local_models import Doctor
+    from local_services.directory import directory_cache
+
+    with app.app_context():
+        clinic_ids = seed(db, args.clinics, args.doctors)
+        engine = db.engine
+        doctor = Doctor.query.filter_by(clinic_id=clinic_ids[0]).first()
+        doctor_form = {'name': doctor.user.name, 'email': doctor.user.email, 'phone': '',
+                       'specialization': doctor.specialization, 'license_number': '',
+                       'years_experience': '', 'clinic_id': str(doctor.clinic_id)}
+    database_url = app.config['SQLALCHEMY_DATABASE_URI']
+
+    client = app.test_client()
+    login(client, 'browser@example.com', 'browser123', 'patient')
+    pages = 1 + len(clinic_ids)
+    failures = 0
+
+    for label, ttl in (('cache off', 0), ('cache on', 300)):
+        app.config['DIRECTORY_CACHE_TTL'] = ttl
+        browse(client, clinic_ids)  # warm up (or not, with TTL 0)
+        # No app context around the requests: each one gets its own, as in production
+        with count_statements(engine) as statements:
+            started = time.perf_counter()
+            for _ in range(args.rounds):
+                browse(client, clinic_ids)
+            elapsed = time.perf_counter() - started
+        requests = pages * args.rounds
+        print(f'{label:9}: {elapsed / requests * 1000:.2f} ms/page, '
+              f'{len(statements) / requests:.1f} statements/page')
+
+    # Cross-worker invalidation
+    parent, child = multiprocessing.get_context('spawn').Pipe()
+    worker = multiprocessing.get_context('spawn').Process(
+        target=other_worker, args=(database_url, clinic_ids[0], child))
+    worker.start()
+    parent.send('get')
+    parent.recv()  # other worker's cache is now warm
+
+    admin = app.test_client()
+    login(admin, 'admin@clinic.com', 'admin123', 'admin')
+    admin.post(f'/admin/clinics/edit/{clinic_ids[0]}', data={
+        'name': 'Renamed Clinic', 'address': '1 New Street', 'phone': '', 'email': ''})
+    admin.post(f'/edit_doctor/{doctor.id}', data={**doctor_form, 'name': 'Dr. Renamed'})
+
+    parent.send('get')
+    page = parent.recv()
+    parent.send(None)
+    worker.join()
+    for expected in ('Renamed Clinic', 'Dr. Renamed'):
+        found = expected in page
+        failures += not found
+        print(f"{'ok  ' if found else 'FAIL'} other worker sees '{expected}' right after the edit")
+
+    print('stats (this worker):', directory_cache.stats())
+    return 1 if failures else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,115 @@
+"""Doctor dashboard cost for a doctor with a long appointment history.
+
+Bulk-loads one doctor with 100k historical appointments (plus a handful
+today and upcoming), then times the dashboard data loading the way the
+route used to do it (four queries, counts by scanning) against the
+current agenda query plus maintained counters, and the full page.
+
+    python -m benchmarks.doctor_dashboard --appointments 100000
+"""
+import argparse
+import sys
+import time
+from datetime import date, datetime, timedelta
+
+from benchmarks.common import load_app, login
+
+
+def seed(db, doctor_id, patient_id, count):
+    from local_models import Appointment, TimeSlot
+    from local_services.stats import reconcile
+
+    statuses = ('completed', 'completed', 'completed', 'cancelled')
+    first = datetime.combine(date.today(), datetime.min.time()) - timedelta(days=count // 20 + 1)
+    slots, appointments = [], []
+    next_id = (db.session.query(db.func.max(TimeSlot.id)).scalar() or 0) + 1
+    for i in range(count):
+        starts_at = first + timedelta(days=i // 20, minutes=30 * (i % 20))
+        slots.append({'id': next_id + i, 'doctor_id': doctor_id, 'starts_at': starts_at,
+                      'ends_at': starts_at + timedelta(minutes=30), 'is_available': False})
+        appointments.append({'patient_id': patient_id, 'doctor_id': doctor_id,
+                             'time_slot_id': next_id + i, 'status': statuses[i % len(statuses)],
+                             'created_at': starts_at - timedelta(days=3)})
+    db.session.execute(db.insert(TimeSlot), slots)
+    db.session.execute(db.insert(Appointment), appointments)
+    # Today and the coming days, through the ORM like real bookings
+    for slot in TimeSlot.query.filter(TimeSlot.doctor_id == doctor_id, TimeSlot.is_available == True).limit(20):
+        slot.is_available = False
+        db.session.add(Appointment(patient_id=patient_id, doctor_id=doctor_id, time_slot_id=slot.id))
+    reconcile()
+    db.session.commit()
+
+
+def legacy_dashboard(db, doctor_id):
+    from local_models import Appointment, TimeSlot
+
+    today = date.today()
+    day_start = datetime.combine(today, datetime.min.time())
+    today_appointments = Appointment.query.join(TimeSlot).filter(
+        Appointment.doctor_id == doctor_id, TimeSlot.on_date(today)
+    ).order_by(TimeSlot.starts_at).all()
+    upcoming = Appointment.query.join(TimeSlot).filter(
+        Appointment.doctor_id == doctor_id, TimeSlot.starts_at >= day_start + timedelta(days=1),
+        Appointment.status == 'scheduled'
+    ).order_by(TimeSlot.starts_at).limit(10).all()
+    total = Appointment.query.filter_by(doctor_id=doctor_id).count()
+    pending = Appointment.query.filter_by(doctor_id=doctor_id, status='scheduled').count()
+    return today_appointments, upcoming, total, pending
+
+
+def current_dashboard(db, doctor_id):
+    from local_services.appointments import doctor_agenda
+    from local_services.stats import doctor_counts
+
+    today_appointments, upcoming = doctor_agenda(doctor_id, date.today())
+    return today_appointments, upcoming, doctor_counts(doctor_id)
+
+
+def timed(label, fn, iterations):
+    fn()  # warm up
+    started = time.perf_counter()
+    for _ in range(iterations):
+        fn()
+    per_call = (time.perf_counter() - started) / iterations * 1000
+    print(f'{label:<34} {per_call:8.2f} ms')
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--appointments', type=int, default=100_000)
+    parser.add_argument('--iterations', type=int, default=50)
+    args = parser.parse_args()
+
+    app = load_app()
+    from local_db import db
+    from local_models import Doctor, User
+
+    with app.app_context():
+        doctor_id = Doctor.query.first().id
+        patient = User(username='history', email='history@example.com', name='History Patient',
+                       role='patient', password_hash='x')
+        db.session.add(patient)
+        db.session.flush()
+        seed(db, doctor_id, patient.id, args.appointments)
+
+    print(f'doctor with {args.appointments:,} historical appointments, {args.iterations} iterations')
+    with app.app_context():
+        def legacy():
+            legacy_dashboard(db, doctor_id)
+            db.session.expunge_all()
+
+        def current():
+            current_dashboard(db, doctor_id)
+            db.session.expunge_all()
+
+        timed('legacy: 4 queries with COUNT(*)', legacy, args.iterations)
+        timed('current: agenda + counters', current, args.iterations)
+
+    client = app.test_client()
+    login(client, 'doctor@clinic.com', 'doctor123', 'doctor')
+    timed('GET /doctor (full page)', lambda: client.get('/doctor'), args.iterations)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,119 @@
+"""Earliest free slot across clinics: search API vs. clicking through.
+
+Seeds C clinics with D doctors spread over a few specializations and
+fills 90 days of slots from working hours (most of the coming days
+already booked), then compares answering "who is free soonest for X"
+two ways:
+
+* drill-down: select_clinic, then select_doctor for every clinic, then
+  select_time for every matching doctor (what a patient or the call
+  center does today), and
+* one GET /api/slots/earliest request.
+
+    python -m benchmarks.earliest_slot_search --clinics 20 --doctors 500
+"""
+import argparse
+import sys
+import time
+from datetime import date, datetime, timedelta
+
+from benchmarks.common import count_statements, load_app, login
+
+SPECIALIZATIONS = ('Cardiology', 'Dermatology', 'General Medicine', 'Neurology', 'Pediatrics',
+                   'Orthopedics', 'Psychiatry', 'Oncology', 'Radiology', 'Urology')
+
+
+def seed(db, clinics, doctors, days):
+    from datetime import time as clock
+    from local_models import Clinic, Doctor, ScheduleTemplate, TimeSlot, User
+    from local_services.schedules import generate_slots
+
+    first_clinic = (db.session.query(db.func.max(Clinic.id)).scalar() or 0) + 1
+    db.session.execute(db.insert(Clinic), [
+        {'id': first_clinic + i, 'name': f'Clinic {i}', 'address': f'{i} Main Street'} for i in range(clinics)
+    ])
+    first_user = (db.session.query(db.func.max(User.id)).scalar() or 0) + 1
+    first_doctor = (db.session.query(db.func.max(Doctor.id)).scalar() or 0) + 1
+    db.session.execute(db.insert(User), [
+        {'id': first_user + i, 'username': f'search{i}', 'email': f'search{i}@example.com',
+         'name': f'Dr. Search {i}', 'role': 'doctor', 'password_hash': 'x'} for i in range(doctors)
+    ])
+    db.session.execute(db.insert(Doctor), [
+        {'id': first_doctor + i, 'user_id': first_user + i, 'clinic_id': first_clinic + i % clinics,
+         'specialization': SPECIALIZATIONS[i % len(SPECIALIZATIONS)]} for i in range(doctors)
+    ])
+    patient = User(username='searcher', email='searcher@example.com', name='Search Patient', role='patient')
+    patient.set_password('searcher123')
+    db.session.add(patient)
+    db.session.execute(db.insert(ScheduleTemplate), [
+        {'doctor_id': first_doctor + i, 'weekdays': '0,1,2,3,4', 'start_time': clock(9),
+         'end_time': clock(17), 'slot_minutes': 30, 'breaks': '12:00-13:00'} for i in range(doctors)
+    ])
+    today = date.today()
+    generate_slots(today, today + timedelta(days=days - 1))
+    # The next two weeks are mostly booked already
+    db.session.execute(
+        db.update(TimeSlot)
+        .where(TimeSlot.starts_at < datetime.combine(today + timedelta(days=14), datetime.min.time()),
+               TimeSlot.id % 10 != 0)
+        .values(is_available=False)
+    )
+    db.session.commit()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--clinics', type=int, default=20)
+    parser.add_argument('--doctors', type=int, default=500)
+    parser.add_argument('--days', type=int, default=90)
+    parser.add_argument('--specialization', default='Cardiology')
+    args = parser.parse_args()
+
+    app = load_app()
+    from local_db import db
+    from local_models import Clinic, Doctor
+
+    with app.app_context():
+        seed(db, args.clinics, args.doctors, args.days)
+        clinic_ids = [clinic.id for clinic in Clinic.query.all()]
+        doctors_by_clinic = {clinic_id: [doctor.id for doctor in Doctor.query.filter_by(
+            clinic_id=clinic_id, specialization=args.specialization)] for clinic_id in clinic_ids}
+
+    client = app.test_client()
+    login(client, 'searcher@example.com', 'searcher123', 'patient')
+
+    with app.app_context(), count_statements(db.engine) as statements:
+        started = time.perf_counter()
+        requests = 1
+        client.get('/book/select-clinic')
+        for clinic_id, doctor_ids in doctors_by_clinic.items():
+            client.get(f'/book/select-doctor/{clinic_id}')
+            requests += 1
+            for doctor_id in doctor_ids:
+                client.get(f'/book/select-time/{doctor_id}')
+                requests += 1
+        drill_down = time.perf_counter() - started
+        drill_statements = len(statements)
+
+    with app.app_context(), count_statements(db.engine) as statements:
+        started = time.perf_counter()
+        response = client.get('/api/slots/earliest', query_string={'specialization': args.specialization,
+                                                                    'limit': 10})
+        search = time.perf_counter() - started
+        search_statements = len(statements)
+
+    payload = response.get_json()
+    print(f'drill-down: {requests} page loads, {drill_statements} statements, {drill_down * 1000:.0f} ms')
+    print(f'search API: 1 request, {search_statements} statements, {search * 1000:.1f} ms')
+    for slot in payload['slots'][:3]:
+        print(f"  {slot['starts_at']}  {slot['doctor_name']} @ {slot['clinic_name']}")
+
+    starts = [slot['starts_at'] for slot in payload['slots']]
+    ok = response.status_code == 200 and starts == sorted(starts) and len(starts) == 10 \
+        and all(slot['specialization'] == args.specialization for slot in payload['slots'])
+    print('ok' if ok else 'FAIL unexpected search result')
+    return 0 if ok else 1
+
+
+if __name__ == '__main__':
+    sys.exit(main())
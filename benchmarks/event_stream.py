@@ -0,0 +1,181 @@
+"""Idle /events streams per worker, and how fast events reach them.
+
+Starts ``gunicorn -c gunicorn.conf.py`` with W workers of the given class,
+signs the demo doctor in and opens S streams following that doctor (the
+kernel spreads them over the workers), all idle. Then toggles one of the
+doctor's slots T times, each a POST to one worker, and times how long
+each event takes to reach every stream, whichever worker holds it.
+
+Prints the workers' memory per open stream, delivery latency
+percentiles and how many events arrived out of the expected.
+
+    python -m benchmarks.event_stream --worker-class gevent --streams 2000
+    python -m benchmarks.event_stream --worker-class gthread --streams 500
+"""
+import argparse
+import http.client
+import os
+import selectors
+import socket
+import subprocess
+import sys
+import threading
+import time
+import urllib.parse
+
+from benchmarks.common import ROOT, load_app
+from benchmarks.serving_throughput import free_port
+
+
+def worker_pids(master):
+    pids = []
+    for name in os.listdir('/proc'):
+        if name.isdigit():
+            try:
+                with open(f'/proc/{name}/stat') as stat:
+                    if int(stat.read().rsplit(')', 1)[1].split()[1]) == master:
+                        pids.append(int(name))
+            except OSError:
+                pass
+    return pids
+
+
+def rss_kib(pids):
+    total = 0
+    for pid in pids:
+        with open(f'/proc/{pid}/status') as status:
+            total += int(status.read().split('VmRSS:')[1].split()[0])
+    return total
+
+
+def start_server(database_url, port, workers, worker_class, threads):
+    env = dict(os.environ, DATABASE_URL=database_url, PYTHONPATH=ROOT, FLASK_ENV='production',
+               WEB_CONCURRENCY=str(workers), GUNICORN_WORKER_CLASS=worker_class,
+               GUNICORN_THREADS=str(threads), GUNICORN_WORKER_CONNECTIONS=str(threads * 2),
+               GUNICORN_MAX_REQUESTS='0', EVENTS_ENABLED='1', EVENTS_HEARTBEAT='5',
+               LOG_LEVEL='warning')
+    env.pop('EVENTS_DIR', None)
+    command = [sys.executable, '-m', 'gunicorn', '-c', os.path.join(ROOT, 'gunicorn.conf.py'),
+               '--bind', f'127.0.0.1:{port}']
+    process = subprocess.Popen(command, cwd=ROOT, env=env, stdout=subprocess.DEVNULL)
+    deadline = time.perf_counter() + 30
+    while time.perf_counter() < deadline:
+        try:
+            connection = http.client.HTTPConnection('127.0.0.1', port, timeout=1)
+            connection.request('GET', '/login')
+            if connection.getresponse().status == 200 and len(worker_pids(process.pid)) == workers:
+                return process
+        except OSError:
+            pass
+        time.sleep(0.1)
+    process.kill()
+    raise RuntimeError('gunicorn did not start')
+
+
+def sign_in(port):
+    connection = http.client.HTTPConnection('127.0.0.1', port, timeout=30)
+    body = urllib.parse.urlencode({'email': 'doctor@clinic.com', 'password': 'doctor123', 'role': 'doctor'})
+    connection.request('POST', '/login', body=body,
+                       headers={'Content-Type': 'application/x-www-form-urlencoded'})
+    response = connection.getresponse()
+    response.read()
+    return response.getheader('Set-Cookie').split(';', 1)[0]
+
+
+def open_stream(port, cookie, doctor_id):
+    sock = socket.create_connection(('127.0.0.1', port))
+    sock.sendall(f'GET /events?doctor_id={doctor_id} HTTP/1.1\r\nHost: localhost\r\n'
+                 f'Cookie: {cookie}\r\nAccept: text/event-stream\r\n\r\n'.encode())
+    return sock
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--worker-class', default='gevent', choices=['gevent', 'gthread'])
+    parser.add_argument('--workers', type=int, default=2)
+    parser.add_argument('--streams', type=int, default=1000, help='open streams in all')
+    parser.add_argument('--toggles', type=int, default=20)
+    parser.add_argument('--interval', type=float, default=1.0, help='seconds between toggles')
+    args = parser.parse_args()
+
+    app = load_app()
+    from local_models import Doctor, TimeSlot
+    with app.app_context():
+        doctor = Doctor.query.first()
+        doctor_id, slot_id = doctor.id, TimeSlot.query.filter_by(doctor_id=doctor.id).first().id
+    path = app.config['SQLALCHEMY_DATABASE_URI'].removeprefix('sqlite:///')
+
+    port = free_port()
+    # A gthread worker needs a thread per stream, plus some for the pages
+    threads = args.streams // args.workers + 50
+    process = start_server(f'sqlite:///{path}', port, args.workers, args.worker_class, threads)
+    try:
+        pids = worker_pids(process.pid)
+        cookie = sign_in(port)
+        idle_rss = rss_kib(pids)
+
+        streams = [open_stream(port, cookie, doctor_id) for _ in range(args.streams)]
+        selector = selectors.DefaultSelector()
+        for sock in streams:
+            sock.setblocking(False)
+            selector.register(sock, selectors.EVENT_READ)
+        received = {}  # toggle number -> arrival times
+        sent = {}
+        subscribed = set()
+        stop = threading.Event()
+
+        def read():
+            while not stop.is_set():
+                for key, _ in selector.select(timeout=0.2):
+                    try:
+                        data = key.fileobj.recv(65536)
+                    except BlockingIOError:
+                        continue
+                    now = time.perf_counter()
+                    if b'retry:' in data:
+                        subscribed.add(key.fd)
+                    for _ in range(data.count(b'event: slot')):
+                        received.setdefault(len(sent), []).append(now)
+
+        reader = threading.Thread(target=read)
+        reader.start()
+        # A gthread worker serves as many streams as it has threads; the
+        # kernel may hand it more, and those wait for good
+        started = time.perf_counter()
+        while len(subscribed) < args.streams and time.perf_counter() - started < 30:
+            time.sleep(0.1)
+        subscribe_seconds = time.perf_counter() - started
+        time.sleep(1)
+        open_rss = rss_kib(pids)
+
+        poster = http.client.HTTPConnection('127.0.0.1', port, timeout=30)
+        for number in range(1, args.toggles + 1):
+            sent[number] = time.perf_counter()
+            poster.request('POST', f'/doctor/time-slot/{slot_id}/toggle', headers={'Cookie': cookie})
+            poster.getresponse().read()
+            time.sleep(args.interval)
+        stop.set()
+        reader.join()
+        for sock in streams:
+            sock.close()
+    finally:
+        process.terminate()
+        process.wait()
+        os.remove(path)
+
+    latencies = sorted(arrival - sent[number] for number, arrivals in received.items()
+                       if number in sent for arrival in arrivals)
+    arrived = len(latencies)
+    print(f'{args.worker_class}, {args.workers} workers, {len(subscribed)} of {args.streams} streams '
+          f'served after {subscribe_seconds:.1f} s')
+    print(f'  worker memory: {idle_rss / 1024:.1f} MiB idle, {open_rss / 1024:.1f} MiB with the streams '
+          f'({(open_rss - idle_rss) / max(len(subscribed), 1):.1f} KiB per stream)')
+    if latencies:
+        print(f'  delivery: p50 {latencies[arrived // 2] * 1000:.1f} ms  '
+              f'p99 {latencies[int(arrived * 0.99)] * 1000:.1f} ms  max {latencies[-1] * 1000:.1f} ms')
+    print(f'  events arrived: {arrived} of {len(subscribed) * args.toggles}')
+    return 0 if arrived == args.streams * args.toggles else 1
+
+
+if __name__ == '__main__':
+    sys.exit(main())
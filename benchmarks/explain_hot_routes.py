@@ -0,0 +1,122 @@
+"""EXPLAIN regression check for the booking hot-path queries.
+
+Builds the same queries the hot routes run and asserts that the database
+answers each of them through an index rather than a full table scan.
+
+    python -m benchmarks.explain_hot_routes
+    python -m benchmarks.explain_hot_routes --postgres postgresql://user:pw@localhost/scratch
+
+SQLite always runs against a scratch in-memory database. PostgreSQL runs
+against the given (scratch!) database; missing tables are created there and
+sequential scans are disabled so that the planner is forced to show whether
+a usable index exists, independent of table size.
+"""
+import argparse
+import re
+import sys
+from datetime import date, datetime, timedelta
+
+from benchmarks.common import ROOT  # noqa: F401  (puts the repo on sys.path)
+from sqlalchemy import create_engine, func, or_, select
+from sqlalchemy.orm import configure_mappers
+
+from local_db import db
+from local_models import Appointment, StatCounter, TimeSlot
+from local_services.slots import earliest_open_slots, slot_window_query
+
+
+def hot_queries():
+    configure_mappers()  # relationships are backrefs, set up on first use
+    today = date(2030, 1, 1)
+    now = datetime(2030, 1, 1, 8, 30)
+    return {
+        'booking.select_time': select(TimeSlot).where(
+            TimeSlot.doctor_id == 1,
+            TimeSlot.starts_at >= now,
+            TimeSlot.is_available == True,
+        ).order_by(TimeSlot.starts_at).limit(50),
+        'doctor.schedule': select(TimeSlot).where(
+            TimeSlot.doctor_id == 1,
+            TimeSlot.starts_at >= now,
+        ).order_by(TimeSlot.starts_at).limit(10),
+        'doctor.schedule overlap check': select(TimeSlot).where(
+            TimeSlot.overlapping(1, now, datetime(2030, 1, 1, 9)),
+        ).limit(1),
+        'next free slot after now': select(TimeSlot).where(
+            TimeSlot.starts_at >= now,
+            TimeSlot.is_available == True,
+        ).order_by(TimeSlot.starts_at).limit(1),
+        'doctor.dashboard agenda': select(Appointment).join(Appointment.time_slot).where(
+            Appointment.doctor_id == 1,
+            TimeSlot.doctor_id == 1,
+            TimeSlot.starts_at >= now,
+            or_(TimeSlot.starts_at < datetime(2030, 1, 2), Appointment.status == 'scheduled'),
+        ).order_by(TimeSlot.starts_at).limit(100),
+        'doctor.dashboard counters': select(StatCounter.value).where(
+            StatCounter.name.in_(['doctors.1.scheduled', 'doctors.1.completed', 'doctors.1.cancelled']),
+        ),
+        'doctor.appointments by status': select(func.count()).select_from(Appointment).where(
+            Appointment.doctor_id == 1,
+            Appointment.status == 'scheduled',
+        ),
+        'admin.manage_time_slots': slot_window_query(today, today + timedelta(days=13)).limit(24),
+        'admin.manage_time_slots by clinic': slot_window_query(today, today + timedelta(days=13),
+                                                               clinic_id=1).limit(24),
+        'booking.earliest_slots': earliest_open_slots('Cardiology', now, today + timedelta(days=13)),
+        'booking.earliest_slots by clinic': earliest_open_slots('Cardiology', now, today + timedelta(days=13),
+                                                                clinic_ids=[1, 2]),
+        'booking.my_appointments': select(Appointment).where(
+            Appointment.patient_id == 1,
+        ).order_by(Appointment.created_at.desc()),
+        'admin.manage_appointments': select(Appointment).order_by(
+            Appointment.created_at.desc()
+        ).limit(10),
+    }
+
+
+def explain(conn, stmt):
+    sql = str(stmt.compile(dialect=conn.dialect, compile_kwargs={'literal_binds': True}))
+    if conn.dialect.name == 'sqlite':
+        return [row[-1] for row in conn.exec_driver_sql('EXPLAIN QUERY PLAN ' + sql)]
+    conn.exec_driver_sql('SET LOCAL enable_seqscan = off')
+    return [row[0] for row in conn.exec_driver_sql('EXPLAIN ' + sql)]
+
+
+def full_scans(dialect, plan):
+    """Plan lines that read a whole table without an index."""
+    if dialect == 'sqlite':
+        return [line for line in plan if re.match(r'SCAN \w+$', line.strip())]
+    return [line for line in plan if 'Seq Scan' in line]
+
+
+def check(url):
+    engine = create_engine(url)
+    db.metadata.create_all(engine)
+
+    failures = 0
+    print(f'== {engine.dialect.name}')
+    for name, stmt in hot_queries().items():
+        with engine.begin() as conn:
+            plan = explain(conn, stmt)
+        scans = full_scans(engine.dialect.name, plan)
+        failures += bool(scans)
+        print(f"{'FAIL' if scans else 'ok  '} {name}")
+        for line in plan:
+            print(f'       {line}')
+    engine.dispose()
+    return failures
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--postgres', metavar='URL', help='scratch PostgreSQL database to check as well')
+    args = parser.parse_args()
+
+    failures = check('sqlite://')
+    if args.postgres:
+        failures += check(args.postgres)
+    return 1 if failures else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
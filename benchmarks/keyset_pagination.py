@@ -0,0 +1,106 @@
+"""OFFSET vs keyset pagination on the admin appointment listing.
+
+Bulk-loads enough appointments for 10,000+ pages of 10 and times page 1
+and page 10,000 both ways: the old ``paginate()`` (OFFSET plus a COUNT(*))
+and the (created_at, id) cursor the routes use now.
+
+    python -m benchmarks.keyset_pagination --appointments 120000
+"""
+import argparse
+import sys
+import time
+from datetime import datetime, timedelta
+
+from benchmarks.common import load_app
+
+PER_PAGE = 10
+
+
+def seed(db, count):
+    from local_models import Appointment, Doctor, TimeSlot, User
+    from local_services.stats import reconcile
+
+    doctor_id = Doctor.query.first().id
+    patient = User(username='pager', email='pager@example.com', name='Pager Patient',
+                   role='patient', password_hash='x')
+    db.session.add(patient)
+    db.session.flush()
+    first_id = (db.session.query(db.func.max(TimeSlot.id)).scalar() or 0) + 1
+    first = datetime(2020, 1, 1)
+    db.session.execute(db.insert(TimeSlot), [
+        {'id': first_id + i, 'doctor_id': doctor_id, 'starts_at': first + timedelta(minutes=30 * i),
+         'ends_at': first + timedelta(minutes=30 * i + 30), 'is_available': False}
+        for i in range(count)
+    ])
+    db.session.execute(db.insert(Appointment), [
+        {'patient_id': patient.id, 'doctor_id': doctor_id, 'time_slot_id': first_id + i,
+         'status': 'completed', 'created_at': first + timedelta(minutes=7 * i)}
+        for i in range(count)
+    ])
+    reconcile()
+    db.session.commit()
+
+
+def timed(fn, iterations):
+    fn()
+    started = time.perf_counter()
+    for _ in range(iterations):
+        fn()
+    return (time.perf_counter() - started) / iterations * 1000
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--appointments', type=int, default=120_000)
+    parser.add_argument('--iterations', type=int, default=20)
+    args = parser.parse_args()
+
+    deep_page = 10_000
+    if args.appointments < deep_page * PER_PAGE:
+        parser.error(f'need at least {deep_page * PER_PAGE} appointments to reach page {deep_page}')
+
+    app = load_app()
+    from local_db import db
+    from local_models import Appointment
+    from local_services.appointments import appointment_listing_query, paginate_appointments
+    from local_services.pagination import encode_cursor
+
+    with app.app_context():
+        seed(db, args.appointments)
+
+        # Cursor of the last row on page deep_page - 1, i.e. the "next" link a
+        # user would have followed to get to page deep_page.
+        boundary = db.session.query(Appointment.created_at, Appointment.id).order_by(
+            Appointment.created_at.desc(), Appointment.id.desc()
+        ).offset((deep_page - 1) * PER_PAGE - 1).first()
+        deep_cursor = encode_cursor(tuple(boundary))
+
+        def offset_page(page):
+            def run():
+                appointment_listing_query().order_by(Appointment.created_at.desc()).paginate(
+                    page=page, per_page=PER_PAGE)
+                db.session.expunge_all()
+            return run
+
+        def keyset_page(cursor):
+            def run():
+                paginate_appointments(appointment_listing_query(), after=cursor, per_page=PER_PAGE)
+                db.session.expunge_all()
+            return run
+
+        results = {
+            ('OFFSET + COUNT', 1): timed(offset_page(1), args.iterations),
+            ('OFFSET + COUNT', deep_page): timed(offset_page(deep_page), args.iterations),
+            ('keyset', 1): timed(keyset_page(None), args.iterations),
+            ('keyset', deep_page): timed(keyset_page(deep_cursor), args.iterations),
+        }
+
+    print(f'{args.appointments:,} appointments, {PER_PAGE} per page')
+    print(f"{'':<16}{'page 1':>12}{f'page {deep_page:,}':>14}")
+    for method in ('OFFSET + COUNT', 'keyset'):
+        print(f'{method:<16}{results[(method, 1)]:>10.2f}ms{results[(method, deep_page)]:>12.2f}ms')
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,100 @@
+"""Login throughput per password hashing cost, and pages during a login rush.
+
+* For each PASSWORD_HASH_METHOD: the time one hash takes, and POST /login
+  through the app one after another, reported as logins per CPU second
+  (logins/s per core; hashing is CPU bound, so cores multiply it).
+* Login rush: LOGINS threads log in non-stop while one thread browses
+  the booking pages; page latency with PASSWORD_HASH_WORKERS=1 against
+  one hash per login thread (unbounded).
+
+    python -m benchmarks.login_throughput --logins 20
+"""
+import argparse
+import sys
+import threading
+import time
+
+from benchmarks.common import load_app, login
+
+METHODS = ['scrypt:32768:8:1', 'scrypt:16384:8:1', 'scrypt:8192:8:1', 'pbkdf2:sha256:1000000',
+           'pbkdf2:sha256:600000', 'pbkdf2:sha256:260000']
+
+
+def set_method(app, method):
+    from local_db import db
+    from local_models import User
+    app.config['PASSWORD_HASH_METHOD'] = method
+    with app.app_context():
+        user = User.query.filter_by(email='admin@clinic.com').one()
+        started = time.perf_counter()
+        user.set_password('admin123')
+        db.session.commit()
+        return time.perf_counter() - started
+
+
+def per_cost(app, logins):
+    print(f"{'method':24} {'hash ms':>8} {'logins/s/core':>14}")
+    for method in METHODS:
+        hash_seconds = set_method(app, method)
+        client = app.test_client()
+        wall, cpu = time.perf_counter(), time.process_time()
+        for _ in range(logins):
+            login(client, 'admin@clinic.com', 'admin123', 'admin')
+        wall, cpu = time.perf_counter() - wall, time.process_time() - cpu
+        print(f'{method:24} {hash_seconds * 1000:8.1f} {logins / cpu:14.1f}   ({logins / wall:.1f}/s wall)')
+
+
+def rush(app, threads, seconds):
+    from local_models import Doctor
+    with app.app_context():
+        doctor = Doctor.query.first()
+    pages = ['/about', f'/book/select-doctor/{doctor.clinic_id}']
+    set_method(app, 'scrypt:32768:8:1')
+    for workers in (1, threads):
+        app.config['PASSWORD_HASH_WORKERS'] = workers
+        deadline = time.monotonic() + seconds
+        logins, latencies = [0], []
+
+        def log_in():
+            client = app.test_client()
+            while time.monotonic() < deadline:
+                login(client, 'admin@clinic.com', 'admin123', 'admin')
+                logins[0] += 1
+
+        def browse():
+            client = app.test_client()
+            login(client, 'admin@clinic.com', 'admin123', 'admin')
+            while time.monotonic() < deadline:
+                for path in pages:
+                    started = time.perf_counter()
+                    client.get(path)
+                    latencies.append(time.perf_counter() - started)
+
+        workers_threads = [threading.Thread(target=log_in) for _ in range(threads)]
+        workers_threads.append(threading.Thread(target=browse))
+        for thread in workers_threads:
+            thread.start()
+        for thread in workers_threads:
+            thread.join()
+        latencies.sort()
+        print(f'hash workers {workers:2}: {logins[0] / seconds:5.1f} logins/s, pages p50 '
+              f'{latencies[len(latencies) // 2] * 1000:6.1f} ms  p99 '
+              f'{latencies[int(len(latencies) * 0.99)] * 1000:6.1f} ms  ({len(latencies)} pages)')
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--logins', type=int, default=20, help='logins per method')
+    parser.add_argument('--threads', type=int, default=8, help='login threads in the rush')
+    parser.add_argument('--seconds', type=float, default=10)
+    args = parser.parse_args()
+
+    app = load_app(config={'METRICS_ENABLED': False, 'SQL_PROFILE': False})
+    per_cost(app, args.logins)
+    print()
+    rush(app, args.threads, args.seconds)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
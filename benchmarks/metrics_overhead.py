@@ -0,0 +1,173 @@
+"""Request metrics: overhead per request and correctness of /metrics.
+
+* Times the same patient page mix with metrics off and on (two apps on
+  one database, interleaved rounds) and prints the cost per request.
+* Checks that the statement counts /metrics reports match what the
+  engine actually ran, that every histogram's count matches
+  http_requests_total, and that every line parses as the Prometheus
+  text format.
+* Starts gunicorn with two workers recycled every ~50 requests, sends
+  R requests and checks that a single scrape accounts for all of them
+  and that METRICS_DIR keeps one file per live worker plus
+  retired.json (skipped without gunicorn).
+
+    python -m benchmarks.metrics_overhead --requests 2000
+"""
+import argparse
+import importlib.util
+import os
+import re
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+import urllib.request
+from collections import defaultdict
+
+from benchmarks.common import ROOT, count_statements, load_app, login
+
+TOKEN = 'benchmark-scraper'
+SAMPLE = re.compile(r'^[a-z_]+(\{[a-z_]+="(?:[^"\\]|\\.)*"(,[a-z_]+="(?:[^"\\]|\\.)*")*\})? -?[0-9.e+-]+$')
+
+
+def parse(text):
+    """{(name, labels): value} from the exposition text; raises on bad lines."""
+    samples = {}
+    for line in text.splitlines():
+        if line.startswith('# HELP ') or line.startswith('# TYPE '):
+            continue
+        if not SAMPLE.match(line):
+            raise ValueError(f'not a valid sample line: {line!r}')
+        series, value = line.rsplit(' ', 1)
+        name, _, labels = series.partition('{')
+        samples[(name, labels.rstrip('}'))] = float(value)
+    return samples
+
+
+def totals(samples, name):
+    by_endpoint = defaultdict(float)
+    for (sample, labels), value in samples.items():
+        if sample == name:
+            by_endpoint[re.search(r'endpoint="([^"]*)"', labels).group(1)] += value
+    return by_endpoint
+
+
+def pages(app):
+    from local_models import Doctor
+    with app.app_context():
+        doctor = Doctor.query.first()
+        return ['/book/select-clinic', f'/book/select-doctor/{doctor.clinic_id}',
+                f'/book/select-time/{doctor.id}', '/my-appointments', '/']
+
+
+def gunicorn_check(database_url, requests):
+    port = 8765
+    # Workers recycled every ~50 requests: their totals must survive in retired.json
+    metrics_dir = tempfile.mkdtemp(prefix='clinic-metrics-')
+    env = dict(os.environ, DATABASE_URL=database_url, WEB_CONCURRENCY='2', PYTHONPATH=ROOT,
+               GUNICORN_MAX_REQUESTS='50', METRICS_DIR=metrics_dir, METRICS_TOKEN=TOKEN)
+    scrape = urllib.request.Request(f'http://127.0.0.1:{port}/metrics',
+                                    headers={'Authorization': f'Bearer {TOKEN}'})
+    process = subprocess.Popen(
+        [sys.executable, '-m', 'gunicorn', '-c', os.path.join(ROOT, 'gunicorn.conf.py'),
+         '--bind', f'127.0.0.1:{port}'],
+        cwd=ROOT, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    try:
+        for _ in range(300):
+            try:
+                urllib.request.urlopen(f'http://127.0.0.1:{port}/about', timeout=1).read()
+                break
+            except OSError:
+                time.sleep(0.05)
+        for _ in range(requests - 1):
+            urllib.request.urlopen(f'http://127.0.0.1:{port}/about').read()
+        time.sleep(1.5)  # workers write their totals at most once a second
+        counted = set()
+        for _ in range(4):  # each scrape may land on either worker
+            samples = parse(urllib.request.urlopen(scrape).read().decode())
+            counted.add(int(totals(samples, 'http_requests_total')['auth_bp.about']))
+        return counted, len(os.listdir(metrics_dir))
+    finally:
+        process.terminate()
+        process.wait()
+        shutil.rmtree(metrics_dir, ignore_errors=True)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--requests', type=int, default=2000, help='requests per mode')
+    parser.add_argument('--rounds', type=int, default=5)
+    args = parser.parse_args()
+
+    app = load_app(config={'METRICS_ENABLED': True, 'METRICS_TOKEN_REQUIRED': False})
+    database_url = app.config['SQLALCHEMY_DATABASE_URI']
+    from local_app import create_app
+    from local_db import db
+    from local_services.metrics import request_metrics
+    plain = create_app({'SQLALCHEMY_DATABASE_URI': database_url, 'METRICS_ENABLED': False})
+
+    paths = pages(app)
+    from local_models import User
+    with app.app_context():
+        user = User(username='metrics', email='metrics@example.com', name='Metrics Patient', role='patient')
+        user.set_password('metrics123')
+        db.session.add(user)
+        db.session.commit()
+    clients = {'off': plain.test_client(), 'on': app.test_client()}
+    for client in clients.values():
+        login(client, 'metrics@example.com', 'metrics123', 'patient')
+
+    elapsed = defaultdict(float)
+    per_round = max(1, args.requests // (args.rounds * len(paths)))
+    for _ in range(args.rounds):
+        for label, client in clients.items():
+            started = time.perf_counter()
+            for _ in range(per_round):
+                for path in paths:
+                    client.get(path)
+            elapsed[label] += time.perf_counter() - started
+    sent = per_round * args.rounds * len(paths)
+    off, on = elapsed['off'] / sent * 1e6, elapsed['on'] / sent * 1e6
+    print(f'metrics off: {off:.0f} us/request')
+    print(f'metrics on : {on:.0f} us/request ({on - off:+.0f} us, {(on - off) / off * 100:+.1f}%)')
+
+    failures = 0
+    # Statement counts: what the engine ran vs. what /metrics says
+    with app.app_context():
+        engine = db.engine
+    request_metrics.reset()
+    client = clients['on']
+    with count_statements(engine) as statements:
+        for path in paths:
+            client.get(path)
+    try:
+        samples, valid = parse(client.get('/metrics').get_data(as_text=True)), True
+    except ValueError as exc:
+        print(exc)
+        samples, valid = {}, False
+    reported = sum(value for endpoint, value in totals(samples, 'http_request_db_statements_sum').items()
+                   if endpoint != 'metrics_bp.metrics')
+    checks = [
+        ('statement count matches the engine', reported == len(statements)),
+        ('histogram counts match requests_total',
+         dict(totals(samples, 'http_request_duration_seconds_count'))
+         == dict(totals(samples, 'http_requests_total'))),
+        ('every line is valid exposition format', valid),
+    ]
+    if importlib.util.find_spec('gunicorn'):
+        counted, files = gunicorn_check(database_url, 200)
+        checks.append((f'every scrape of 2 recycled gunicorn workers counts all 200 requests '
+                       f'(saw {sorted(counted)})', counted == {200}))
+        checks.append((f'METRICS_DIR holds the live workers and retired.json (saw {files} files)',
+                       files <= 3))
+    else:
+        print('gunicorn not installed; skipping the multi-worker check')
+    for label, ok in checks:
+        failures += not ok
+        print(f"{'ok  ' if ok else 'FAIL'} {label}")
+    return 1 if failures else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,108 @@
+"""N+1 scan: every GET page, as every role, through the SQL profiler.
+
+Seeds a few clinics, doctors, patients, slots and appointments (enough
+rows that a per-row lazy load repeats), signs in as a patient, a doctor
+and the admin, and requests every GET route the URL map has, filling
+path arguments with real ids. Each request runs inside
+local_services.profiler.max_queries(), and any statement shape that
+repeats THRESHOLD times or more is reported with the template and code
+line that ran it. Exits non-zero if anything repeats.
+
+    python -m benchmarks.n_plus_one_scan --threshold 5
+"""
+import argparse
+import sys
+from datetime import date, datetime, time, timedelta
+
+from benchmarks.common import load_app, login
+
+ROWS = 12
+
+
+def seed(db):
+    from local_models import Appointment, Clinic, Doctor, TimeSlot, User
+
+    clinics = [Clinic(name=f'Scan Clinic {i}', address=f'{i} Scan Street') for i in range(3)]
+    db.session.add_all(clinics)
+    db.session.flush()
+    doctors = []
+    for i in range(ROWS):
+        user = User(username=f'scandoc{i}', email=f'scandoc{i}@example.com', name=f'Dr. Scan {i}',
+                    role='doctor', password_hash='x')
+        db.session.add(user)
+        db.session.flush()
+        doctors.append(Doctor(user_id=user.id, clinic_id=clinics[i % 3].id, specialization='General Medicine'))
+    db.session.add_all(doctors)
+    patient = User(username='scanpatient', email='scan@example.com', name='Scan Patient', role='patient')
+    patient.set_password('scan12345')
+    db.session.add(patient)
+    db.session.flush()
+
+    demo_doctor = Doctor.query.join(User).filter(User.email == 'doctor@clinic.com').one()
+    for i, doctor in enumerate(doctors + [demo_doctor] * ROWS):
+        starts_at = datetime.combine(date.today() + timedelta(days=1 + i % 5), time(8 + i % 9))
+        for offset in (0, 30):
+            db.session.add(TimeSlot(doctor_id=doctor.id, starts_at=starts_at + timedelta(minutes=offset),
+                                    ends_at=starts_at + timedelta(minutes=offset + 30), is_available=True))
+        booked = TimeSlot(doctor_id=doctor.id, starts_at=starts_at - timedelta(days=10),
+                          ends_at=starts_at - timedelta(days=10, minutes=-30), is_available=False)
+        db.session.add(booked)
+        db.session.flush()
+        db.session.add(Appointment(patient_id=patient.id, doctor_id=doctor.id, time_slot_id=booked.id))
+    db.session.commit()
+    return {
+        'clinic_id': clinics[0].id,
+        'doctor_id': demo_doctor.id,
+        'time_slot_id': TimeSlot.query.filter_by(doctor_id=demo_doctor.id, is_available=True).first().id,
+        'appointment_id': Appointment.query.filter_by(patient_id=patient.id).first().id,
+    }
+
+
+def get_routes(app, ids):
+    for rule in sorted(app.url_map.iter_rules(), key=lambda rule: rule.rule):
+        # /events streams until the client goes away
+        if 'GET' not in rule.methods or rule.endpoint in ('static', 'assets_bp.asset', 'auth_bp.logout',
+                                                          'events_bp.stream'):
+            continue
+        if any(argument not in ids for argument in rule.arguments):
+            print(f'skipped {rule.rule}: no sample value for {sorted(rule.arguments)}')
+            continue
+        yield rule.endpoint, rule.rule, rule.build({argument: ids[argument] for argument in rule.arguments})[1]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--threshold', type=int, default=5)
+    args = parser.parse_args()
+
+    # /metrics is scanned too, which production otherwise hides without a token
+    app = load_app(config={'METRICS_TOKEN_REQUIRED': False})
+    from local_db import db
+    from local_services.profiler import max_queries
+
+    with app.app_context():
+        ids = seed(db)
+    roles = {
+        'patient': ('scan@example.com', 'scan12345'),
+        'doctor': ('doctor@clinic.com', 'doctor123'),
+        'admin': ('admin@clinic.com', 'admin123'),
+    }
+    flagged = 0
+    for role, (email, password) in roles.items():
+        client = app.test_client()
+        login(client, email, password, role)
+        for endpoint, rule, path in get_routes(app, ids):
+            with max_queries(10 ** 6, label=f'{role:7} GET {path}') as profile:
+                status = client.get(path).status_code
+            if status in (301, 302, 303):
+                continue  # not this role's page
+            suspects = profile.repeated(args.threshold)
+            print(f"{'N+1 ' if suspects else 'ok  '} {profile.summary()} [{status}]")
+            if suspects:
+                flagged += 1
+                print(profile.report(args.threshold))
+    return 1 if flagged else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
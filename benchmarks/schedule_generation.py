@@ -0,0 +1,125 @@
+"""Bulk slot generation from weekly working hours.
+
+Creates N doctors with Mon-Fri 09:00-17:00 hours (30 minute slots, lunch
+12:00-13:00, one day off each), then times generate_slots over D days,
+runs it again to show that nothing is duplicated, and times the old
+one-slot-at-a-time flow (overlap check + session.add per slot) on a few
+doctors for comparison.
+
+    python -m benchmarks.schedule_generation --doctors 500 --days 90
+"""
+import argparse
+import sys
+import time
+from datetime import date, datetime, timedelta
+
+from benchmarks.common import load_app
+
+
+def seed(db, count):
+    from datetime import time as clock
+    from local_models import Clinic, Doctor, ScheduleException, ScheduleTemplate, User
+
+    clinic_id = Clinic.query.first().id
+    first_user = (db.session.query(db.func.max(User.id)).scalar() or 0) + 1
+    first_doctor = (db.session.query(db.func.max(Doctor.id)).scalar() or 0) + 1
+    db.session.execute(db.insert(User), [
+        {'id': first_user + i, 'username': f'gen{i}', 'email': f'gen{i}@example.com',
+         'name': f'Dr. Gen {i}', 'role': 'doctor', 'password_hash': 'x'} for i in range(count)
+    ])
+    doctor_ids = [first_doctor + i for i in range(count)]
+    db.session.execute(db.insert(Doctor), [
+        {'id': doctor_id, 'user_id': first_user + i, 'clinic_id': clinic_id,
+         'specialization': 'General Medicine'} for i, doctor_id in enumerate(doctor_ids)
+    ])
+    db.session.execute(db.insert(ScheduleTemplate), [
+        {'doctor_id': doctor_id, 'weekdays': '0,1,2,3,4', 'start_time': clock(9), 'end_time': clock(17),
+         'slot_minutes': 30, 'breaks': '12:00-13:00'} for doctor_id in doctor_ids
+    ])
+    db.session.execute(db.insert(ScheduleException), [
+        {'doctor_id': doctor_id, 'date': date.today() + timedelta(days=7 + i % 14)}
+        for i, doctor_id in enumerate(doctor_ids)
+    ])
+    db.session.commit()
+    return doctor_ids
+
+
+def naive_generate(db, TimeSlot, templates, date_from, date_to):
+    # What scheduling looked like before: one overlap query and one add per slot.
+    from local_services.schedules import day_slots
+
+    created = 0
+    day = date_from
+    while day <= date_to:
+        for template in templates:
+            if day.weekday() not in template.weekday_numbers:
+                continue
+            for starts_at, ends_at in day_slots(template, day):
+                if TimeSlot.query.filter(TimeSlot.overlapping(template.doctor_id, starts_at, ends_at)).first():
+                    continue
+                db.session.add(TimeSlot(doctor_id=template.doctor_id, starts_at=starts_at,
+                                        ends_at=ends_at, is_available=True))
+                created += 1
+        day += timedelta(days=1)
+    db.session.commit()
+    return created
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--doctors', type=int, default=500)
+    parser.add_argument('--days', type=int, default=90)
+    parser.add_argument('--naive-doctors', type=int, default=5,
+                        help='doctors to run the slot-by-slot flow on (0 to skip)')
+    args = parser.parse_args()
+
+    app = load_app()
+    from local_db import db
+    from local_models import ScheduleTemplate, TimeSlot
+    from local_services.schedules import generate_slots
+
+    failures = 0
+    with app.app_context():
+        doctor_ids = seed(db, args.doctors)
+        date_from = date.today() + timedelta(days=1)
+        date_to = date_from + timedelta(days=args.days - 1)
+        weekdays = sum(1 for i in range(args.days) if (date_from + timedelta(days=i)).weekday() < 5)
+        off = sum(1 for i in range(args.doctors) if (date.today() + timedelta(days=7 + i % 14)).weekday() < 5
+                  and date_from <= date.today() + timedelta(days=7 + i % 14) <= date_to)
+        expected = (args.doctors * weekdays - off) * 14
+
+        started = time.perf_counter()
+        created = generate_slots(date_from, date_to, doctor_ids=doctor_ids)
+        db.session.commit()
+        elapsed = time.perf_counter() - started
+        print(f'generate_slots: {args.doctors} doctors x {args.days} days -> {created} slots '
+              f'in {elapsed:.2f}s ({created / elapsed:,.0f} slots/s)')
+        if created != expected:
+            print(f'  FAIL expected {expected} slots')
+            failures += 1
+
+        started = time.perf_counter()
+        again = generate_slots(date_from, date_to, doctor_ids=doctor_ids)
+        db.session.commit()
+        print(f'second run over the same range: {again} slots in {time.perf_counter() - started:.2f}s')
+        if again:
+            print('  FAIL re-running created duplicates')
+            failures += 1
+
+        if args.naive_doctors:
+            naive_from = date_to + timedelta(days=1)
+            naive_to = naive_from + timedelta(days=args.days - 1)
+            templates = ScheduleTemplate.query.filter(
+                ScheduleTemplate.doctor_id.in_(doctor_ids[:args.naive_doctors])).all()
+            started = time.perf_counter()
+            naive_created = naive_generate(db, TimeSlot, templates, naive_from, naive_to)
+            naive_elapsed = time.perf_counter() - started
+            rate = naive_created / naive_elapsed
+            print(f'slot-by-slot: {args.naive_doctors} doctors x {args.days} days -> {naive_created} slots '
+                  f'in {naive_elapsed:.2f}s ({rate:,.0f} slots/s, ~{created / rate:.0f}s for the full run)')
+
+    return 1 if failures else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
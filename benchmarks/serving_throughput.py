@@ -0,0 +1,234 @@
+"""Booking-flow throughput: Werkzeug dev server vs. the gunicorn profile.
+
+Seeds C clinics with D doctors each (a month of 15-minute slots) and P
+patients, then for each server runs U simulated patients for S seconds.
+Each patient logs in once, then repeats the booking flow over one
+keep-alive connection:
+
+    select-clinic -> select-doctor -> select-time -> confirm (GET, POST)
+    -> booking confirmation -> my-appointments
+
+Servers, each on its own copy of the seeded database:
+
+* dev:      ``flask run`` with the debugger on, as ``python local_main.py``
+            serves today (FLASK_ENV=development),
+* gunicorn: ``gunicorn -c gunicorn.conf.py`` (FLASK_ENV=production).
+
+Prints flows/s, requests/s, flow latency percentiles and errors.
+
+    python -m benchmarks.serving_throughput --users 16 --seconds 20
+"""
+import argparse
+import http.client
+import os
+import random
+import re
+import shutil
+import socket
+import statistics
+import subprocess
+import sys
+import threading
+import time
+import urllib.parse
+from datetime import date, time as clock, timedelta
+
+from benchmarks.common import ROOT, load_app
+
+SLOT_LINK = re.compile(r'/book/confirm/(\d+)')
+
+
+def seed(db, clinics, doctors_per_clinic, patients):
+    from werkzeug.security import generate_password_hash
+    from local_models import Clinic, Doctor, ScheduleTemplate, User
+    from local_services.schedules import generate_slots
+
+    first_clinic = (db.session.query(db.func.max(Clinic.id)).scalar() or 0) + 1
+    db.session.execute(db.insert(Clinic), [
+        {'id': first_clinic + i, 'name': f'Clinic {i}', 'address': f'{i} Main Street'} for i in range(clinics)
+    ])
+    first_user = (db.session.query(db.func.max(User.id)).scalar() or 0) + 1
+    count = clinics * doctors_per_clinic
+    password_hash = generate_password_hash('patient123')
+    db.session.execute(db.insert(User), [
+        {'id': first_user + i, 'username': f'doc{i}', 'email': f'doc{i}@example.com',
+         'name': f'Dr. Load {i}', 'role': 'doctor', 'password_hash': 'x'} for i in range(count)
+    ] + [
+        {'id': first_user + count + i, 'username': f'pat{i}', 'email': f'pat{i}@example.com',
+         'name': f'Patient {i}', 'role': 'patient', 'password_hash': password_hash} for i in range(patients)
+    ])
+    first_doctor = (db.session.query(db.func.max(Doctor.id)).scalar() or 0) + 1
+    db.session.execute(db.insert(Doctor), [
+        {'id': first_doctor + i, 'user_id': first_user + i, 'clinic_id': first_clinic + i % clinics,
+         'specialization': 'General Medicine'} for i in range(count)
+    ])
+    db.session.execute(db.insert(ScheduleTemplate), [
+        {'doctor_id': first_doctor + i, 'weekdays': '0,1,2,3,4,5,6', 'start_time': clock(8),
+         'end_time': clock(20), 'slot_minutes': 15, 'breaks': ''} for i in range(count)
+    ])
+    tomorrow = date.today() + timedelta(days=1)
+    generate_slots(tomorrow, tomorrow + timedelta(days=29))
+    db.session.commit()
+    return list(range(first_clinic, first_clinic + clinics))
+
+
+class Client:
+    """One patient: a keep-alive connection and the session cookie."""
+
+    def __init__(self, port):
+        self.connection = http.client.HTTPConnection('127.0.0.1', port, timeout=30)
+        self.cookie = None
+        self.requests = 0
+
+    def request(self, method, path, form=None):
+        headers = {'Cookie': self.cookie} if self.cookie else {}
+        body = None
+        if form is not None:
+            body = urllib.parse.urlencode(form)
+            headers['Content-Type'] = 'application/x-www-form-urlencoded'
+        try:
+            self.connection.request(method, path, body=body, headers=headers)
+            response = self.connection.getresponse()
+        except (http.client.RemoteDisconnected, ConnectionResetError, BrokenPipeError):
+            # The server closed the idle keep-alive connection (keepalive timeout,
+            # worker recycled after max_requests); browsers retry on a new one
+            self.connection.close()
+            self.connection.request(method, path, body=body, headers=headers)
+            response = self.connection.getresponse()
+        text = response.read().decode()
+        self.requests += 1
+        cookie = response.getheader('Set-Cookie')
+        if cookie:
+            self.cookie = cookie.split(';', 1)[0]
+        if response.status >= 500:
+            raise RuntimeError(f'{method} {path}: {response.status}')
+        return response.status, response.getheader('Location'), text
+
+
+def booking_flow(client, rng, clinic_ids):
+    """Book one appointment; False if every offered slot was taken first."""
+    clinic_id = rng.choice(clinic_ids)
+    client.request('GET', '/book/select-clinic')
+    _, _, page = client.request('GET', f'/book/select-doctor/{clinic_id}')
+    doctor_ids = re.findall(r'/book/select-time/(\d+)', page)
+    _, _, page = client.request('GET', f'/book/select-time/{rng.choice(doctor_ids)}')
+    slot_ids = SLOT_LINK.findall(page)
+    if not slot_ids:
+        return False
+    slot_id = rng.choice(slot_ids)
+    client.request('GET', f'/book/confirm/{slot_id}')
+    _, location, _ = client.request('POST', f'/book/confirm/{slot_id}', form={})
+    booked = '/booking-confirmation/' in (location or '')
+    if location:
+        client.request('GET', urllib.parse.urlsplit(location).path)
+    client.request('GET', '/my-appointments')
+    return booked
+
+
+def run_load(port, users, seconds, clinic_ids):
+    stop = time.perf_counter() + seconds
+    flows, clients, errors, lost = [], [], [], []
+    lock = threading.Lock()
+
+    def patient(number):
+        rng = random.Random(number)
+        client = Client(port)
+        clients.append(client)
+        client.request('POST', '/login', form={'email': f'pat{number}@example.com',
+                                               'password': 'patient123', 'role': 'patient'})
+        while time.perf_counter() < stop:
+            started = time.perf_counter()
+            try:
+                booked = booking_flow(client, rng, clinic_ids)
+            except (OSError, RuntimeError, http.client.HTTPException) as exc:
+                with lock:
+                    errors.append(str(exc))
+                client.connection.close()
+                continue
+            with lock:
+                flows.append(time.perf_counter() - started)
+                if not booked:
+                    lost.append(1)
+
+    threads = [threading.Thread(target=patient, args=(number,)) for number in range(users)]
+    started = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    elapsed = time.perf_counter() - started
+    return elapsed, flows, sum(client.requests for client in clients), errors, len(lost)
+
+
+def free_port():
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        return sock.getsockname()[1]
+
+
+def start_server(kind, database_url, port):
+    env = dict(os.environ, DATABASE_URL=database_url, PYTHONPATH=ROOT)
+    if kind == 'dev':
+        env.update(FLASK_ENV='development', FLASK_DEBUG='1')
+        command = [sys.executable, '-m', 'flask', '--app', 'local_main', 'run', '--no-reload',
+                   '--port', str(port)]
+    else:
+        env.update(FLASK_ENV='production')
+        command = [sys.executable, '-m', 'gunicorn', '-c', os.path.join(ROOT, 'gunicorn.conf.py'),
+                   '--bind', f'127.0.0.1:{port}']
+    process = subprocess.Popen(command, cwd=ROOT, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    deadline = time.perf_counter() + 30
+    while time.perf_counter() < deadline:
+        try:
+            connection = http.client.HTTPConnection('127.0.0.1', port, timeout=1)
+            connection.request('GET', '/login')
+            if connection.getresponse().status == 200:
+                return process
+        except OSError:
+            time.sleep(0.05)
+    process.kill()
+    raise RuntimeError(f'{kind} server did not start')
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--users', type=int, default=16, help='concurrent patients')
+    parser.add_argument('--seconds', type=float, default=20)
+    parser.add_argument('--clinics', type=int, default=5)
+    parser.add_argument('--doctors', type=int, default=4, help='doctors per clinic')
+    parser.add_argument('--servers', default='dev,gunicorn')
+    args = parser.parse_args()
+
+    app = load_app()
+    from local_db import db
+    with app.app_context():
+        clinic_ids = seed(db, args.clinics, args.doctors, args.users)
+    template = app.config['SQLALCHEMY_DATABASE_URI'].removeprefix('sqlite:///')
+
+    print(f"{'server':9} {'flows/s':>8} {'req/s':>7} {'p50 ms':>7} {'p95 ms':>7} {'lost':>5} {'errors':>6}")
+    failures = 0
+    for kind in args.servers.split(','):
+        path = f'{template}.{kind}.db'
+        shutil.copyfile(template, path)
+        port = free_port()
+        process = start_server(kind, f'sqlite:///{path}', port)
+        try:
+            elapsed, flows, requests, errors, lost = run_load(port, args.users, args.seconds, clinic_ids)
+        finally:
+            process.terminate()
+            process.wait()
+            os.remove(path)
+        flows.sort()
+        p50 = statistics.median(flows) * 1000 if flows else 0
+        p95 = flows[int(len(flows) * 0.95)] * 1000 if flows else 0
+        print(f'{kind:9} {len(flows) / elapsed:8.1f} {requests / elapsed:7.1f} {p50:7.0f} {p95:7.0f} '
+              f'{lost:5} {len(errors):6}')
+        failures += bool(errors)
+        for error in sorted(set(errors))[:3]:
+            print(f'    {error}')
+    os.remove(template)
+    return 1 if failures else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,184 @@
+"""SQLite under concurrent reads and writes: WAL and pragmas vs. defaults.
+
+Two workloads, SECONDS each, on a fresh database file per mode:
+
+* engine: READERS threads run the open-slot read the booking pages do
+  while WRITERS threads flip slots in short write transactions, straight
+  on the app's engine, so only the database is measured.
+* pages: READERS threads browse the booking pages while WRITERS threads
+  book and cancel appointments through the app (each on its own slots,
+  so every booking should succeed).
+
+Modes:
+
+    rollback  journal_mode=DELETE, synchronous=FULL, no mmap, 2 MB cache,
+              no foreign keys: SQLite's defaults, what the app used before
+    tuned     the SQLITE_* defaults from local_services/database.py
+
+Prints reads/s, writes/s, read latency percentiles and failed writes
+("database is locked" surfaces as a failed write). On a single CPU the
+pages workload is bound by Python, not by SQLite, and hides most of the
+difference the engine workload shows.
+
+    python -m benchmarks.sqlite_concurrency --readers 8 --writers 4 --seconds 10
+"""
+import argparse
+import sys
+import threading
+import time
+from datetime import date, datetime, time as clock, timedelta
+
+from sqlalchemy import text
+
+from benchmarks.common import load_app, login
+
+MODES = {
+    'rollback': {'SQLITE_JOURNAL_MODE': 'DELETE', 'SQLITE_SYNCHRONOUS': 'FULL', 'SQLITE_MMAP_SIZE': 0,
+                 'SQLITE_CACHE_SIZE': -2000, 'SQLITE_FOREIGN_KEYS': False},
+    'tuned': {},
+}
+SLOTS_PER_WRITER = 2000
+
+
+def seed(app, readers, writers):
+    """Patients for every thread and a run of open slots for each writer."""
+    from local_db import db
+    from local_models import Doctor, TimeSlot, User
+    with app.app_context():
+        doctor = Doctor.query.first()
+        for i in range(readers + writers):
+            user = User(username=f'rw{i}', email=f'rw{i}@example.com', name=f'RW Patient {i}', role='patient')
+            user.set_password('rw123456')
+            db.session.add(user)
+        start = datetime.combine(date.today() + timedelta(days=30), clock(0))
+        slots = []
+        for writer in range(writers):
+            ids = []
+            for n in range(SLOTS_PER_WRITER):
+                starts_at = start + timedelta(days=writer * 100, minutes=15 * n)
+                slot = TimeSlot(doctor_id=doctor.id, starts_at=starts_at,
+                                ends_at=starts_at + timedelta(minutes=15), is_available=True)
+                db.session.add(slot)
+                ids.append(slot)
+            slots.append(ids)
+        db.session.commit()
+        return doctor.id, doctor.clinic_id, [[slot.id for slot in ids] for ids in slots]
+
+
+def report(mode, workload, seconds, latencies, writes, failures):
+    latencies.sort()
+    p50 = latencies[len(latencies) // 2] * 1000
+    p99 = latencies[int(len(latencies) * 0.99)] * 1000
+    print(f'{workload:6} {mode:9} {len(latencies) / seconds:7.0f} reads/s  p50 {p50:6.1f} ms  '
+          f'p99 {p99:7.1f} ms  {writes / seconds:7.1f} writes/s  {failures} failed')
+
+
+def run_threads(readers, writers):
+    threads = [threading.Thread(target=reader, args=(i,)) for i, reader in enumerate(readers)]
+    threads += [threading.Thread(target=writer, args=(i,)) for i, writer in enumerate(writers)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+
+def run_engine(mode, app, doctor_id, slots, args):
+    from local_db import db
+    with app.app_context():
+        engine = db.engine
+    read = text('SELECT count(*), min(t.starts_at) FROM time_slot t '
+                'LEFT JOIN appointment a ON a.time_slot_id = t.id '
+                'WHERE t.doctor_id = :doctor_id AND t.is_available = 1')
+    write = text('UPDATE time_slot SET is_available = 1 - is_available WHERE id = :id')
+    deadline = time.monotonic() + args.seconds
+    latencies, writes, failures = [], [0], [0]
+    lock = threading.Lock()
+
+    def reader(index):
+        mine = []
+        while time.monotonic() < deadline:
+            started = time.perf_counter()
+            with engine.connect() as connection:
+                connection.execute(read, {'doctor_id': doctor_id}).all()
+            mine.append(time.perf_counter() - started)
+        with lock:
+            latencies.extend(mine)
+
+    def writer(index):
+        done = failed = 0
+        for slot_id in slots[index] * 10:
+            if time.monotonic() >= deadline:
+                break
+            try:
+                with engine.begin() as connection:
+                    connection.execute(write, {'id': slot_id})
+                done += 1
+            except Exception:
+                failed += 1
+        with lock:
+            writes[0] += done
+            failures[0] += failed
+
+    run_threads([reader] * args.readers, [writer] * args.writers)
+    report(mode, 'engine', args.seconds, latencies, writes[0], failures[0])
+
+
+def run_pages(mode, app, doctor_id, clinic_id, slots, args):
+    pages = ['/book/select-clinic', f'/book/select-doctor/{clinic_id}', f'/book/select-time/{doctor_id}',
+             '/my-appointments']
+    deadline = time.monotonic() + args.seconds
+    latencies, writes, failures = [], [0], [0]
+    lock = threading.Lock()
+
+    def reader(index):
+        client = app.test_client()
+        login(client, f'rw{index}@example.com', 'rw123456', 'patient')
+        mine = []
+        while time.monotonic() < deadline:
+            for path in pages:
+                started = time.perf_counter()
+                client.get(path)
+                mine.append(time.perf_counter() - started)
+        with lock:
+            latencies.extend(mine)
+
+    def writer(index):
+        client = app.test_client()
+        login(client, f'rw{args.readers + index}@example.com', 'rw123456', 'patient')
+        for slot_id in slots[index]:
+            if time.monotonic() >= deadline:
+                break
+            location = client.post(f'/book/confirm/{slot_id}').headers.get('Location', '')
+            booked = '/booking-confirmation/' in location
+            if booked:
+                appointment_id = int(location.rsplit('/', 1)[1])
+                client.post(f'/cancel-appointment/{appointment_id}')
+            with lock:
+                writes[0] += booked
+                failures[0] += not booked
+
+    run_threads([reader] * args.readers, [writer] * args.writers)
+    report(mode, 'pages', args.seconds, latencies, writes[0], failures[0])
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--readers', type=int, default=8)
+    parser.add_argument('--writers', type=int, default=4)
+    parser.add_argument('--seconds', type=float, default=10)
+    args = parser.parse_args()
+    from local_db import db
+    for mode in MODES:
+        app = load_app(config=MODES[mode])
+        doctor_id, clinic_id, slots = seed(app, args.readers, args.writers)
+        run_engine(mode, app, doctor_id, slots, args)
+        # Back to every slot open before the booking run
+        with app.app_context():
+            db.session.execute(text('UPDATE time_slot SET is_available = 1'))
+            db.session.commit()
+        run_pages(mode, app, doctor_id, clinic_id, slots, args)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
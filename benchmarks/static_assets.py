@@ -0,0 +1,121 @@
+"""Static files per page: /static as shipped vs. the build-assets output.
+
+Builds the assets into a scratch directory, then loads the public pages
+the way a browser of the given width does (a background picks its
+@media rule, an <img> its srcset candidate for its sizes) from an app
+without a build and from one with it, and prints for each page the
+files requested, their bytes over the wire (br/gzip accepted) and how
+many a repeat visit asks for again: every /static file is revalidated,
+an immutable /assets file is not.
+
+    python -m benchmarks.static_assets --width 1280
+"""
+import argparse
+import re
+import shutil
+import sys
+import tempfile
+
+from benchmarks.common import load_app
+
+PAGES = ('/', '/login', '/register', '/about')
+ACCEPT = {'Accept-Encoding': 'br, gzip'}
+LOCAL = r'/(?:static|assets)/[^\'")\s]+'
+
+
+def _background_urls(html, width):
+    """The url() each CSS rule ends up with at ``width`` px."""
+    chosen = {}
+    for match in re.finditer(r'(?:@media \(min-width: (\d+)px\) \{\s*)?(\.[\w-]+) \{[^}]*?url\(\'(%s)\'\)' % LOCAL,
+                             html):
+        minimum, selector, url = int(match.group(1) or 0), match.group(2), match.group(3)
+        if minimum <= width and minimum >= chosen.get(selector, (-1, None))[0]:
+            chosen[selector] = (minimum, url)
+    return [url for _, url in chosen.values()]
+
+
+def _slot_width(sizes, width):
+    for size in (part.strip() for part in sizes.split(',')):
+        condition, _, length = size.rpartition(' ')
+        minimum = re.match(r'\(min-width: (\d+)px\)', condition)
+        if minimum and int(minimum.group(1)) > width:
+            continue
+        return width * int(length[:-2]) / 100 if length.endswith('vw') else int(length[:-2])
+    return width
+
+
+def _image_urls(html, width):
+    urls = []
+    for tag in re.findall(r'<img\b[^>]*>', html):
+        attributes = dict(re.findall(r'(\w+)="([^"]*)"', tag))
+        if not re.match(LOCAL, attributes.get('src', '')):
+            continue
+        candidates = [candidate.split() for candidate in attributes.get('srcset', '').split(',')]
+        # No build: the srcset is just the plain URL
+        if not all(len(candidate) == 2 for candidate in candidates):
+            urls.append(attributes['src'])
+            continue
+        needed = _slot_width(attributes.get('sizes', '100vw'), width)
+        candidates = sorted((int(w[:-1]), url) for url, w in candidates)
+        urls.append(next((url for w, url in candidates if w >= needed), candidates[-1][1]))
+    return urls
+
+
+def page_assets(client, path, width):
+    html = client.get(path).get_data(as_text=True)
+    scripts = re.findall(r'<(?:script|link)\b[^>]*(?:src|href)="(%s)"' % LOCAL, html)
+    return scripts + _background_urls(html, width) + _image_urls(html, width)
+
+
+def visit(client, urls):
+    """(found, bytes over the wire, requests on a repeat visit)."""
+    found = sent = repeat = 0
+    for url in urls:
+        response = client.get(url, headers=ACCEPT)
+        if response.status_code != 200:
+            continue
+        found += 1
+        sent += len(response.data)
+        if 'max-age' not in response.headers.get('Cache-Control', ''):
+            repeat += 1
+        response.close()
+    return found, sent, repeat
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--width', type=int, default=1280, help='browser viewport width in px')
+    args = parser.parse_args()
+
+    from local_services import assets
+
+    plain_dir = tempfile.mkdtemp(prefix='clinic-assets-plain-')
+    built_dir = tempfile.mkdtemp(prefix='clinic-assets-built-')
+    try:
+        plain = load_app(config={'METRICS_ENABLED': False, 'ASSETS_DIR': plain_dir})
+        assets.build(plain.static_folder, built_dir, plain.config['ASSET_IMAGE_WIDTHS'])
+        built = load_app(config={'METRICS_ENABLED': False, 'ASSETS_DIR': built_dir})
+
+        print(f'viewport {args.width}px; brotli {"yes" if assets.brotli else "no"}, '
+              f'Pillow {"yes" if assets.Image else "no"}')
+        print(f"{'page':<12} {'files':>6} {'static KB':>10} {'assets KB':>10} {'repeat static':>14} "
+              f"{'repeat assets':>14}")
+        totals = [0, 0, 0, 0]
+        for path in PAGES:
+            rows = [visit(app.test_client(), page_assets(app.test_client(), path, args.width))
+                    for app in (plain, built)]
+            (files, plain_bytes, plain_repeat), (_, built_bytes, built_repeat) = rows
+            print(f'{path:<12} {files:6} {plain_bytes / 1024:10.1f} {built_bytes / 1024:10.1f} '
+                  f'{plain_repeat:14} {built_repeat:14}')
+            for index, value in enumerate((plain_bytes, built_bytes, plain_repeat, built_repeat)):
+                totals[index] += value
+        print(f"{'total':<12} {'':6} {totals[0] / 1024:10.1f} {totals[1] / 1024:10.1f} "
+              f'{totals[2]:14} {totals[3]:14}')
+    finally:
+        shutil.rmtree(plain_dir, ignore_errors=True)
+        shutil.rmtree(built_dir, ignore_errors=True)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
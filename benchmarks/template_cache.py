@@ -0,0 +1,84 @@
+"""Template compilation and rendering with and without their caches.
+
+First the boot cost: compiling every template in a fresh Jinja
+environment from source, and loading them from the bytecode cache an
+earlier start wrote. Then, with C clinics of D doctors, the time to
+serve the home, about and booking pages as a patient with {% cache %}
+fragments rendered every time vs. served from the fragment cache, and
+the hit rate per fragment.
+
+    python -m benchmarks.template_cache --clinics 20 --doctors 20 --iterations 200
+"""
+import argparse
+import shutil
+import sys
+import tempfile
+import time
+
+from benchmarks.common import load_app, login
+from benchmarks.serving_throughput import seed
+
+
+def compile_all(config):
+    from local_app import create_app
+    from local_services import templating
+
+    app = create_app({'METRICS_ENABLED': False, **config})
+    started = time.perf_counter()
+    templating.preload(app)
+    return (time.perf_counter() - started) * 1000, len(app.jinja_env.list_templates(extensions=('html',)))
+
+
+def per_request(client, path, iterations):
+    assert client.get(path).status_code == 200, path
+    started = time.perf_counter()
+    for _ in range(iterations):
+        client.get(path)
+    return (time.perf_counter() - started) / iterations * 1000
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--clinics', type=int, default=20)
+    parser.add_argument('--doctors', type=int, default=20, help='doctors per clinic')
+    parser.add_argument('--iterations', type=int, default=200)
+    args = parser.parse_args()
+
+    directory = tempfile.mkdtemp(prefix='clinic-jinja-bytecode-')
+    try:
+        from_source, templates = compile_all({'TEMPLATE_BYTECODE_CACHE': False})
+        compile_all({'TEMPLATE_BYTECODE_DIR': directory})
+        from_bytecode, _ = compile_all({'TEMPLATE_BYTECODE_DIR': directory})
+    finally:
+        shutil.rmtree(directory, ignore_errors=True)
+    print(f'compile {templates} templates: {from_source:.1f} ms from source, '
+          f'{from_bytecode:.1f} ms from the bytecode cache')
+    print()
+
+    app = load_app(config={'METRICS_ENABLED': False, 'SQL_PROFILE': False})
+    from local_db import db
+    with app.app_context():
+        clinic_id = seed(db, args.clinics, args.doctors, 1)[0]
+
+    client = app.test_client()
+    login(client, 'pat0@example.com', 'patient123', 'patient')
+    pages = ('/', '/about', '/book/select-clinic', f'/book/select-doctor/{clinic_id}')
+    print(f"{'page':<28} {'rendered ms':>12} {'cached ms':>10}")
+    for path in pages:
+        app.config['FRAGMENT_CACHE_ENABLED'] = False
+        rendered = per_request(client, path, args.iterations)
+        app.config['FRAGMENT_CACHE_ENABLED'] = True
+        cached = per_request(client, path, args.iterations)
+        print(f'{path:<28} {rendered:12.2f} {cached:10.2f}')
+    print()
+
+    stats = app.extensions['fragment_cache'].stats()
+    print(f"{'fragment':<28} {'hits':>8} {'misses':>8} {'hit rate':>9}")
+    for name, counts in stats['fragments'].items():
+        print(f"{name:<28} {counts['hits']:8} {counts['misses']:8} {counts['hit_rate']:9.1%}")
+    print(f"{'all':<28} {stats['hits']:8} {stats['misses']:8} {stats['hit_rate']:9.1%}")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,126 @@
+"""Production serving profile: ``gunicorn`` (this file is picked up from
+the working directory) or ``gunicorn -c gunicorn.conf.py``.
+
+Every setting can be overridden from the environment:
+
+    PORT                  listen port (8000)
+    WEB_CONCURRENCY       worker processes (one per CPU)
+    GUNICORN_THREADS      threads per worker (4)
+    GUNICORN_WORKER_CLASS gthread, or gevent for an instance serving the
+                          /events streams (thousands per worker); gevent
+                          also turns EVENTS_ENABLED on
+    GUNICORN_WORKER_CONNECTIONS  open connections per gevent worker (1000)
+    GUNICORN_KEEPALIVE    seconds to hold idle keep-alive connections (5)
+    GUNICORN_MAX_REQUESTS requests before a worker is recycled (1000; 0,
+                          never, under gevent)
+    GUNICORN_TIMEOUT      seconds before a stuck worker is killed (30)
+    LOG_LEVEL             gunicorn and app log level (info)
+    METRICS_DIR           where workers share /metrics totals (a fresh
+                          temporary directory per master; exited
+                          workers' totals are kept in retired.json)
+    EVENTS_DIR            where workers pass live events to each other
+                          (likewise)
+
+The database must be prepared beforehand (``flask --app local_main db
+upgrade``); workers never touch it at boot.
+"""
+import multiprocessing
+import os
+import shutil
+import tempfile
+
+wsgi_app = "local_main:app"
+bind = f"0.0.0.0:{os.environ.get('PORT', 8000)}"
+
+# Import the app once in the master and fork it: workers start in
+# milliseconds and share the imported code pages
+preload_app = True
+
+# One process per core, with threads to cover the time requests spend
+# waiting on the database. More processes than cores only add context
+# switches and SQLite lock contention (benchmarks/serving_throughput.py:
+# 3x4 did 12.9 flows/s on one CPU, 1x4 did 15.9).
+workers = int(os.environ.get("WEB_CONCURRENCY", multiprocessing.cpu_count()))
+threads = int(os.environ.get("GUNICORN_THREADS", 4))
+worker_class = os.environ.get("GUNICORN_WORKER_CLASS", "gthread")
+
+# Every open /events stream holds a thread of a gthread worker until the
+# page closes, so four open pages would stall a worker with four threads.
+# A gevent worker holds each one in a greenlet instead and keeps thousands
+# open: only there are live events on by default. The pages stay on
+# gthread workers, whose threads are not stalled by password hashing; set
+# EVENTS_ENABLED=1 on them only when the proxy sends /events to a gevent
+# instance (README: live events).
+worker_connections = int(os.environ.get("GUNICORN_WORKER_CONNECTIONS", 1000))
+if worker_class == "gevent":
+    # Before the app is loaded, so create_app() picks it up
+    os.environ.setdefault("EVENTS_ENABLED", "1")
+
+# Behind a reverse proxy that reuses upstream connections
+keepalive = int(os.environ.get("GUNICORN_KEEPALIVE", 5))
+
+# Recycle workers now and then to bound slow leaks; the jitter keeps them
+# from all restarting at once. Every /events stream counts as a request,
+# and recycling would drop all of a worker's streams: never under gevent.
+max_requests = int(os.environ.get("GUNICORN_MAX_REQUESTS", 0 if worker_class == "gevent" else 1000))
+max_requests_jitter = max_requests // 10
+
+timeout = int(os.environ.get("GUNICORN_TIMEOUT", 30))
+graceful_timeout = 30
+
+# A scrape reaches one worker; they pool their request metrics here. Set
+# before the app is loaded, so create_app() picks it up.
+metrics_dir = os.environ.setdefault(
+    "METRICS_DIR", os.path.join(tempfile.gettempdir(), f"clinic-metrics-{os.getpid()}"))
+
+# Each worker with open /events streams listens on a socket here; a
+# booking in one worker reaches the streams of all of them. An /events
+# instance and the pages instance on one host must share it.
+events_dir = os.environ.setdefault(
+    "EVENTS_DIR", os.path.join(tempfile.gettempdir(), f"clinic-events-{os.getpid()}"))
+
+loglevel = os.environ.get("LOG_LEVEL", "info").lower()
+accesslog = "-"
+errorlog = "-"
+
+
+def on_starting(server):
+    # Totals from a previous run must not be added to this one's
+    shutil.rmtree(metrics_dir, ignore_errors=True)
+    os.makedirs(metrics_dir)
+    os.makedirs(events_dir, exist_ok=True)
+
+
+def when_ready(server):
+    # Compile the templates once here (from the bytecode cache when an
+    # earlier start left it): workers forked from now on inherit them
+    from local_main import app
+    from local_services import templating
+
+    templating.preload(app)
+
+
+def on_exit(server):
+    shutil.rmtree(metrics_dir, ignore_errors=True)
+    try:
+        os.rmdir(events_dir)  # unless another instance still uses it
+    except OSError:
+        pass
+
+
+def child_exit(server, worker):
+    # Keep the exited worker's totals in retired.json, not in a file of its own
+    from local_services import metrics
+
+    metrics.retire(metrics_dir, worker.pid)
+
+
+def post_fork(server, worker):
+    # Connections must not be shared across the fork. Building the app opens
+    # none, but drop any the master may have made so each worker starts clean.
+    from local_db import db
+    from local_main import app
+
+    with app.app_context():
+        for engine in db.engines.values():
+            engine.dispose(close=False)
@@ -1,147 +1,240 @@
 import os
 import logging
-from local_models import db, User, Patient, Clinic, Doctor, TimeSlot
-from flask import Flask, render_template
+import click
+from flask import Flask, current_app, render_template
+from flask.cli import with_appcontext
 from werkzeug.middleware.proxy_fix import ProxyFix
-import logging
 from local_db import db
+from local_services import assets, database
+
+
+# Root log level per environment (FLASK_ENV); LOG_LEVEL overrides it
+LOG_LEVELS = {"development": "DEBUG", "testing": "WARNING", "production": "INFO"}
+
+
+def env_flag(name, default):
+    value = os.environ.get(name)
+    if value is None:
+        return default
+    return value.lower() not in ("0", "false", "no", "off", "")
+
+
+def default_config():
+    """Settings read from the environment; create_app(config) overrides them."""
+    environment = os.environ.get("FLASK_ENV", "production")
+
+    return {
+        # Secret key for sessions
+        "SECRET_KEY": os.environ.get("SESSION_SECRET", "your-local-secret-key-for-development-only"),
+        # Configure SQLAlchemy: SQLite unless DATABASE_URL names another
+        # database; engine options come from the DB_* pool settings, SQLite
+        # connection pragmas from SQLITE_*
+        "SQLALCHEMY_DATABASE_URI": database.database_url(os.environ.get("DATABASE_URL")),
+        "SQLALCHEMY_TRACK_MODIFICATIONS": False,
+        **database.pool_config(),
+        **database.sqlite_config(),
+        # Logging: SQL statements are only logged when asked for (SQL_LOG_LEVEL=INFO)
+        "LOG_LEVEL": os.environ.get("LOG_LEVEL", LOG_LEVELS.get(environment, "INFO")).upper(),
+        "SQL_LOG_LEVEL": os.environ.get("SQL_LOG_LEVEL", "WARNING").upper(),
+        # Request metrics on /metrics; METRICS_DIR shares them between workers.
+        # In production /metrics is only served with a METRICS_TOKEN
+        "METRICS_ENABLED": env_flag("METRICS_ENABLED", True),
+        "METRICS_DIR": os.environ.get("METRICS_DIR"),
+        "METRICS_TOKEN": os.environ.get("METRICS_TOKEN"),
+        "METRICS_TOKEN_REQUIRED": env_flag("METRICS_TOKEN_REQUIRED", environment == "production"),
+        # SQL profiler with N+1 warnings and query budgets (development and tests)
+        "SQL_PROFILE": env_flag("SQL_PROFILE", environment in ("development", "testing")),
+        "SQL_PROFILE_STRICT": env_flag("SQL_PROFILE_STRICT", environment == "testing"),
+        "SQL_N_PLUS_ONE_THRESHOLD": int(os.environ.get("SQL_N_PLUS_ONE_THRESHOLD", 5)),
+        "SQL_QUERY_BUDGETS": {},
+        # Password hashing cost (upgraded on login when changed) and how many
+        # hashes a worker computes at once
+        "PASSWORD_HASH_METHOD": os.environ.get("PASSWORD_HASH_METHOD", "scrypt:32768:8:1"),
+        "PASSWORD_HASH_WORKERS": int(os.environ.get("PASSWORD_HASH_WORKERS", os.cpu_count() or 1)),
+        # Per-worker cache of the clinic/doctor directory shown on the booking pages
+        "DIRECTORY_CACHE_SIZE": int(os.environ.get("DIRECTORY_CACHE_SIZE", 512)),
+        "DIRECTORY_CACHE_TTL": int(os.environ.get("DIRECTORY_CACHE_TTL", 300)),
+        # Seconds between refreshes of the dashboard widgets (0 turns them off)
+        "DASHBOARD_REFRESH_SECONDS": int(os.environ.get("DASHBOARD_REFRESH_SECONDS", 30)),
+        # Live booking and slot events on /events (only where gevent workers
+        # serve it, see gunicorn.conf.py); EVENTS_DIR links the workers
+        "EVENTS_ENABLED": env_flag("EVENTS_ENABLED", False),
+        "EVENTS_DIR": os.environ.get("EVENTS_DIR"),
+        "EVENTS_HEARTBEAT": int(os.environ.get("EVENTS_HEARTBEAT", 15)),
+        "EVENTS_BACKLOG": int(os.environ.get("EVENTS_BACKLOG", 100)),
+        # Built static assets (flask build-assets); unset: static/dist
+        "ASSETS_DIR": os.environ.get("ASSETS_DIR"),
+        "ASSET_IMAGE_WIDTHS": assets.image_widths(os.environ.get("ASSET_IMAGE_WIDTHS")),
+        # Compiled templates kept on disk (unset dir: instance/jinja-bytecode),
+        # and {% cache %} fragments kept per worker (off in development)
+        "TEMPLATE_BYTECODE_CACHE": env_flag("TEMPLATE_BYTECODE_CACHE", True),
+        "TEMPLATE_BYTECODE_DIR": os.environ.get("TEMPLATE_BYTECODE_DIR"),
+        "FRAGMENT_CACHE_ENABLED": env_flag("FRAGMENT_CACHE_ENABLED", environment != "development"),
+        "FRAGMENT_CACHE_SIZE": int(os.environ.get("FRAGMENT_CACHE_SIZE", 512)),
+        "FRAGMENT_CACHE_TTL": int(os.environ.get("FRAGMENT_CACHE_TTL", 300)),
+    }
+
+
+def create_app(config=None):
+    """Build the application. Touches no database: run ``flask init-db``
+    and ``flask seed`` (or ``flask db upgrade``) to prepare one."""
+    app = Flask(__name__)
+    app.config.from_mapping(default_config())
+    if config:
+        app.config.from_mapping(config)
+
+    # Enable proxy support (useful if deployed behind reverse proxy)
+    app.wsgi_app = ProxyFix(app.wsgi_app, x_proto=1, x_host=1)
+
+    configure_logging(app)
+
+    # Pool and timeout options for the database in use; explicit
+    # SQLALCHEMY_ENGINE_OPTIONS entries win
+    app.config["SQLALCHEMY_ENGINE_OPTIONS"] = {
+        **database.engine_options(app.config), **app.config.get("SQLALCHEMY_ENGINE_OPTIONS", {})}
+
+    # Initialize SQLAlchemy with app (Flask-Migrate is set up in local_main,
+    # which keeps alembic out of the workers)
+    import local_models  # registers the tables with db.metadata
+    import local_services.search  # creates the search index along with the tables
+    db.init_app(app)
+    database.init_app(app)
+
+    # Registered before the blueprints so its timing wraps their hooks
+    from local_services import metrics, profiler
+    metrics.init_app(app)
+    profiler.init_app(app)
+
+    from local_services import templating
+    templating.init_app(app)
+    assets.init_app(app)
+    register_blueprints(app)
+    for command in (init_db_command, seed_command, reconcile_stats_command,
+                    rebuild_search_index_command, generate_slots_command, build_assets_command):
+        app.cli.add_command(command)
+
+    # Default route
+    @app.route('/')
+    def index():
+        return render_template('index.html')
+
+    return app
+
+
+def configure_logging(app):
+    """Set the root and SQL log levels from the app config."""
+    logging.basicConfig(format="%(asctime)s %(levelname)s [%(process)d] %(name)s: %(message)s")
+    logging.getLogger().setLevel(app.config["LOG_LEVEL"])
+    # A DEBUG root would otherwise make SQLAlchemy log every statement
+    logging.getLogger("sqlalchemy.engine").setLevel(app.config["SQL_LOG_LEVEL"])
 
-# Create Flask app
-app = Flask(__name__)
-
-# Enable proxy support (useful if deployed behind reverse proxy)
-app.wsgi_app = ProxyFix(app.wsgi_app, x_proto=1, x_host=1)
-
-# Development logging setup
-logging.basicConfig(level=logging.DEBUG)
-
-# Secret key for sessions
-app.secret_key = os.environ.get("SESSION_SECRET", "your-local-secret-key-for-development-only")
-
-# Determine database URL (use SQLite for local development if not set)
-database_url = os.environ.get("DATABASE_URL")
-if not database_url or database_url.startswith("postgresql://"):
-    database_url = "sqlite:///clinic_appointments.db"
-
-# Configure SQLAlchemy
-app.config["SQLALCHEMY_DATABASE_URI"] = database_url
-app.config["SQLALCHEMY_ENGINE_OPTIONS"] = {
-    "pool_recycle": 300,
-    "pool_pre_ping": True,
-}
-app.config["SQLALCHEMY_TRACK_MODIFICATIONS"] = False
-
-# Initialize SQLAlchemy with app
-db.init_app(app)
 
 # Register blueprints
-def register_blueprints():
+def register_blueprints(app):
     from local_routes.auth import auth_bp
     from local_routes.booking import booking_bp
     from local_routes.admin import admin_bp
     from local_routes.doctor import doctor_bp
+    from local_routes.metrics import metrics_bp
+    from local_routes.events import events_bp
+    from local_routes.assets import assets_bp
 
     app.register_blueprint(auth_bp)
     app.register_blueprint(booking_bp)
     app.register_blueprint(admin_bp)
     app.register_blueprint(doctor_bp)
+    app.register_blueprint(metrics_bp)
+    app.register_blueprint(events_bp)
+    app.register_blueprint(assets_bp)
+
+
+@click.command('init-db')
+@with_appcontext
+def init_db_command():
+    """Create missing tables and backfill the counters and search index."""
+    from local_services.seed import create_schema
+
+    create_schema()
+    print("Database tables are ready.")
+
+
+@click.command('seed')
+@with_appcontext
+def seed_command():
+    """Add the default admin, a sample clinic and doctor, and their slots."""
+    from local_services.seed import seed_demo_data
+
+    seed_demo_data()
+
+
+@click.command('reconcile-stats')
+@with_appcontext
+def reconcile_stats_command():
+    """Rebuild the dashboard counters from the source tables and report drift."""
+    from local_services.stats import reconcile
+
+    drift = reconcile()
+    db.session.commit()
+    if not drift:
+        print("Dashboard counters are in sync.")
+    for name, (stored, actual) in sorted(drift.items()):
+        print(f"{name}: counter was {stored}, actual {actual} (fixed)")
+
+
+@click.command('rebuild-search-index')
+@with_appcontext
+def rebuild_search_index_command():
+    """Rebuild the appointment search index from the source tables.
+
+    Creates the index first if it is missing, e.g. the PostgreSQL trigram
+    index once pg_trgm has been installed."""
+    from local_services.search import create_search_index, rebuild
+
+    create_search_index(db.session.connection())
+    rebuild()
+    db.session.commit()
+    print("Appointment search index rebuilt.")
+
+
+@click.command('generate-slots')
+@click.option('--days', default=90, show_default=True, help='How many days ahead to fill, starting today.')
+@click.option('--doctor-id', type=int, multiple=True, help='Only these doctors (repeatable). Default: all.')
+@with_appcontext
+def generate_slots_command(days, doctor_id):
+    """Create time slots from the doctors' weekly working hours."""
+    from datetime import date, timedelta
+    from local_services.schedules import MAX_GENERATE_DAYS, generate_slots
+
+    if not 1 <= days <= MAX_GENERATE_DAYS:
+        raise click.BadParameter(f"must be between 1 and {MAX_GENERATE_DAYS}", param_hint="--days")
+    today = date.today()
+    created = generate_slots(today, today + timedelta(days=days - 1), doctor_ids=list(doctor_id) or None)
+    db.session.commit()
+    print(f"{created} time slot(s) created.")
+
+
+@click.command('build-assets')
+@click.option('--clean', is_flag=True, help='Remove earlier builds first.')
+@with_appcontext
+def build_assets_command(clean):
+    """Fingerprint, precompress and resize the static files for /assets."""
+    out_dir = current_app.extensions['assets'].directory
+    manifest = assets.build(current_app.static_folder, out_dir, current_app.config['ASSET_IMAGE_WIDTHS'],
+                            clean=clean)
+    if assets.brotli is None:
+        print("brotli is not installed: only gzip variants were written.")
+    if assets.Image is None:
+        print("Pillow is not installed: images were copied, not resized.")
+    print(f"{len(manifest)} asset(s) built in {out_dir}. Restart the workers to serve them.")
 
-register_blueprints()
-
-# Create default data inside app context
-with app.app_context():
-    import local_models
-    db.create_all()
-
-    from local_models import User, Clinic, Doctor, TimeSlot
-    from werkzeug.security import generate_password_hash
-    from datetime import datetime, timedelta
-
-    # Admin setup
-    if not User.query.filter_by(email='admin@clinic.com').first():
-        admin_user = User(
-            email='admin@clinic.com',
-            name='System Administrator',
-            username='admin',
-            phone='555-0123',
-            role='admin',
-            password_hash=generate_password_hash('admin123')
-        )
-        db.session.add(admin_user)
-        db.session.commit()
-        print("✅ Default admin created: admin@clinic.com / admin123")
-
-    # Clinic setup
-    clinic = Clinic.query.filter_by(name='General Medical Center').first()
-    if not clinic:
-        clinic = Clinic(
-            name='General Medical Center',
-            address='123 Health Street, Medical City',
-            phone='555-0100',
-            email='info@generalmedical.com'
-        )
-        db.session.add(clinic)
-        db.session.commit()
-        print("🏥 Sample clinic created.")
-
-    # Doctor setup
-    doctor_user = User.query.filter_by(email='doctor@clinic.com').first()
-    if not doctor_user:
-        doctor_user = User(
-            email='doctor@clinic.com',
-            name='Dr. Sarah Johnson',
-            username='drsarah',
-            phone='555-0124',
-            role='doctor',
-            password_hash=generate_password_hash('doctor123')
-        )
-        db.session.add(doctor_user)
-        db.session.commit()
-
-    # Re-fetch user to ensure ID is available
-    doctor_user = User.query.filter_by(email='doctor@clinic.com').first()
-
-    # Now check and add doctor profile
-    doctor_profile = Doctor.query.filter_by(user_id=doctor_user.id).first()
-    if not doctor_profile:
-        doctor_profile = Doctor(
-            user_id=doctor_user.id,
-            clinic_id=clinic.id,
-            specialization='General Medicine',
-            license_number='MD123456',
-            years_experience=8
-        )
-        db.session.add(doctor_profile)
-        db.session.commit()
-        print("👩‍⚕️ Sample doctor created: doctor@clinic.com / doctor123")
-
-        # Add time slots for next 7 days
-        for day_offset in range(7):
-            date = datetime.now().date() + timedelta(days=day_offset)
-            for hour in range(9, 12):  # Morning
-                db.session.add(TimeSlot(
-                    doctor_id=doctor_profile.id,
-                    date=date,
-                    start_time=f"{hour:02d}:00",
-                    end_time=f"{hour+1:02d}:00",
-                    is_available=True
-                ))
-            for hour in range(14, 17):  # Afternoon
-                db.session.add(TimeSlot(
-                    doctor_id=doctor_profile.id,
-                    date=date,
-                    start_time=f"{hour:02d}:00",
-                    end_time=f"{hour+1:02d}:00",
-                    is_available=True
-                ))
-        db.session.commit()
-        print("🕒 Sample time slots created for Dr. Sarah Johnson")
-
-# Default route
-@app.route('/')
-def index():
-    return render_template('index.html')
 
 # Run locally
 if __name__ == '__main__':
+    from local_services.seed import create_schema, seed_demo_data
+
+    app = create_app()
+    # The development server prepares its own database; workers never do
+    with app.app_context():
+        create_schema()
+        seed_demo_data()
     app.run(host='127.0.0.1', port=5000, debug=True)
@@ -1,16 +1,23 @@
 import os
 from dotenv import load_dotenv
 from flask_migrate import Migrate
-from local_db import db 
+from local_db import db
 
 
 # Load environment variables from .env file (optional for SQLite setup)
 load_dotenv()
 
-# Import the local app configuration
-from local_app import app
+# Build the app from the local configuration (no database work here)
+from local_app import create_app
+app = create_app()
 migrate = Migrate(app, db)
 if __name__ == '__main__':
+    # The development server prepares its own database; workers never do
+    from local_services.seed import create_schema, seed_demo_data
+    with app.app_context():
+        create_schema()
+        seed_demo_data()
+
     # Get port from environment variable or default to 5000
     port = int(os.environ.get('PORT', 5000))
     
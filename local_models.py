@@ -1,6 +1,6 @@
 from local_db import db
-from datetime import datetime
-from werkzeug.security import generate_password_hash, check_password_hash
+from datetime import datetime, time, timedelta
+from local_services import passwords
 
 class User(db.Model):
 
@@ -19,10 +19,10 @@ class User(db.Model):
     patient_profile = db.relationship('Patient', backref='user', uselist=False)
 
     def set_password(self, password):
-        self.password_hash = generate_password_hash(password)
+        self.password_hash = passwords.hash_password(password)
 
     def check_password(self, password):
-        return check_password_hash(self.password_hash, password)
+        return passwords.check_password(self.password_hash, password)
 
     @property
     def full_name(self):
@@ -82,14 +82,50 @@ class Doctor(db.Model):
 class TimeSlot(db.Model):
     id = db.Column(db.Integer, primary_key=True)
     doctor_id = db.Column(db.Integer, db.ForeignKey('doctor.id'), nullable=False)
-    date = db.Column(db.Date, nullable=False)
-    start_time = db.Column(db.String(10), nullable=False)
-    end_time = db.Column(db.String(10), nullable=False)
+    starts_at = db.Column(db.DateTime, nullable=False)
+    ends_at = db.Column(db.DateTime, nullable=False)
     is_available = db.Column(db.Boolean, default=True)
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
 
     appointments = db.relationship('Appointment', backref='time_slot', lazy=True)
 
+    __table_args__ = (
+        # Doctor schedule, day views and overlap checks: one range scan per doctor;
+        # id makes (starts_at, id) a keyset pagination key
+        db.Index('ix_time_slot_doctor_starts_at', 'doctor_id', 'starts_at', 'id'),
+        # Patient booking (select_time) only ever looks at open slots
+        db.Index('ix_time_slot_open_doctor_starts_at', 'doctor_id', 'starts_at',
+                 sqlite_where=is_available == True, postgresql_where=is_available == True),
+        # Admin slot manager: date windows across all doctors
+        db.Index('ix_time_slot_starts_at', 'starts_at'),
+        # "Next free slot after now" across doctors
+        db.Index('ix_time_slot_open_starts_at', 'starts_at',
+                 sqlite_where=is_available == True, postgresql_where=is_available == True),
+    )
+
+    @classmethod
+    def on_date(cls, day):
+        """Filter for slots starting on ``day``, expressed as an indexable range."""
+        day_start = datetime.combine(day, time.min)
+        return db.and_(cls.starts_at >= day_start, cls.starts_at < day_start + timedelta(days=1))
+
+    @classmethod
+    def overlapping(cls, doctor_id, starts_at, ends_at):
+        """Filter for this doctor's slots that overlap [starts_at, ends_at)."""
+        return db.and_(cls.doctor_id == doctor_id, cls.starts_at < ends_at, cls.ends_at > starts_at)
+
+    @property
+    def date(self):
+        return self.starts_at.date()
+
+    @property
+    def start_time(self):
+        return self.starts_at.strftime('%H:%M')
+
+    @property
+    def end_time(self):
+        return self.ends_at.strftime('%H:%M')
+
     @property
     def formatted_time(self):
         return f"{self.start_time} - {self.end_time}"
@@ -110,6 +146,18 @@ class Appointment(db.Model):
     notes = db.Column(db.Text)
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
 
+    __table_args__ = (
+        # Doctor dashboard counters and status-filtered appointment lists
+        db.Index('ix_appointment_doctor_status', 'doctor_id', 'status'),
+        # Join from time slot to its appointments (schedule, doctor dashboard by date)
+        db.Index('ix_appointment_time_slot', 'time_slot_id'),
+        # Appointment lists, newest first, keyset paginated on (created_at, id):
+        # patient history (my_appointments), doctor list and admin list
+        db.Index('ix_appointment_patient_created', 'patient_id', 'created_at', 'id'),
+        db.Index('ix_appointment_doctor_created', 'doctor_id', 'created_at', 'id'),
+        db.Index('ix_appointment_created', 'created_at', 'id'),
+    )
+
     @property
     def patient_name(self):
         return self.patient.name if self.patient else "Unknown"
@@ -132,3 +180,70 @@ class Appointment(db.Model):
 
     def __repr__(self):
         return f'<Appointment {self.patient_name} with {self.doctor_name}>'
+
+class StatCounter(db.Model):
+    """Running totals for the admin dashboard, kept by local_services.stats."""
+    name = db.Column(db.String(50), primary_key=True)
+    value = db.Column(db.Integer, nullable=False, default=0)
+
+    def __repr__(self):
+        return f'<StatCounter {self.name}={self.value}>'
+
+class ScheduleTemplate(db.Model):
+    """Weekly working hours for a doctor, turned into TimeSlots by local_services.schedules."""
+    id = db.Column(db.Integer, primary_key=True)
+    doctor_id = db.Column(db.Integer, db.ForeignKey('doctor.id'), nullable=False, index=True)
+    weekdays = db.Column(db.String(20), nullable=False, default='0,1,2,3,4')  # Monday is 0
+    start_time = db.Column(db.Time, nullable=False)
+    end_time = db.Column(db.Time, nullable=False)
+    slot_minutes = db.Column(db.Integer, nullable=False, default=30)
+    breaks = db.Column(db.String(200), nullable=False, default='')  # e.g. "12:00-13:00,15:30-15:45"
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+
+    doctor = db.relationship('Doctor', backref=db.backref('schedule_templates', lazy=True))
+
+    WEEKDAY_NAMES = ('Mon', 'Tue', 'Wed', 'Thu', 'Fri', 'Sat', 'Sun')
+
+    @property
+    def weekday_numbers(self):
+        return tuple(int(day) for day in self.weekdays.split(',') if day != '')
+
+    @property
+    def weekday_names(self):
+        return ', '.join(self.WEEKDAY_NAMES[day] for day in self.weekday_numbers)
+
+    @property
+    def formatted_hours(self):
+        return f"{self.start_time.strftime('%H:%M')} - {self.end_time.strftime('%H:%M')}"
+
+    def __repr__(self):
+        return f'<ScheduleTemplate doctor={self.doctor_id} {self.weekdays} {self.formatted_hours}>'
+
+class ScheduleException(db.Model):
+    """A day off for a doctor; no slots are generated for it."""
+    id = db.Column(db.Integer, primary_key=True)
+    doctor_id = db.Column(db.Integer, db.ForeignKey('doctor.id'), nullable=False)
+    date = db.Column(db.Date, nullable=False)
+    reason = db.Column(db.String(200))
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+
+    doctor = db.relationship('Doctor', backref=db.backref('schedule_exceptions', lazy=True))
+
+    __table_args__ = (
+        db.UniqueConstraint('doctor_id', 'date', name='uq_schedule_exception_doctor_date'),
+    )
+
+    def __repr__(self):
+        return f'<ScheduleException doctor={self.doctor_id} {self.date}>'
+
+class DataVersion(db.Model):
+    """Change counter per kind of data, bumped in the writing transaction.
+
+    Shared by every worker through the database, so caches keyed on it
+    (local_services.cache) notice writes made by any process.
+    """
+    name = db.Column(db.String(50), primary_key=True)
+    version = db.Column(db.Integer, nullable=False, default=0)
+
+    def __repr__(self):
+        return f'<DataVersion {self.name}={self.version}>'
@@ -1,15 +1,28 @@
-from flask import Blueprint, request, render_template, redirect, url_for, session, flash, jsonify
-from local_models import User, Clinic, Doctor, TimeSlot, Appointment,Patient
+import os
+from flask import Blueprint, current_app, request, render_template, redirect, url_for, session, flash, jsonify
+from local_models import User, Clinic, Doctor, TimeSlot, Appointment, ScheduleTemplate, ScheduleException
 from local_db import db
-from datetime import datetime, date, time
-from werkzeug.security import generate_password_hash
+from local_services.conditional import etag_for, not_modified, tagged
+from local_services.appointments import appointment_listing_query, paginate_appointments, recent_appointments as load_recent_appointments
+from local_services.directory import directory_cache
+from local_services.identity import require_role
+from local_services.pagination import paginate_rows
+from local_services.profiler import query_budget
+from local_services.schedules import MAX_GENERATE_DAYS, generate_slots, last_generate_day, parse_template_fields
+from local_services.search import matching as search_matching
+from local_services.slots import clamp_window, clinic_choices, doctor_choices, slot_window_query
+from local_services.stats import dashboard_counts
+from local_services.versions import current_versions
+from datetime import datetime, date, time, timedelta
+from sqlalchemy.orm import joinedload
 
 admin_bp = Blueprint('admin_bp', __name__)
 
+# Appointments listed under "Recent" on the dashboard
+RECENT_APPOINTMENTS = 10
+
 def require_admin():
-    if 'user_id' not in session or session.get('user_role') != 'admin':
-        return redirect(url_for('auth_bp.login'))
-    return None
+    return require_role('admin')
 
 @admin_bp.route('/admin')
 def dashboard():
@@ -17,21 +30,48 @@ def dashboard():
     if redirect_response:
         return redirect_response
     
-    # Get summary statistics
-    total_patients = User.query.filter_by(role='patient').count()
-    total_doctors = User.query.filter_by(role='doctor').count()
-    total_clinics = Clinic.query.count()
-    total_appointments = Appointment.query.count()
+    # Summary statistics come from the maintained counters, not COUNT(*)
+    stats = dashboard_counts()
     
     # Recent appointments
-    recent_appointments = Appointment.query.order_by(Appointment.created_at.desc()).limit(10).all()
+    recent_appointments = load_recent_appointments(RECENT_APPOINTMENTS)
     
     return render_template('admin/dashboard.html', 
-                         total_patients=total_patients,
-                         total_doctors=total_doctors,
-                         total_clinics=total_clinics,
-                         total_appointments=total_appointments,
-                         recent_appointments=recent_appointments)
+                         recent_appointments=recent_appointments,
+                         **_stats_context(stats))
+
+def _stats_context(stats):
+    # The stats card counts the recent appointments: no need to load them
+    return {**stats, 'recent_count': min(RECENT_APPOINTMENTS, stats['total_appointments'])}
+
+def _widget_etag(widget):
+    # Both widgets show appointments and the directory (names, counts)
+    return etag_for(widget, date.today(), *current_versions('dashboard', 'directory'))
+
+@admin_bp.route('/admin/widgets/stats')
+def dashboard_stats():
+    redirect_response = require_admin()
+    if redirect_response:
+        return redirect_response
+
+    etag = _widget_etag('admin-stats')
+    response = not_modified(etag)
+    if response:
+        return response
+    return tagged(render_template('admin/_stats.html', **_stats_context(dashboard_counts())), etag)
+
+@admin_bp.route('/admin/widgets/upcoming')
+def dashboard_upcoming():
+    redirect_response = require_admin()
+    if redirect_response:
+        return redirect_response
+
+    etag = _widget_etag('admin-upcoming')
+    response = not_modified(etag)
+    if response:
+        return response
+    return tagged(render_template('admin/_upcoming_appointments.html',
+                                  recent_appointments=load_recent_appointments(RECENT_APPOINTMENTS)), etag)
 
 @admin_bp.route('/admin/clinics')
 def manage_clinics():
@@ -69,7 +109,7 @@ def add_clinic():
             db.session.add(clinic)
             db.session.commit()
             flash('Clinic added successfully!', 'success')
-            return redirect(url_for('admin.manage_clinics'))
+            return redirect(url_for('admin_bp.manage_clinics'))
         except Exception as e:
             db.session.rollback()
             flash('An error occurred while adding the clinic.', 'error')
@@ -109,6 +149,10 @@ def edit_clinic(clinic_id):
 
 @admin_bp.route('/clinics/delete/<int:clinic_id>', methods=['POST'])
 def delete_clinic(clinic_id):
+    redirect_response = require_admin()
+    if redirect_response:
+        return redirect_response
+
     clinic = Clinic.query.get_or_404(clinic_id)
 
     if clinic.doctors:
@@ -128,12 +172,13 @@ def delete_clinic(clinic_id):
 
 
 @admin_bp.route('/admin/doctors')
+@query_budget(3)
 def manage_doctors():
     redirect_response = require_admin()
     if redirect_response:
         return redirect_response
     
-    doctors = Doctor.query.all()
+    doctors = Doctor.query.options(joinedload(Doctor.user), joinedload(Doctor.clinic)).all()
     return render_template('admin/manage_doctors.html', doctors=doctors)
 
 
@@ -195,7 +240,7 @@ def add_doctor():
 
         except Exception as e:
                db.session.rollback()
-               print("Error adding doctor:", e)  # So you can see it in the console
+               current_app.logger.exception("Error adding doctor")
                flash(f'An error occurred while adding the doctor: {str(e)}', 'error')
                return redirect(url_for('admin_bp.manage_doctors'))
 
@@ -205,6 +250,10 @@ def add_doctor():
 
 @admin_bp.route('/edit_doctor/<int:doctor_id>', methods=['GET', 'POST'])
 def edit_doctor(doctor_id):
+    redirect_response = require_admin()
+    if redirect_response:
+        return redirect_response
+
     doctor = Doctor.query.get_or_404(doctor_id)
     user = doctor.user
     clinics = Clinic.query.all()
@@ -235,6 +284,10 @@ def edit_doctor(doctor_id):
 
 @admin_bp.route('/delete_doctor/<int:doctor_id>', methods=['POST'])
 def delete_doctor(doctor_id):
+    redirect_response = require_admin()
+    if redirect_response:
+        return redirect_response
+
     doctor = Doctor.query.get_or_404(doctor_id)
     user = doctor.user
 
@@ -269,7 +322,7 @@ def manage_appointments():
     date_filter = request.args.get('date')
     search_filter = request.args.get('search', '').strip()
 
-    query = Appointment.query
+    query = appointment_listing_query()
 
     # Apply status filter if not 'all'
     if status_filter and status_filter != 'all':
@@ -280,27 +333,18 @@ def manage_appointments():
         try:
             from datetime import datetime
             date_obj = datetime.strptime(date_filter, '%Y-%m-%d').date()
-            query = query.join(Appointment.time_slot).filter(Appointment.time_slot.date == date_obj)
+            query = query.filter(TimeSlot.on_date(date_obj))
         except ValueError:
             pass  # Invalid date, ignore
 
-    # Apply search filter if present (search by patient name, doctor name, or clinic name)
+    # Search patient name/email/phone, doctor name and clinic name
+    # through the appointment search index
     if search_filter:
-        # Join necessary tables and filter by search string
-        query = query.join(Appointment.patient).join(Appointment.doctor).join(Appointment.doctor.clinic).filter(
-            db.or_(
-                Patient.name.ilike(f'%{search_filter}%'),
-                Doctor.user.has(name=db.func.lower(search_filter)),  # or ilike
-                Clinic.name.ilike(f'%{search_filter}%')
-            )
-        )
+        query = query.filter(search_matching(search_filter))
 
-    # Order results
-    query = query.order_by(Appointment.created_at.desc())
-
-    # Pagination example: get page number from query string
-    page = request.args.get('page', 1, type=int)
-    appointments = query.paginate(page=page, per_page=10)
+    # Newest first, paginated by cursor rather than OFFSET
+    appointments = paginate_appointments(query, after=request.args.get('after'),
+                                         before=request.args.get('before'), per_page=10)
 
     # Render template with filters to keep UI state
     return render_template('admin/manage_appointments.html',
@@ -316,17 +360,45 @@ def manage_time_slots():
     if redirect_response:
         return redirect_response
     
-    time_slots = TimeSlot.query.order_by(TimeSlot.date.desc(), TimeSlot.start_time).all()
-    return render_template('admin/manage_time_slots.html', time_slots=time_slots)
+    clinic_id = request.args.get('clinic_id', type=int)
+    doctor_id = request.args.get('doctor_id', type=int)
+    availability = request.args.get('availability', '')
+    date_from = date_to = None
+    try:
+        if request.args.get('date_from'):
+            date_from = datetime.strptime(request.args['date_from'], '%Y-%m-%d').date()
+        if request.args.get('date_to'):
+            date_to = datetime.strptime(request.args['date_to'], '%Y-%m-%d').date()
+    except ValueError:
+        flash('Invalid date format.', 'error')
+    # Always a bounded window, never every slot ever created
+    date_from, date_to = clamp_window(date_from, date_to, date.today())
+
+    page = request.args.get('page', 1, type=int)
+    time_slots = paginate_rows(
+        slot_window_query(date_from, date_to, clinic_id=clinic_id, doctor_id=doctor_id, availability=availability),
+        page=page, per_page=24, max_per_page=100, error_out=False
+    )
+
+    return render_template('admin/manage_time_slots.html',
+                           time_slots=time_slots,
+                           clinics=db.session.execute(clinic_choices()).all(),
+                           doctors=db.session.execute(doctor_choices(clinic_id)).all(),
+                           selected_clinic_id=clinic_id,
+                           selected_doctor_id=doctor_id,
+                           date_from=date_from.isoformat(),
+                           date_to=date_to.isoformat(),
+                           availability=availability)
 
 
 @admin_bp.route('/admin/time-slots/add', methods=['GET', 'POST'])
+@query_budget(5)
 def add_time_slot():
     redirect_response = require_admin()
     if redirect_response:
         return redirect_response
     
-    doctors = Doctor.query.all()
+    doctors = Doctor.query.options(joinedload(Doctor.user), joinedload(Doctor.clinic)).all()
     
     if request.method == 'POST':
         doctor_id = request.form.get('doctor_id')
@@ -339,21 +411,30 @@ def add_time_slot():
             return render_template('admin/add_time_slot.html', doctors=doctors)
         
         try:
-            appointment_date = datetime.strptime(date_str, '%Y-%m-%d').date()
-            
-            time_slot = TimeSlot(
-                doctor_id=int(doctor_id),
-                date=appointment_date,
-                start_time=start_time,
-                end_time=end_time,
-                is_available=True
-            )
-            
-            db.session.add(time_slot)
-            db.session.commit()
-            flash('Time slot added successfully!', 'success')
-            return redirect(url_for('admin_bp.manage_time_slots'))
-            
+            starts_at = datetime.strptime(f'{date_str} {start_time}', '%Y-%m-%d %H:%M')
+            ends_at = datetime.strptime(f'{date_str} {end_time}', '%Y-%m-%d %H:%M')
+
+            existing_slot = TimeSlot.query.filter(
+                TimeSlot.overlapping(int(doctor_id), starts_at, ends_at)
+            ).first()
+
+            if ends_at <= starts_at:
+                flash('End time must be after start time.', 'error')
+            elif existing_slot:
+                flash('A time slot already exists for this date and time.', 'warning')
+            else:
+                time_slot = TimeSlot(
+                    doctor_id=int(doctor_id),
+                    starts_at=starts_at,
+                    ends_at=ends_at,
+                    is_available=True
+                )
+
+                db.session.add(time_slot)
+                db.session.commit()
+                flash('Time slot added successfully!', 'success')
+                return redirect(url_for('admin_bp.manage_time_slots'))
+
         except Exception as e:
             db.session.rollback()
             flash('An error occurred while adding the time slot.', 'error')
@@ -362,5 +443,182 @@ def add_time_slot():
 
 @admin_bp.route('/delete_time_slot/<int:slot_id>', methods=['POST'])
 def delete_time_slot(slot_id):
+    redirect_response = require_admin()
+    if redirect_response:
+        return redirect_response
+
     flash(f"Delete route not implemented yet (slot ID: {slot_id})", "info")
     return redirect(url_for('admin_bp.manage_time_slots'))
+
+
+@admin_bp.route('/admin/working-hours', methods=['GET', 'POST'])
+def working_hours():
+    redirect_response = require_admin()
+    if redirect_response:
+        return redirect_response
+
+    doctor_id = request.args.get('doctor_id', type=int)
+
+    if request.method == 'POST':
+        form_doctor_id = request.form.get('doctor_id', type=int)
+        try:
+            if not form_doctor_id or not db.session.get(Doctor, form_doctor_id):
+                raise ValueError('Select a doctor.')
+            fields = parse_template_fields(
+                request.form.getlist('weekdays'),
+                request.form.get('start_time'),
+                request.form.get('end_time'),
+                request.form.get('slot_minutes'),
+                request.form.get('breaks', '')
+            )
+        except ValueError as e:
+            flash(str(e), 'error')
+        else:
+            try:
+                db.session.add(ScheduleTemplate(doctor_id=form_doctor_id, **fields))
+                db.session.commit()
+                flash('Working hours added.', 'success')
+                return redirect(url_for('admin_bp.working_hours', doctor_id=form_doctor_id))
+            except Exception as e:
+                db.session.rollback()
+                flash('An error occurred while saving the working hours.', 'error')
+
+    query = ScheduleTemplate.query.options(
+        joinedload(ScheduleTemplate.doctor).joinedload(Doctor.user)
+    )
+    if doctor_id:
+        query = query.filter(ScheduleTemplate.doctor_id == doctor_id)
+    page = request.args.get('page', 1, type=int)
+    templates = query.order_by(ScheduleTemplate.doctor_id, ScheduleTemplate.id).paginate(
+        page=page, per_page=25, error_out=False
+    )
+
+    exceptions = []
+    if doctor_id:
+        exceptions = ScheduleException.query.filter(
+            ScheduleException.doctor_id == doctor_id,
+            ScheduleException.date >= date.today()
+        ).order_by(ScheduleException.date).all()
+
+    return render_template('admin/working_hours.html',
+                           templates=templates,
+                           exceptions=exceptions,
+                           doctors=db.session.execute(doctor_choices()).all(),
+                           selected_doctor_id=doctor_id,
+                           weekday_names=ScheduleTemplate.WEEKDAY_NAMES,
+                           today_date=date.today().isoformat(),
+                           default_until=(date.today() + timedelta(days=89)).isoformat())
+
+
+@admin_bp.route('/admin/working-hours/<int:template_id>/delete', methods=['POST'])
+def delete_working_hours(template_id):
+    redirect_response = require_admin()
+    if redirect_response:
+        return redirect_response
+
+    template = ScheduleTemplate.query.get_or_404(template_id)
+    doctor_id = template.doctor_id
+    try:
+        db.session.delete(template)
+        db.session.commit()
+        flash('Working hours removed. Slots already created are kept.', 'success')
+    except Exception as e:
+        db.session.rollback()
+        flash('An error occurred while removing the working hours.', 'error')
+
+    return redirect(url_for('admin_bp.working_hours', doctor_id=doctor_id))
+
+
+@admin_bp.route('/admin/working-hours/days-off', methods=['POST'])
+def add_day_off():
+    redirect_response = require_admin()
+    if redirect_response:
+        return redirect_response
+
+    doctor_id = request.form.get('doctor_id', type=int)
+    if not doctor_id or not db.session.get(Doctor, doctor_id):
+        flash('Select a doctor.', 'error')
+        return redirect(url_for('admin_bp.working_hours'))
+    try:
+        day = datetime.strptime(request.form.get('date', ''), '%Y-%m-%d').date()
+    except ValueError:
+        flash('Invalid date format.', 'error')
+        return redirect(url_for('admin_bp.working_hours', doctor_id=doctor_id))
+
+    if ScheduleException.query.filter_by(doctor_id=doctor_id, date=day).first():
+        flash('That day is already marked as a day off.', 'warning')
+        return redirect(url_for('admin_bp.working_hours', doctor_id=doctor_id))
+
+    try:
+        db.session.add(ScheduleException(doctor_id=doctor_id, date=day,
+                                         reason=request.form.get('reason', '').strip() or None))
+        db.session.commit()
+        flash('Day off added. Existing slots on that day are not removed.', 'success')
+    except Exception as e:
+        db.session.rollback()
+        flash('An error occurred while adding the day off.', 'error')
+
+    return redirect(url_for('admin_bp.working_hours', doctor_id=doctor_id))
+
+
+@admin_bp.route('/admin/working-hours/days-off/<int:exception_id>/delete', methods=['POST'])
+def delete_day_off(exception_id):
+    redirect_response = require_admin()
+    if redirect_response:
+        return redirect_response
+
+    exception = ScheduleException.query.get_or_404(exception_id)
+    doctor_id = exception.doctor_id
+    try:
+        db.session.delete(exception)
+        db.session.commit()
+        flash('Day off removed.', 'success')
+    except Exception as e:
+        db.session.rollback()
+        flash('An error occurred while removing the day off.', 'error')
+
+    return redirect(url_for('admin_bp.working_hours', doctor_id=doctor_id))
+
+
+@admin_bp.route('/admin/working-hours/generate', methods=['POST'])
+def generate_working_hours():
+    redirect_response = require_admin()
+    if redirect_response:
+        return redirect_response
+
+    # No doctor selected means every doctor with working hours
+    doctor_id = request.form.get('doctor_id', type=int)
+    try:
+        date_from = datetime.strptime(request.form.get('date_from', ''), '%Y-%m-%d').date()
+        date_to = datetime.strptime(request.form.get('date_to', ''), '%Y-%m-%d').date()
+    except ValueError:
+        flash('Invalid date format.', 'error')
+        return redirect(url_for('admin_bp.working_hours', doctor_id=doctor_id))
+
+    date_from = max(date_from, date.today())
+    if date_to > last_generate_day(date_from):
+        # Nothing is generated: a clamped range would look like a full one
+        flash(f'Slots can be generated for at most {MAX_GENERATE_DAYS} days at a time: pick an end date '
+              f'on or before {last_generate_day(date_from):%Y-%m-%d}.', 'error')
+        return redirect(url_for('admin_bp.working_hours', doctor_id=doctor_id))
+
+    try:
+        created = generate_slots(date_from, date_to, doctor_ids=[doctor_id] if doctor_id else None)
+        db.session.commit()
+        flash(f'{created} time slot(s) created.', 'success')
+    except Exception as e:
+        db.session.rollback()
+        flash('An error occurred while generating time slots.', 'error')
+
+    return redirect(url_for('admin_bp.working_hours', doctor_id=doctor_id))
+
+
+@admin_bp.route('/admin/cache-stats')
+def cache_stats():
+    redirect_response = require_admin()
+    if redirect_response:
+        return redirect_response
+
+    # Counters are per worker process; the pid tells workers apart
+    caches = [directory_cache.stats(), current_app.extensions['fragment_cache'].stats()]
+    return jsonify({'pid': os.getpid(), 'caches': caches})
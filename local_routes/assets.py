@@ -0,0 +1,29 @@
+from flask import Blueprint, abort, current_app, request, send_from_directory
+from local_services.assets import ENCODINGS, content_type
+
+assets_bp = Blueprint('assets_bp', __name__)
+
+# Built names change with the content, so a copy never goes stale
+IMMUTABLE = 'public, max-age=31536000, immutable'
+
+
+@assets_bp.route('/assets/<path:filename>')
+def asset(filename):
+    assets = current_app.extensions['assets']
+    encodings = assets.encodings(filename)
+    if encodings is None:
+        abort(404)
+
+    # The smallest precompressed copy the browser takes, else the file itself
+    for encoding, suffix in ENCODINGS:
+        if encoding in encodings and request.accept_encodings[encoding]:
+            response = send_from_directory(assets.directory, filename + suffix,
+                                           mimetype=content_type(filename))
+            response.headers['Content-Encoding'] = encoding
+            break
+    else:
+        response = send_from_directory(assets.directory, filename, mimetype=content_type(filename))
+    if encodings:
+        response.vary.add('Accept-Encoding')
+    response.headers['Cache-Control'] = IMMUTABLE
+    return response
@@ -1,7 +1,8 @@
-from flask import Blueprint, request, render_template, redirect, url_for, session, flash, jsonify
-from werkzeug.security import generate_password_hash, check_password_hash
+from flask import Blueprint, current_app, request, render_template, redirect, url_for, session, flash, jsonify
 from local_models import db, User, Patient
 from local_db import db
+from local_services.identity import current_user, remember
+from local_services.passwords import verify_password
 from utils.validation import validate_email, validate_password
 
 auth_bp = Blueprint('auth_bp', __name__)
@@ -38,16 +39,21 @@ def login():
         
         user = User.query.filter_by(email=email).first()
         
-        if user and user.check_password(password):
+        if user and verify_password(user, password):
             if user.role != role:
                 if request.is_json:
                     return jsonify({'success': False, 'message': 'Invalid role for this user'}), 401
                 flash('Invalid role for this user', 'error')
                 return render_template('auth/login.html')
             
-            session['user_id'] = user.id
-            session['user_role'] = user.role
-            session['user_name'] = user.full_name
+            remember(user)
+            if db.session.is_modified(user):
+                # verify_password upgraded the hash to the configured cost
+                try:
+                    db.session.commit()
+                except Exception:
+                    db.session.rollback()
+                    current_app.logger.exception('Could not save the upgraded password hash')
             
             if request.is_json:
                 return jsonify({
@@ -142,9 +148,9 @@ def register():
             flash('Account created successfully!', 'success')
             return redirect(url_for('auth_bp.login'))
 
-        except Exception as e:
+        except Exception:
             db.session.rollback()
-            print("Error creating user or patient:", e)
+            current_app.logger.exception("Error creating user or patient")
             if request.is_json:
                 return jsonify({'success': False, 'message': 'Server error'}), 500
             flash('An error occurred while creating your account. Please try again.', 'error')
@@ -161,10 +167,11 @@ def logout():
 
 @auth_bp.route('/dashboard')
 def dashboard():
-    if 'user_id' not in session:
+    user = current_user()
+    if user is None:
         return redirect(url_for('auth_bp.login'))
     
-    user_role = session.get('user_role')
+    user_role = user.role
     
     if user_role == 'admin':
         return redirect(url_for('admin_bp.dashboard'))
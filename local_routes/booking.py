@@ -1,6 +1,13 @@
-from flask import Blueprint, request, render_template, redirect, url_for, session, flash, jsonify
+from flask import Blueprint, request, render_template, redirect, url_for, session, flash, jsonify, abort
 from local_models import Clinic, Doctor, TimeSlot, Appointment, User
 from local_db import db
+from local_services.appointments import paginate_appointments, patient_appointments_query
+from local_services import directory
+from local_services.identity import require_role
+from local_services.booking import book_slot, cancel_appointment as cancel_appointment_and_release
+from local_services.conditional import etag_for, expiring, not_modified, tagged
+from local_services.slots import clamp_window, earliest_open_slots
+from local_services.versions import current_versions, slot_version_name
 from datetime import datetime, date
 from collections import defaultdict
 
@@ -8,9 +15,7 @@ from collections import defaultdict
 booking_bp = Blueprint('booking_bp', __name__)
 
 def require_patient():
-    if 'user_id' not in session or session.get('user_role') != 'patient':
-        return redirect(url_for('auth_bp.login'))
-    return None
+    return require_role('patient')
 
 @booking_bp.route('/book-appointment')
 def book_appointment():
@@ -26,8 +31,15 @@ def select_clinic():
     if redirect_response:
         return redirect_response
     
-    clinics = Clinic.query.all()
-    return render_template('booking/select_clinic.html', clinics=clinics)
+    # Back and forward between the booking steps revalidate with a 304
+    etag = etag_for('select-clinic', session['user_id'], *current_versions('directory'))
+    response = not_modified(etag)
+    if response:
+        return response
+
+    # Directory rows come from the per-worker cache; admin edits invalidate it
+    clinics = directory.clinics()
+    return tagged(render_template('booking/select_clinic.html', clinics=clinics), etag)
 
 @booking_bp.route('/book/select-doctor/<int:clinic_id>')
 def select_doctor(clinic_id):
@@ -35,14 +47,21 @@ def select_doctor(clinic_id):
     if redirect_response:
         return redirect_response
     
-    clinic = Clinic.query.get_or_404(clinic_id)
-    doctors = Doctor.query.filter_by(clinic_id=clinic_id).all()
+    etag = etag_for('select-doctor', session['user_id'], clinic_id, *current_versions('directory'))
+    response = not_modified(etag)
+    if response:
+        return response
+
+    clinic = directory.clinic(clinic_id)
+    if clinic is None:
+        abort(404)
+    doctors = directory.doctors(clinic_id)
     
     if not doctors:
         flash('No doctors available at this clinic.', 'warning')
         return redirect(url_for('booking_bp.select_clinic'))
     
-    return render_template('booking/select_doctor.html', clinic=clinic, doctors=doctors)
+    return tagged(render_template('booking/select_doctor.html', clinic=clinic, doctors=doctors), etag)
 
 from datetime import date, timedelta
 
@@ -52,18 +71,21 @@ def select_time(doctor_id):
     if redirect_response:
         return redirect_response
     
+    # The doctor and clinic shown come from the directory, the slots from
+    # this doctor's slot version
+    etag = etag_for('select-time', session['user_id'], doctor_id,
+                    *current_versions('directory', slot_version_name(doctor_id)))
+    response = not_modified(etag)
+    if response:
+        return response
+
     doctor = Doctor.query.get_or_404(doctor_id)
 
-    today = date.today()
     available_slots = TimeSlot.query.filter(
         TimeSlot.doctor_id == doctor_id,
-        TimeSlot.date >= today,
+        TimeSlot.starts_at >= datetime.now(),
         TimeSlot.is_available == True
-    ).order_by(TimeSlot.date, TimeSlot.start_time).limit(50).all()
-
-    print(f"Doctor ID: {doctor_id}, Slots found: {len(available_slots)}")
-    for slot in available_slots:
-        print(f"{slot.date} {slot.start_time} - {slot.end_time} Available: {slot.is_available}")
+    ).order_by(TimeSlot.starts_at).limit(50).all()
 
     if not available_slots:
         flash('No available time slots for this doctor.', 'warning')
@@ -74,7 +96,64 @@ def select_time(doctor_id):
     for slot in available_slots:
         slots_by_date[slot.date].append(slot)
 
-    return render_template('booking/select_time.html', doctor=doctor, slots_by_date=slots_by_date)
+    # Good until the first slot listed starts and drops off the page
+    return tagged(render_template('booking/select_time.html', doctor=doctor, slots_by_date=slots_by_date),
+                  expiring(etag, available_slots[0].starts_at))
+
+
+@booking_bp.route('/api/slots/earliest')
+def earliest_slots():
+    # Patients searching for themselves, admins answering the phone for them
+    if require_role('patient', 'admin'):
+        return jsonify({'success': False, 'message': 'Login required'}), 401
+
+    specialization = request.args.get('specialization', '').strip()
+    if not specialization:
+        return jsonify({'success': False, 'message': 'specialization is required'}), 400
+
+    date_from = date_to = None
+    try:
+        if request.args.get('date_from'):
+            date_from = datetime.strptime(request.args['date_from'], '%Y-%m-%d').date()
+        if request.args.get('date_to'):
+            date_to = datetime.strptime(request.args['date_to'], '%Y-%m-%d').date()
+    except ValueError:
+        return jsonify({'success': False, 'message': 'Dates must be YYYY-MM-DD'}), 400
+    # Never in the past, and at most the admin slot manager's window
+    date_from = max(date_from or date.today(), date.today())
+    date_from, date_to = clamp_window(date_from, date_to, date.today())
+
+    # ?clinic_id=1&clinic_id=2 or ?clinic_ids=1,2
+    clinic_ids = request.args.getlist('clinic_id', type=int)
+    try:
+        clinic_ids += [int(part) for part in request.args.get('clinic_ids', '').split(',') if part.strip()]
+    except ValueError:
+        return jsonify({'success': False, 'message': 'clinic_ids must be a comma separated list of ids'}), 400
+    limit = min(max(request.args.get('limit', 10, type=int), 1), 50)
+
+    starts_from = max(datetime.now(), datetime.combine(date_from, datetime.min.time()))
+    rows = db.session.execute(
+        earliest_open_slots(specialization, starts_from, date_to, clinic_ids=clinic_ids, limit=limit)
+    ).all()
+
+    return jsonify({
+        'success': True,
+        'specialization': specialization,
+        'date_from': date_from.isoformat(),
+        'date_to': date_to.isoformat(),
+        'clinic_ids': clinic_ids,
+        'slots': [{
+            'time_slot_id': row.id,
+            'starts_at': row.starts_at.isoformat(),
+            'ends_at': row.ends_at.isoformat(),
+            'doctor_id': row.doctor_id,
+            'doctor_name': row.doctor_name,
+            'specialization': row.specialization,
+            'clinic_id': row.clinic_id,
+            'clinic_name': row.clinic_name,
+            'book_url': url_for('booking_bp.confirm_booking', time_slot_id=row.id),
+        } for row in rows],
+    })
 
 
 @booking_bp.route('/book/confirm/<int:time_slot_id>', methods=['GET', 'POST'])
@@ -93,10 +172,6 @@ def confirm_booking(time_slot_id):
         return render_template('booking/confirmation.html', time_slot=time_slot, doctor=doctor)
     
     # POST method: actually book the appointment
-    if not time_slot.is_available:
-        flash('This time slot is no longer available.', 'error')
-        return redirect(url_for('booking_bp.select_time', doctor_id=doctor.id))
-    
     existing_appointment = Appointment.query.filter_by(
         patient_id=session['user_id'],
         time_slot_id=time_slot_id
@@ -106,16 +181,14 @@ def confirm_booking(time_slot_id):
         flash('You already have an appointment at this time.', 'error')
         return redirect(url_for('booking_bp.my_appointments'))
     
-    appointment = Appointment(
-        patient_id=session['user_id'],
-        doctor_id=doctor.id,
-        time_slot_id=time_slot_id,
-        status='scheduled'
-    )
-    time_slot.is_available = False
-    
     try:
-        db.session.add(appointment)
+        # Claiming the slot is a single conditional UPDATE, so of several
+        # patients racing for the same slot exactly one gets an appointment.
+        appointment = book_slot(time_slot_id, doctor.id, session['user_id'])
+        if appointment is None:
+            db.session.rollback()
+            flash('This time slot is no longer available.', 'error')
+            return redirect(url_for('booking_bp.select_time', doctor_id=doctor.id))
         db.session.commit()
         flash('Appointment booked successfully!', 'success')
         return redirect(url_for('booking_bp.booking_confirmation', appointment_id=appointment.id))
@@ -146,9 +219,10 @@ def my_appointments():
     if redirect_response:
         return redirect_response
     
-    appointments = Appointment.query.filter_by(
-        patient_id=session['user_id']
-    ).order_by(Appointment.created_at.desc()).all()
+    appointments = paginate_appointments(
+        patient_appointments_query(session['user_id']),
+        after=request.args.get('after'), before=request.args.get('before'), per_page=10
+    )
     
     return render_template('booking/my_appointments.html', appointments=appointments)
 
@@ -168,13 +242,13 @@ def cancel_appointment(appointment_id):
         return redirect(url_for('booking_bp.my_appointments'))
     
     # Cancel the appointment and make time slot available again
-    appointment.status = 'cancelled'
-    if appointment.time_slot:
-        appointment.time_slot.is_available = True
-    
     try:
-        db.session.commit()
-        flash('Appointment cancelled successfully.', 'success')
+        if cancel_appointment_and_release(appointment):
+            db.session.commit()
+            flash('Appointment cancelled successfully.', 'success')
+        else:
+            db.session.rollback()
+            flash('This appointment is already cancelled.', 'warning')
     except Exception as e:
         db.session.rollback()
         flash('An error occurred while cancelling the appointment.', 'error')
@@ -1,8 +1,18 @@
 from flask import Blueprint, request, render_template, redirect, url_for, session, flash, jsonify
-from local_models import Doctor, TimeSlot, Appointment,Patient
+from local_models import Doctor, TimeSlot, Appointment, ScheduleTemplate, ScheduleException
 from local_db import db
-from datetime import datetime, date, time
-from sqlalchemy.orm import aliased
+from local_services.appointments import doctor_agenda, doctor_appointments_query, paginate_appointments
+from local_services.identity import current_profile, require_role
+from local_services.schedules import MAX_GENERATE_DAYS, generate_slots, last_generate_day, parse_template_fields
+from local_services.search import matching as search_matching
+from local_services.events import emit
+from local_services.conditional import etag_for, not_modified, tagged
+from local_services.booking import cancel_appointment as cancel_appointment_and_release
+from local_services.slots import paginate_slots
+from local_services.stats import doctor_counts
+from local_services.versions import current_versions
+from datetime import datetime, date, time, timedelta
+from sqlalchemy.orm import aliased, selectinload
 from sqlalchemy import or_, and_
 
 doctor_bp = Blueprint('doctor_bp', __name__)
@@ -10,13 +20,11 @@ doctor_bp = Blueprint('doctor_bp', __name__)
 
 
 def require_doctor():
-    if 'user_id' not in session or session.get('user_role') != 'doctor':
-        return redirect(url_for('auth_bp.login'))
-    return None
+    return require_role('doctor')
 
 def get_doctor_profile():
-    user_id = session.get('user_id')
-    return Doctor.query.filter_by(user_id=user_id).first()
+    # Loaded with the user by the guard, once per request
+    return current_profile()
 
 @doctor_bp.route('/doctor')
 def dashboard():
@@ -29,32 +37,19 @@ def dashboard():
         flash('Doctor profile not found.', 'error')
         return redirect(url_for('auth_bp.logout'))
     
-    # Get today's appointments
-    today = date.today()
-    today_appointments = Appointment.query.join(TimeSlot).filter(
-        Appointment.doctor_id == doctor.id,
-        TimeSlot.date == today
-    ).order_by(TimeSlot.start_time).all()
-    
-    # Get upcoming appointments
-    upcoming_appointments = Appointment.query.join(TimeSlot).filter(
-        Appointment.doctor_id == doctor.id,
-        TimeSlot.date > today,
-        Appointment.status == 'scheduled'
-    ).order_by(TimeSlot.date, TimeSlot.start_time).limit(10).all()
-    
-    # Get statistics
-    total_appointments = Appointment.query.filter_by(doctor_id=doctor.id).count()
-    pending_appointments = Appointment.query.filter_by(
-        doctor_id=doctor.id, 
-        status='scheduled'
-    ).count()
+    # Today's agenda and upcoming appointments come from one query,
+    # the per-status totals from the maintained per-doctor counters.
+    today_appointments, upcoming_appointments = doctor_agenda(doctor.id, date.today())
+    counts = doctor_counts(doctor.id)
+    total_appointments = sum(counts.values())
+    pending_appointments = counts['scheduled']
     
     stats = {
         'today_appointments': len(today_appointments),
         'total_appointments': total_appointments,
-        'patients_seen': total_appointments - pending_appointments,
-        'pending_appointments': pending_appointments
+        'patients_seen': counts['completed'],
+        'pending_appointments': pending_appointments,
+        'cancelled_appointments': counts['cancelled']
     }
 
     return render_template('doctor/dashboard.html',
@@ -65,6 +60,25 @@ def dashboard():
                          pending_appointments=pending_appointments,
                          stats=stats)
 
+@doctor_bp.route('/doctor/widgets/today')
+def dashboard_today():
+    redirect_response = require_doctor()
+    if redirect_response:
+        return redirect_response
+
+    doctor = get_doctor_profile()
+    if not doctor:
+        return redirect(url_for('auth_bp.logout'))
+
+    today = date.today()
+    etag = etag_for('doctor-today', doctor.id, today, *current_versions('dashboard'))
+    response = not_modified(etag)
+    if response:
+        return response
+    today_appointments, _ = doctor_agenda(doctor.id, today)
+    return tagged(render_template('doctor/_today_appointments.html',
+                                  today_appointments=today_appointments), etag)
+
 @doctor_bp.route('/doctor/appointments')
 def appointments():
     redirect_response = require_doctor()
@@ -82,7 +96,7 @@ def appointments():
     search = request.args.get('search', '').strip() # patient name/email/phone search
 
     # Base query for this doctor's appointments
-    query = Appointment.query.filter_by(doctor_id=doctor.id)
+    query = doctor_appointments_query(doctor.id)
 
     # Apply status filter if given
     if status_filter:
@@ -93,27 +107,18 @@ def appointments():
         try:
             from datetime import datetime
             date_obj = datetime.strptime(date_filter, '%Y-%m-%d').date()
-            # Assuming Appointment has a relation to TimeSlot with a date field
-            query = query.join(Appointment.time_slot).filter(TimeSlot.date == date_obj)
+            query = query.filter(TimeSlot.on_date(date_obj))
         except ValueError:
             # Invalid date format, ignore filter or flash message if you want
             pass
 
-    # Apply patient search filter if given
+    # Apply patient search filter if given, through the appointment search index
     if search:
-        # Join with Patient to filter by name, email, or phone
-        query = query.join(Appointment.patient).filter(
-            (Patient.name.ilike(f'%{search}%')) |
-            (Patient.email.ilike(f'%{search}%')) |
-            (Patient.phone.ilike(f'%{search}%'))
-        )
-
-    # Order by creation time descending
-    query = query.order_by(Appointment.created_at.desc())
+        query = query.filter(search_matching(search))
 
-    # Pagination
-    page = request.args.get('page', 1, type=int)
-    appointments = query.paginate(page=page, per_page=10)
+    # Newest first, paginated by cursor rather than OFFSET
+    appointments = paginate_appointments(query, after=request.args.get('after'),
+                                         before=request.args.get('before'), per_page=10)
 
     return render_template('doctor/appointments.html',
                            doctor=doctor,
@@ -140,13 +145,13 @@ def cancel_appointment(appointment_id):
         flash('This appointment is already cancelled.', 'warning')
         return redirect(url_for('doctor_bp.appointments'))
 
-    appointment.status = 'cancelled'
-    if appointment.time_slot:
-        appointment.time_slot.is_available = True
-
     try:
-        db.session.commit()
-        flash('Appointment cancelled successfully.', 'success')
+        if cancel_appointment_and_release(appointment):
+            db.session.commit()
+            flash('Appointment cancelled successfully.', 'success')
+        else:
+            db.session.rollback()
+            flash('This appointment is already cancelled.', 'warning')
     except Exception:
         db.session.rollback()
         flash('An error occurred while cancelling the appointment.', 'error')
@@ -166,11 +171,11 @@ def schedule():
     if not doctor:
         flash('Doctor profile not found.', 'error')
         return redirect(url_for('auth_bp.logout'))
-    today = date.today()
+    today_start = datetime.combine(date.today(), time.min)
 
     query = TimeSlot.query.filter(
     TimeSlot.doctor_id == doctor.id,
-    TimeSlot.date >= today  # only future and today dates
+    TimeSlot.starts_at >= today_start  # only future and today dates
 )
 
     # Fetch filters from GET request
@@ -184,7 +189,7 @@ def schedule():
     AppointmentAlias, TimeSlot.id == AppointmentAlias.time_slot_id
 ).filter(
     TimeSlot.doctor_id == doctor.id,
-    TimeSlot.date >= today,  # exclude past dates here
+    TimeSlot.starts_at >= today_start,  # exclude past dates here
     or_(
         TimeSlot.is_available == True,
         and_(
@@ -197,7 +202,7 @@ def schedule():
     if date_filter:
         try:
             date_obj = datetime.strptime(date_filter, '%Y-%m-%d').date()
-            query = query.filter(TimeSlot.date == date_obj)
+            query = query.filter(TimeSlot.on_date(date_obj))
         except ValueError:
             flash('Invalid date format.', 'error')
 
@@ -206,10 +211,9 @@ def schedule():
     elif availability == 'booked':
         query = query.filter_by(is_available=False)
 
-    page = request.args.get('page', 1, type=int)
-    per_page = 10  # or whatever you want
-
-    time_slots = query.order_by(TimeSlot.date, TimeSlot.start_time).paginate(page=page, per_page=per_page)
+    query = query.options(selectinload(TimeSlot.appointments).joinedload(Appointment.patient))
+    time_slots = paginate_slots(query, after=request.args.get('after'),
+                                before=request.args.get('before'), per_page=10)
 
 
     # Handle time slot creation if POST
@@ -227,22 +231,22 @@ def schedule():
 
         try:
             appointment_date = datetime.strptime(date_str, '%Y-%m-%d').date()
+            starts_at = datetime.combine(appointment_date, start_time)
+            ends_at = datetime.combine(appointment_date, end_time)
 
-            existing_slot = TimeSlot.query.filter_by(
-                doctor_id=doctor.id,
-                date=appointment_date,
-                start_time=start_time,
-                end_time=end_time
+            existing_slot = TimeSlot.query.filter(
+                TimeSlot.overlapping(doctor.id, starts_at, ends_at)
             ).first()
 
-            if existing_slot:
+            if ends_at <= starts_at:
+                flash('End time must be after start time.', 'error')
+            elif existing_slot:
                 flash('A time slot already exists for this date and time.', 'warning')
             else:
                 new_slot = TimeSlot(
                     doctor_id=doctor.id,
-                    date=appointment_date,
-                    start_time=start_time,
-                    end_time=end_time,
+                    starts_at=starts_at,
+                    ends_at=ends_at,
                     is_available=True
                 )
                 db.session.add(new_slot)
@@ -276,6 +280,7 @@ def complete_appointment(appointment_id):
     ).first_or_404()
     
     appointment.status = 'completed'
+    emit('completed', doctor.id, appointment.time_slot_id, available=False)
     
     try:
         db.session.commit()
@@ -303,6 +308,7 @@ def toggle_availability(slot_id):
     ).first_or_404()
     
     time_slot.is_available = not time_slot.is_available
+    emit('slot', doctor.id, time_slot.id, available=time_slot.is_available)
     
     try:
         db.session.commit()
@@ -312,4 +318,152 @@ def toggle_availability(slot_id):
         db.session.rollback()
         flash('An error occurred while updating the time slot.', 'error')
     
-    return redirect(url_for('doctor_bp.schedule'))
\ No newline at end of file
+    return redirect(url_for('doctor_bp.schedule'))
+
+
+@doctor_bp.route('/doctor/working-hours', methods=['GET', 'POST'])
+def working_hours():
+    redirect_response = require_doctor()
+    if redirect_response:
+        return redirect_response
+
+    doctor = get_doctor_profile()
+    if not doctor:
+        flash('Doctor profile not found.', 'error')
+        return redirect(url_for('auth_bp.logout'))
+
+    if request.method == 'POST':
+        try:
+            fields = parse_template_fields(
+                request.form.getlist('weekdays'),
+                request.form.get('start_time'),
+                request.form.get('end_time'),
+                request.form.get('slot_minutes'),
+                request.form.get('breaks', '')
+            )
+        except ValueError as e:
+            flash(str(e), 'error')
+        else:
+            try:
+                db.session.add(ScheduleTemplate(doctor_id=doctor.id, **fields))
+                db.session.commit()
+                flash('Working hours added.', 'success')
+                return redirect(url_for('doctor_bp.working_hours'))
+            except Exception as e:
+                db.session.rollback()
+                flash('An error occurred while saving the working hours.', 'error')
+
+    templates = ScheduleTemplate.query.filter_by(doctor_id=doctor.id).order_by(ScheduleTemplate.id).all()
+    exceptions = ScheduleException.query.filter(
+        ScheduleException.doctor_id == doctor.id,
+        ScheduleException.date >= date.today()
+    ).order_by(ScheduleException.date).all()
+
+    return render_template('doctor/working_hours.html',
+                           doctor=doctor,
+                           templates=templates,
+                           exceptions=exceptions,
+                           weekday_names=ScheduleTemplate.WEEKDAY_NAMES,
+                           today_date=date.today().isoformat(),
+                           default_until=(date.today() + timedelta(days=89)).isoformat())
+
+
+@doctor_bp.route('/doctor/working-hours/<int:template_id>/delete', methods=['POST'])
+def delete_working_hours(template_id):
+    redirect_response = require_doctor()
+    if redirect_response:
+        return redirect_response
+
+    doctor = get_doctor_profile()
+    template = ScheduleTemplate.query.filter_by(id=template_id, doctor_id=doctor.id).first_or_404()
+
+    try:
+        db.session.delete(template)
+        db.session.commit()
+        flash('Working hours removed. Slots already created are kept.', 'success')
+    except Exception as e:
+        db.session.rollback()
+        flash('An error occurred while removing the working hours.', 'error')
+
+    return redirect(url_for('doctor_bp.working_hours'))
+
+
+@doctor_bp.route('/doctor/working-hours/days-off', methods=['POST'])
+def add_day_off():
+    redirect_response = require_doctor()
+    if redirect_response:
+        return redirect_response
+
+    doctor = get_doctor_profile()
+    try:
+        day = datetime.strptime(request.form.get('date', ''), '%Y-%m-%d').date()
+    except ValueError:
+        flash('Invalid date format.', 'error')
+        return redirect(url_for('doctor_bp.working_hours'))
+
+    if ScheduleException.query.filter_by(doctor_id=doctor.id, date=day).first():
+        flash('That day is already marked as a day off.', 'warning')
+        return redirect(url_for('doctor_bp.working_hours'))
+
+    try:
+        db.session.add(ScheduleException(doctor_id=doctor.id, date=day,
+                                         reason=request.form.get('reason', '').strip() or None))
+        db.session.commit()
+        flash('Day off added. Existing slots on that day are not removed.', 'success')
+    except Exception as e:
+        db.session.rollback()
+        flash('An error occurred while adding the day off.', 'error')
+
+    return redirect(url_for('doctor_bp.working_hours'))
+
+
+@doctor_bp.route('/doctor/working-hours/days-off/<int:exception_id>/delete', methods=['POST'])
+def delete_day_off(exception_id):
+    redirect_response = require_doctor()
+    if redirect_response:
+        return redirect_response
+
+    doctor = get_doctor_profile()
+    exception = ScheduleException.query.filter_by(id=exception_id, doctor_id=doctor.id).first_or_404()
+
+    try:
+        db.session.delete(exception)
+        db.session.commit()
+        flash('Day off removed.', 'success')
+    except Exception as e:
+        db.session.rollback()
+        flash('An error occurred while removing the day off.', 'error')
+
+    return redirect(url_for('doctor_bp.working_hours'))
+
+
+@doctor_bp.route('/doctor/working-hours/generate', methods=['POST'])
+def generate_working_hours():
+    redirect_response = require_doctor()
+    if redirect_response:
+        return redirect_response
+
+    doctor = get_doctor_profile()
+    try:
+        date_from = datetime.strptime(request.form.get('date_from', ''), '%Y-%m-%d').date()
+        date_to = datetime.strptime(request.form.get('date_to', ''), '%Y-%m-%d').date()
+    except ValueError:
+        flash('Invalid date format.', 'error')
+        return redirect(url_for('doctor_bp.working_hours'))
+
+    date_from = max(date_from, date.today())
+    if date_to > last_generate_day(date_from):
+        # Nothing is generated: a clamped range would look like a full one
+        flash(f'Slots can be generated for at most {MAX_GENERATE_DAYS} days at a time: pick an end date '
+              f'on or before {last_generate_day(date_from):%Y-%m-%d}.', 'error')
+        return redirect(url_for('doctor_bp.working_hours'))
+
+    try:
+        created = generate_slots(date_from, date_to, doctor_ids=[doctor.id])
+        db.session.commit()
+        flash(f'{created} time slot(s) created.', 'success')
+    except Exception as e:
+        db.session.rollback()
+        flash('An error occurred while generating time slots.', 'error')
+
+    return redirect(url_for('doctor_bp.working_hours'))
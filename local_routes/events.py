@@ -0,0 +1,44 @@
+from flask import Blueprint, Response, abort, current_app, jsonify, request
+from local_services.events import EVERYTHING, broker
+from local_services.identity import current_user, require_role
+
+events_bp = Blueprint('events_bp', __name__)
+
+
+@events_bp.route('/events')
+def stream():
+    if not current_app.config.get('EVENTS_ENABLED'):
+        abort(404)
+    # EventSource cannot follow a redirect to the login page
+    if require_role('patient', 'doctor', 'admin'):
+        return jsonify({'success': False, 'message': 'Login required'}), 401
+
+    # ?doctor_id=1&clinic_id=2; every clinic's events are for admins only
+    topics = [f'doctor:{doctor_id}' for doctor_id in request.args.getlist('doctor_id', type=int)]
+    topics += [f'clinic:{clinic_id}' for clinic_id in request.args.getlist('clinic_id', type=int)]
+    if not topics:
+        if current_user().role != 'admin':
+            return jsonify({'success': False, 'message': 'doctor_id or clinic_id is required'}), 400
+        topics = [EVERYTHING]
+
+    config = current_app.config
+    heartbeat = config.get('EVENTS_HEARTBEAT', 15)
+    subscription = broker.subscribe(topics, config.get('EVENTS_BACKLOG', 100), config.get('EVENTS_DIR'))
+
+    # Runs after the request context is gone, so it holds no database
+    # connection while the client idles
+    def generate():
+        try:
+            yield f'retry: {heartbeat * 1000}\n\n'
+            while True:
+                messages = subscription.get(heartbeat)
+                if subscription.overflowed:
+                    # Too far behind to catch up: the page reloads its data
+                    yield 'event: reset\ndata: {}\n\n'
+                    return
+                yield ''.join(messages) if messages else ': keep-alive\n\n'
+        finally:
+            broker.unsubscribe(subscription)
+
+    return Response(generate(), mimetype='text/event-stream',
+                    headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'})
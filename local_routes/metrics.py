@@ -0,0 +1,20 @@
+import hmac
+
+from flask import Blueprint, Response, abort, current_app, request
+from local_services.metrics import CONTENT_TYPE, render
+
+metrics_bp = Blueprint('metrics_bp', __name__)
+
+
+@metrics_bp.route('/metrics')
+def metrics():
+    if not current_app.config.get('METRICS_ENABLED', True):
+        abort(404)
+    # Scrapers authenticate with a bearer token when one is configured; in
+    # production there is no /metrics without one
+    token = current_app.config.get('METRICS_TOKEN')
+    if not token and current_app.config.get('METRICS_TOKEN_REQUIRED'):
+        abort(404)
+    if token and not hmac.compare_digest(request.headers.get('Authorization', ''), f'Bearer {token}'):
+        abort(401)
+    return Response(render(current_app.config.get('METRICS_DIR')), content_type=CONTENT_TYPE)
@@ -0,0 +1,85 @@
+from datetime import datetime, time, timedelta
+from sqlalchemy import or_
+from sqlalchemy.orm import contains_eager, joinedload
+from local_models import Appointment, Doctor, TimeSlot
+from local_services.pagination import decode_cursor, keyset_paginate
+
+# Upper bound on rows the doctor agenda query reads: all of today plus the
+# next scheduled ones. No doctor sees anywhere near this many patients a day.
+AGENDA_ROWS = 100
+
+
+def appointment_listing_query():
+    """Base query for appointment listings with the whole display graph loaded.
+
+    Every listing page renders the patient, the doctor and their user/clinic
+    and the time slot of each appointment. Loading them here means a page of
+    appointments costs one SELECT instead of one lazy load per row per
+    relationship: paginate_appointments() fetches the page and one extra
+    row, to tell whether another page follows, in that same keyset query.
+
+    TimeSlot is inner-joined, so callers can filter and order on TimeSlot
+    columns directly without joining it again.
+    """
+    return Appointment.query.join(Appointment.time_slot).options(
+        contains_eager(Appointment.time_slot),
+        joinedload(Appointment.patient),
+        joinedload(Appointment.doctor).joinedload(Doctor.user),
+        joinedload(Appointment.doctor).joinedload(Doctor.clinic),
+    )
+
+
+def recent_appointments(limit=10):
+    """Most recently booked appointments, for the admin dashboard."""
+    return appointment_listing_query().order_by(
+        Appointment.created_at.desc()
+    ).limit(limit).all()
+
+
+def doctor_appointments_query(doctor_id):
+    """Listing query scoped to a single doctor's appointments."""
+    return appointment_listing_query().filter(Appointment.doctor_id == doctor_id)
+
+
+def patient_appointments_query(patient_id):
+    """Listing query scoped to a single patient's appointments."""
+    return appointment_listing_query().filter(Appointment.patient_id == patient_id)
+
+
+def doctor_agenda(doctor_id, day, upcoming_limit=10):
+    """Today's appointments and the next scheduled ones after today, in one query.
+
+    Returns ``(today, upcoming)``. Both lists come from a single range scan
+    over the doctor's appointments starting on or after ``day``.
+    """
+    day_start = datetime.combine(day, time.min)
+    next_day = day_start + timedelta(days=1)
+    rows = doctor_appointments_query(doctor_id).filter(
+        # Filtering the slot's doctor too lets the planner drive the query
+        # from the (doctor_id, starts_at) slot index instead of walking the
+        # doctor's whole appointment history.
+        TimeSlot.doctor_id == doctor_id,
+        TimeSlot.starts_at >= day_start,
+        or_(TimeSlot.starts_at < next_day, Appointment.status == 'scheduled')
+    ).order_by(TimeSlot.starts_at).limit(AGENDA_ROWS).all()
+
+    today = [appointment for appointment in rows if appointment.time_slot.starts_at < next_day]
+    upcoming = [appointment for appointment in rows if appointment.time_slot.starts_at >= next_day]
+    return today, upcoming[:upcoming_limit]
+
+
+def paginate_appointments(query, after=None, before=None, per_page=10):
+    """Newest-first keyset page of an appointment listing, keyed on (created_at, id).
+
+    ``after``/``before`` are the raw cursor tokens from the request.
+    """
+    key_types = (datetime, int)
+    return keyset_paginate(
+        query,
+        (Appointment.created_at, Appointment.id),
+        key=lambda appointment: (appointment.created_at, appointment.id),
+        after=decode_cursor(after, key_types),
+        before=decode_cursor(before, key_types),
+        descending=True,
+        per_page=per_page,
+    )
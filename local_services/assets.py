@@ -0,0 +1,229 @@
+"""Fingerprinted, precompressed and resized static assets.
+
+    ASSETS_DIR          where ``flask build-assets`` writes and /assets
+                        serves from (static/dist)
+    ASSET_IMAGE_WIDTHS  widths of the resized image variants
+                        ("480,960,1440")
+
+``flask build-assets`` copies every file under static/ into ASSETS_DIR
+under a name carrying a hash of its content (css/style.1a2b3c4d5e6f.css)
+and records it in manifest.json:
+
+* text assets (CSS, JS, SVG) also get a .gz and, with the brotli
+  package installed, a .br next to them, when those are smaller;
+* JPEG and PNG images (with Pillow installed) get variants at each
+  ASSET_IMAGE_WIDTHS narrower than the original
+  (images/login.960w.<hash>.jpg), and the full size is re-encoded when
+  that saves a tenth or more.
+
+Templates link assets with asset_url('css/style.css') (optionally
+``width=`` to pick a variant) and asset_srcset('images/team-1.jpg').
+With a manifest these point at /assets/<hashed name>, served in the
+encoding the browser accepts and cached for a year: a changed file gets
+a new name. Without one (nothing built yet, development) they fall back
+to url_for('static', ...). Old hashed files are kept by a rebuild so
+pages already rendered by a running worker still load: /assets serves
+any built file on disk, not only those in the current manifest.
+``--clean`` starts from an empty directory. Workers read the manifest at
+start.
+"""
+import gzip
+import hashlib
+import io
+import json
+import mimetypes
+import os
+import shutil
+
+from flask import current_app, url_for
+from werkzeug.security import safe_join
+
+try:
+    import brotli
+except ImportError:  # .br variants are skipped
+    brotli = None
+
+try:
+    from PIL import Image
+except ImportError:  # images are copied, not resized
+    Image = None
+
+DEFAULT_IMAGE_WIDTHS = (480, 960, 1440)
+COMPRESSIBLE = {'.css', '.js', '.svg', '.json', '.txt', '.map'}
+RESIZABLE = {'.jpg', '.jpeg', '.png'}
+ENCODINGS = (('br', '.br'), ('gzip', '.gz'))
+JPEG_QUALITY = 82
+MANIFEST = 'manifest.json'
+
+
+def image_widths(value):
+    """ASSET_IMAGE_WIDTHS from its environment form ("480,960,1440")."""
+    if not value:
+        return DEFAULT_IMAGE_WIDTHS
+    return tuple(sorted({int(part) for part in value.split(',') if part.strip()}))
+
+
+def _digest(data):
+    return hashlib.sha256(data).hexdigest()[:12]
+
+
+def _hashed_name(name, data, label=None):
+    stem, extension = os.path.splitext(name)
+    middle = f'.{label}' if label else ''
+    return f'{stem}{middle}.{_digest(data)}{extension}'
+
+
+def _write(out_dir, name, data):
+    path = os.path.join(out_dir, name)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    # Hashed names never change content: an existing file is already right
+    if not os.path.exists(path):
+        with open(path, 'wb') as handle:
+            handle.write(data)
+
+
+def _compressed(data):
+    """{encoding: bytes} for the encodings that make ``data`` smaller."""
+    variants = {'gzip': gzip.compress(data, compresslevel=9, mtime=0)}
+    if brotli is not None:
+        variants['br'] = brotli.compress(data, quality=11)
+    return {encoding: body for encoding, body in variants.items() if len(body) < len(data) * 0.95}
+
+
+def _encode_image(image, extension):
+    buffer = io.BytesIO()
+    if extension == '.png':
+        image.save(buffer, 'PNG', optimize=True)
+    else:
+        image.convert('RGB').save(buffer, 'JPEG', quality=JPEG_QUALITY, optimize=True, progressive=True)
+    return buffer.getvalue()
+
+
+def _image_entry(name, data, widths, out_dir):
+    extension = os.path.splitext(name)[1].lower()
+    with Image.open(io.BytesIO(data)) as image:
+        image.load()
+        width, height = image.size
+        reencoded = _encode_image(image, extension)
+        if len(reencoded) <= len(data) * 0.9:
+            data = reencoded
+        variants = {}
+        for variant_width in widths:
+            if variant_width >= width:
+                continue
+            resized = image.resize((variant_width, round(height * variant_width / width)), Image.LANCZOS)
+            body = _encode_image(resized, extension)
+            # A tightly compressed original can beat a variant at our quality
+            if len(body) >= len(data):
+                continue
+            variant = _hashed_name(name, body, f'{variant_width}w')
+            _write(out_dir, variant, body)
+            variants[str(variant_width)] = variant
+    entry = {'file': _hashed_name(name, data), 'width': width, 'variants': variants}
+    _write(out_dir, entry['file'], data)
+    return entry
+
+
+def build(source_dir, out_dir, widths=DEFAULT_IMAGE_WIDTHS, clean=False):
+    """Build every asset under ``source_dir`` into ``out_dir``; returns the manifest."""
+    if clean:
+        shutil.rmtree(out_dir, ignore_errors=True)
+    os.makedirs(out_dir, exist_ok=True)
+    out_dir_real = os.path.realpath(out_dir)
+    manifest = {}
+    for root, directories, files in os.walk(source_dir):
+        # Never the output of an earlier build
+        directories[:] = sorted(d for d in directories
+                                if os.path.realpath(os.path.join(root, d)) != out_dir_real)
+        for filename in sorted(files):
+            path = os.path.join(root, filename)
+            name = os.path.relpath(path, source_dir).replace(os.sep, '/')
+            with open(path, 'rb') as handle:
+                data = handle.read()
+            extension = os.path.splitext(name)[1].lower()
+            if extension in RESIZABLE and Image is not None:
+                manifest[name] = _image_entry(name, data, widths, out_dir)
+                continue
+            entry = {'file': _hashed_name(name, data)}
+            _write(out_dir, entry['file'], data)
+            if extension in COMPRESSIBLE:
+                compressed = _compressed(data)
+                for encoding, suffix in ENCODINGS:
+                    if encoding in compressed:
+                        _write(out_dir, entry['file'] + suffix, compressed[encoding])
+                entry['encodings'] = [encoding for encoding, _ in ENCODINGS if encoding in compressed]
+            manifest[name] = entry
+    # Written last and atomically: a worker starting meanwhile reads the old one
+    temporary = os.path.join(out_dir, f'.{MANIFEST}.tmp')
+    with open(temporary, 'w') as handle:
+        json.dump(manifest, handle, indent=1, sort_keys=True)
+    os.replace(temporary, os.path.join(out_dir, MANIFEST))
+    return manifest
+
+
+class Assets:
+    """The manifest a worker links to, and the built files it serves."""
+
+    def __init__(self, directory):
+        self.directory = directory
+        self.manifest = {}
+        try:
+            with open(os.path.join(directory, MANIFEST)) as handle:
+                self.manifest = json.load(handle)
+        except FileNotFoundError:
+            pass
+
+    def encodings(self, filename):
+        """Encodings ``filename`` is precompressed in, or None if it was never built.
+
+        Looked up on disk rather than in the manifest: a page rendered
+        by a worker started before the last rebuild links files only the
+        old manifest lists, and those are still there.
+        """
+        if filename == MANIFEST:
+            return None
+        path = safe_join(self.directory, filename)
+        if path is None or not os.path.isfile(path):
+            return None
+        return tuple(encoding for encoding, suffix in ENCODINGS if os.path.isfile(path + suffix))
+
+
+def _assets():
+    return current_app.extensions['assets']
+
+
+def asset_url(filename, width=None):
+    """URL of static/``filename``: fingerprinted once built, else the plain static URL.
+
+    With ``width``, the narrowest variant at least that wide (the full
+    size if none is).
+    """
+    entry = _assets().manifest.get(filename)
+    if entry is None:
+        return url_for('static', filename=filename)
+    built = entry['file']
+    if width:
+        wide_enough = sorted((int(w), name) for w, name in entry.get('variants', {}).items() if int(w) >= width)
+        if wide_enough:
+            built = wide_enough[0][1]
+    return url_for('assets_bp.asset', filename=built)
+
+
+def asset_srcset(filename):
+    """A srcset of every variant of an image and its full size."""
+    entry = _assets().manifest.get(filename)
+    if entry is None or 'width' not in entry:
+        return asset_url(filename)
+    candidates = sorted((int(w), name) for w, name in entry['variants'].items())
+    candidates.append((entry['width'], entry['file']))
+    return ', '.join(f"{url_for('assets_bp.asset', filename=name)} {w}w" for w, name in candidates)
+
+
+def content_type(filename):
+    return mimetypes.guess_type(filename)[0] or 'application/octet-stream'
+
+
+def init_app(app):
+    """Load the built manifest and give templates asset_url and asset_srcset."""
+    app.extensions['assets'] = Assets(app.config['ASSETS_DIR'] or os.path.join(app.static_folder, 'dist'))
+    app.jinja_env.globals.update(asset_url=asset_url, asset_srcset=asset_srcset)
@@ -0,0 +1,81 @@
+from sqlalchemy import update
+from local_db import db
+from local_models import Appointment, TimeSlot
+from local_services.events import emit
+from local_services.stats import appointment_counter_names, bump
+from local_services.versions import bump_version, slot_version_name
+
+
+def claim_slot(time_slot_id):
+    """Take an open slot in a single conditional UPDATE.
+
+    Returns True if this caller flipped the slot from available to booked,
+    False if someone else got there first (or the slot is closed). The write
+    is part of the current transaction, so a later rollback reopens the slot.
+    """
+    result = db.session.execute(
+        update(TimeSlot)
+        .where(TimeSlot.id == time_slot_id, TimeSlot.is_available == True)
+        .values(is_available=False)
+        .execution_options(synchronize_session=False)
+    )
+    return result.rowcount == 1
+
+
+def release_slot(time_slot_id):
+    """Reopen a booked slot. Returns False if it was already open."""
+    result = db.session.execute(
+        update(TimeSlot)
+        .where(TimeSlot.id == time_slot_id, TimeSlot.is_available == False)
+        .values(is_available=True)
+        .execution_options(synchronize_session=False)
+    )
+    return result.rowcount == 1
+
+
+def book_slot(time_slot_id, doctor_id, patient_id):
+    """Claim the slot and create the appointment in the current transaction.
+
+    Returns the new (uncommitted) Appointment, or None if the slot was taken.
+    """
+    if not claim_slot(time_slot_id):
+        return None
+    bump_version(slot_version_name(doctor_id))
+    appointment = Appointment(
+        patient_id=patient_id,
+        doctor_id=doctor_id,
+        time_slot_id=time_slot_id,
+        status='scheduled'
+    )
+    db.session.add(appointment)
+    emit('booked', doctor_id, time_slot_id, available=False)
+    return appointment
+
+
+def cancel_appointment(appointment):
+    """Cancel an appointment and reopen its slot in the current transaction.
+
+    The status change is a compare-and-set against the status we loaded, so
+    two concurrent cancels release the slot once. Returns False if the
+    appointment was already cancelled or changed under us.
+    """
+    previous_status = appointment.status
+    if previous_status == 'cancelled':
+        return False
+    result = db.session.execute(
+        update(Appointment)
+        .where(Appointment.id == appointment.id, Appointment.status == previous_status)
+        .values(status='cancelled')
+        .execution_options(synchronize_session=False)
+    )
+    if result.rowcount != 1:
+        return False
+    # Core UPDATEs bypass the flush hooks that keep the dashboard counters
+    # and the versions.
+    deltas = {name: -1 for name in appointment_counter_names(appointment.doctor_id, previous_status)}
+    deltas.update({name: 1 for name in appointment_counter_names(appointment.doctor_id, 'cancelled')})
+    bump(deltas)
+    bump_version('dashboard', slot_version_name(appointment.doctor_id))
+    release_slot(appointment.time_slot_id)
+    emit('cancelled', appointment.doctor_id, appointment.time_slot_id, available=True)
+    return True
@@ -0,0 +1,79 @@
+"""Small in-process caches for read-mostly data.
+
+Every entry is stored with the data version it was loaded under
+(local_services.versions) and a load time. An entry is used only while
+its version is still current and it is younger than the TTL. The
+version makes writes from any worker show up right after they commit.
+The TTL bounds staleness for changes that bypass the ORM. Size is
+bounded by evicting the least recently used entry. A cache without a
+version name leaves versions to its callers, who put the ones a value
+depends on in its key.
+
+Cache only detached values such as Row tuples, dicts or plain objects.
+ORM instances belong to the session that loaded them.
+"""
+import threading
+import time
+from collections import OrderedDict
+
+from flask import current_app
+from local_services.versions import current_version
+
+
+class VersionedCache:
+    def __init__(self, name, version_name, maxsize=512, ttl=300):
+        self.name = name
+        self.version_name = version_name
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = self.misses = self.stale = self.evictions = 0
+
+    def _settings(self):
+        config = current_app.config
+        prefix = f'{self.name.upper()}_CACHE'
+        return config.get(f'{prefix}_SIZE', self.maxsize), config.get(f'{prefix}_TTL', self.ttl)
+
+    def get_or_load(self, key, loader):
+        """Return the cached value for ``key``, calling ``loader()`` on a miss."""
+        maxsize, ttl = self._settings()
+        version = current_version(self.version_name) if self.version_name else None
+        now = time.monotonic()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                entry_version, loaded_at, value = entry
+                if entry_version == version and now - loaded_at < ttl:
+                    self._entries.move_to_end(key)
+                    self.hits += 1
+                    return value
+                self.stale += 1
+            self.misses += 1
+
+        # Loaded outside the lock; two threads missing together both load
+        value = loader()
+        with self._lock:
+            self._entries[key] = (version, now, value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > maxsize:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+        return value
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                'name': self.name,
+                'size': len(self._entries),
+                'hits': self.hits,
+                'misses': self.misses,
+                'stale': self.stale,
+                'evictions': self.evictions,
+                'hit_rate': round(self.hits / lookups, 4) if lookups else None,
+            }
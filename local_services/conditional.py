@@ -0,0 +1,72 @@
+"""Conditional GETs answered from data version stamps.
+
+A page or fragment whose content only changes with a few versions (see
+local_services.versions), the day and who is asking can be tagged with
+an ETag made from exactly those. When the client already has that tag
+the view returns 304 straight after reading the versions, before any
+of its own queries or template rendering:
+
+    etag = etag_for('doctor-today', doctor.id, date.today(), *current_versions('dashboard'))
+    response = not_modified(etag)
+    if response:
+        return response
+    ...
+    return tagged(render_template(...), etag)
+
+A page that also changes with the clock (slots drop off once they have
+started) is tagged with expiring(etag, when): the tag matches until
+then and not after, still without a query.
+
+Responses are ``Cache-Control: private, no-cache``: never stored by a
+shared cache (they differ per user), always revalidated by the browser.
+A page that showed flash messages is neither tagged nor answered with
+304, so a message is shown once and never comes back from the cache.
+"""
+import hashlib
+import time
+
+from flask import current_app, make_response, request, session
+from flask.globals import request_ctx
+
+CACHE_CONTROL = 'private, no-cache'
+
+
+def etag_for(*parts):
+    """A short strong ETag for the given values."""
+    return hashlib.sha1(repr(parts).encode()).hexdigest()[:20]
+
+
+def expiring(etag, until):
+    """``etag`` in a form that stops matching at ``until`` (a local datetime)."""
+    return f'{etag}-{int(until.timestamp())}'
+
+
+def _matches(tag, etag):
+    if tag == etag:
+        return True
+    base, _, until = tag.rpartition('-')
+    return base == etag and until.isdigit() and int(until) > time.time()
+
+
+def not_modified(etag):
+    """A 304 response if the request's If-None-Match has ``etag``, else None."""
+    if '_flashes' in session:
+        return None
+    for tag in request.if_none_match.as_set():
+        if _matches(tag, etag):
+            response = current_app.response_class(status=304)
+            response.set_etag(tag)
+            response.headers['Cache-Control'] = CACHE_CONTROL
+            return response
+    return None
+
+
+def tagged(response, etag):
+    """``response`` (anything a view may return) with ``etag`` and the cache headers."""
+    response = make_response(response)
+    if request_ctx.flashes:
+        response.headers['Cache-Control'] = 'no-store'
+        return response
+    response.set_etag(etag)
+    response.headers['Cache-Control'] = CACHE_CONTROL
+    return response
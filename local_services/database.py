@@ -0,0 +1,179 @@
+"""Database URL and engine settings.
+
+SQLite (clinic_appointments.db) is the default. Set DATABASE_URL to a
+PostgreSQL URL to run on PostgreSQL; ``postgres://`` URLs are accepted,
+and a URL without a driver uses psycopg 3 when it is installed (it can
+use server-side prepared statements) and psycopg2 otherwise.
+
+Pool and timeout settings, all from the environment:
+
+    DB_POOL_SIZE          connections kept open per worker (5)
+    DB_MAX_OVERFLOW       extra connections opened under load (10)
+    DB_POOL_TIMEOUT       whole seconds to wait for a free connection (10)
+    DB_POOL_RECYCLE       seconds before a connection is replaced (300)
+    DB_STATEMENT_TIMEOUT  PostgreSQL statement_timeout in ms (30000, 0 = none)
+    DB_LOCK_TIMEOUT       PostgreSQL lock_timeout in ms (5000, 0 = none)
+    DB_PREPARE_THRESHOLD  psycopg 3: runs of a statement before it is
+                          prepared on the server (2, "off" behind a
+                          transaction-mode PgBouncer)
+
+Time spent waiting for a connection is recorded per request as
+http_request_db_pool_wait_seconds on /metrics, and checkouts that give
+up as db_pool_timeouts_total.
+
+SQLite connections get these pragmas as they are opened:
+
+    SQLITE_JOURNAL_MODE   WAL: readers no longer wait for a writer
+    SQLITE_SYNCHRONOUS    NORMAL: safe under WAL, fsync only at checkpoints
+    SQLITE_BUSY_TIMEOUT   ms a writer waits for the lock before "database
+                          is locked" (5000)
+    SQLITE_MMAP_SIZE      bytes of the file read through mmap (256 MiB)
+    SQLITE_CACHE_SIZE     page cache, in pages or, negative, KiB (-16000)
+    SQLITE_FOREIGN_KEYS   enforce foreign keys, as PostgreSQL does (on)
+"""
+import importlib.util
+import os
+import time
+
+from sqlalchemy import event
+from sqlalchemy.dialects import postgresql, sqlite
+from sqlalchemy.engine import make_url
+from sqlalchemy.exc import TimeoutError as PoolTimeout
+from sqlalchemy.pool import QueuePool
+
+from local_db import db
+from local_services import metrics
+
+DEFAULT_URL = 'sqlite:///clinic_appointments.db'
+
+
+def database_url(value=None):
+    """The SQLAlchemy URL for a DATABASE_URL value (SQLite if unset)."""
+    if not value:
+        return DEFAULT_URL
+    if value.startswith('postgres://'):
+        value = 'postgresql://' + value[len('postgres://'):]
+    if value.startswith('postgresql://') and importlib.util.find_spec('psycopg'):
+        value = 'postgresql+psycopg://' + value[len('postgresql://'):]
+    return value
+
+
+def increment(connection, table, column, deltas):
+    """Add each ``{key: delta}`` to ``column`` of the row with that primary key.
+
+    A missing row is created at its delta by the same INSERT ... ON
+    CONFLICT DO UPDATE, so two transactions creating one row at once both
+    count instead of the second failing on the primary key. Rows are
+    written in key order, so concurrent writers lock them in one order.
+    """
+    insert = postgresql.insert if connection.dialect.name == 'postgresql' else sqlite.insert
+    (key,) = table.primary_key.columns
+    statement = insert(table).values([{key.name: name, column: delta}
+                                      for name, delta in sorted(deltas.items())])
+    connection.execute(statement.on_conflict_do_update(
+        index_elements=[key], set_={column: table.c[column] + statement.excluded[column]}))
+
+
+def pool_config():
+    """DB_* settings from the environment, as config keys."""
+    threshold = os.environ.get('DB_PREPARE_THRESHOLD', '2')
+    return {
+        'DB_POOL_SIZE': int(os.environ.get('DB_POOL_SIZE', 5)),
+        'DB_MAX_OVERFLOW': int(os.environ.get('DB_MAX_OVERFLOW', 10)),
+        'DB_POOL_TIMEOUT': int(os.environ.get('DB_POOL_TIMEOUT', 10)),
+        'DB_POOL_RECYCLE': int(os.environ.get('DB_POOL_RECYCLE', 300)),
+        'DB_STATEMENT_TIMEOUT': int(os.environ.get('DB_STATEMENT_TIMEOUT', 30000)),
+        'DB_LOCK_TIMEOUT': int(os.environ.get('DB_LOCK_TIMEOUT', 5000)),
+        'DB_PREPARE_THRESHOLD': None if threshold.lower() in ('off', 'none', '') else int(threshold),
+    }
+
+
+def sqlite_config():
+    """SQLITE_* settings from the environment, as config keys."""
+    return {
+        'SQLITE_JOURNAL_MODE': os.environ.get('SQLITE_JOURNAL_MODE', 'WAL').upper(),
+        'SQLITE_SYNCHRONOUS': os.environ.get('SQLITE_SYNCHRONOUS', 'NORMAL').upper(),
+        'SQLITE_BUSY_TIMEOUT': int(os.environ.get('SQLITE_BUSY_TIMEOUT', 5000)),
+        'SQLITE_MMAP_SIZE': int(os.environ.get('SQLITE_MMAP_SIZE', 256 * 1024 * 1024)),
+        'SQLITE_CACHE_SIZE': int(os.environ.get('SQLITE_CACHE_SIZE', -16000)),
+        'SQLITE_FOREIGN_KEYS': os.environ.get('SQLITE_FOREIGN_KEYS', '1').lower() not in ('0', 'false', 'no', 'off'),
+    }
+
+
+JOURNAL_MODES = ('DELETE', 'TRUNCATE', 'PERSIST', 'MEMORY', 'WAL', 'OFF')
+SYNCHRONOUS = ('OFF', 'NORMAL', 'FULL', 'EXTRA')
+
+
+def sqlite_pragmas(config):
+    """The PRAGMA statements for a new SQLite connection."""
+    journal_mode = config['SQLITE_JOURNAL_MODE'].upper()
+    synchronous = config['SQLITE_SYNCHRONOUS'].upper()
+    if journal_mode not in JOURNAL_MODES:
+        raise ValueError(f'SQLITE_JOURNAL_MODE must be one of {", ".join(JOURNAL_MODES)}')
+    if synchronous not in SYNCHRONOUS:
+        raise ValueError(f'SQLITE_SYNCHRONOUS must be one of {", ".join(SYNCHRONOUS)}')
+    return [
+        # busy_timeout first: switching to WAL itself needs the lock
+        f"PRAGMA busy_timeout = {int(config['SQLITE_BUSY_TIMEOUT'])}",
+        f'PRAGMA journal_mode = {journal_mode}',
+        f'PRAGMA synchronous = {synchronous}',
+        f"PRAGMA mmap_size = {int(config['SQLITE_MMAP_SIZE'])}",
+        f"PRAGMA cache_size = {int(config['SQLITE_CACHE_SIZE'])}",
+        f"PRAGMA foreign_keys = {'ON' if config['SQLITE_FOREIGN_KEYS'] else 'OFF'}",
+    ]
+
+
+def init_app(app):
+    """Set the SQLite pragmas on every connection ``app``'s engines open."""
+    pragmas = sqlite_pragmas(app.config)
+
+    def set_pragmas(dbapi_connection, connection_record):
+        cursor = dbapi_connection.cursor()
+        for pragma in pragmas:
+            cursor.execute(pragma)
+        cursor.close()
+
+    with app.app_context():
+        for engine in db.engines.values():
+            if engine.dialect.name == 'sqlite':
+                event.listen(engine, 'connect', set_pragmas)
+
+
+class TimedQueuePool(QueuePool):
+    """QueuePool that reports how long each checkout waited."""
+
+    def _do_get(self):
+        started = time.perf_counter()
+        try:
+            return super()._do_get()
+        except PoolTimeout:
+            metrics.record_pool_timeout()
+            raise
+        finally:
+            metrics.record_pool_wait(time.perf_counter() - started)
+
+
+def engine_options(config):
+    """SQLALCHEMY_ENGINE_OPTIONS for the configured database."""
+    url = make_url(config['SQLALCHEMY_DATABASE_URI'])
+    options = {'pool_pre_ping': True}
+    if url.get_backend_name() == 'sqlite' and url.database in (None, '', ':memory:'):
+        return options  # one shared in-memory connection, nothing to pool
+
+    options.update(
+        poolclass=TimedQueuePool,
+        pool_size=config['DB_POOL_SIZE'],
+        max_overflow=config['DB_MAX_OVERFLOW'],
+        pool_timeout=config['DB_POOL_TIMEOUT'],
+        pool_recycle=config['DB_POOL_RECYCLE'],
+    )
+    if url.get_backend_name() == 'postgresql':
+        # Server-side limits, so a runaway query or a lock queue is cut off
+        # by PostgreSQL instead of holding a worker until gunicorn kills it
+        settings = [f"-c {name}={config[key]}" for name, key in (
+            ('statement_timeout', 'DB_STATEMENT_TIMEOUT'), ('lock_timeout', 'DB_LOCK_TIMEOUT'))]
+        connect_args = {'options': ' '.join(settings), 'application_name': 'clinic'}
+        if url.get_driver_name() == 'psycopg':
+            connect_args['prepare_threshold'] = config['DB_PREPARE_THRESHOLD']
+        options['connect_args'] = connect_args
+    return options
@@ -0,0 +1,52 @@
+"""Clinic and doctor directory for the booking pages, served from a cache.
+
+Rows are projected (no ORM objects, no lazy loads) and kept per worker
+in a VersionedCache keyed on the ``directory`` data version. Any
+clinic, doctor or doctor-user change bumps that version when it
+commits.
+"""
+from sqlalchemy import select
+from local_db import db
+from local_models import Clinic, Doctor, User
+from local_services.cache import VersionedCache
+
+directory_cache = VersionedCache('directory', 'directory')
+
+
+def _load_clinics():
+    return tuple(db.session.execute(
+        select(Clinic.id, Clinic.name, Clinic.address, Clinic.phone, Clinic.email).order_by(Clinic.id)
+    ).all())
+
+
+def _load_doctors(clinic_id):
+    return tuple(db.session.execute(
+        select(
+            Doctor.id,
+            Doctor.clinic_id,
+            User.name,
+            User.phone,
+            Doctor.specialization,
+            Doctor.license_number,
+            Doctor.years_experience,
+        )
+        .join(User, Doctor.user_id == User.id)
+        .where(Doctor.clinic_id == clinic_id)
+        .order_by(Doctor.id)
+    ).all())
+
+
+def clinics():
+    """Every clinic as (id, name, address, phone, email) rows."""
+    return directory_cache.get_or_load(('clinics',), _load_clinics)
+
+
+def clinic(clinic_id):
+    """One clinic row, or None."""
+    return next((row for row in clinics() if row.id == clinic_id), None)
+
+
+def doctors(clinic_id):
+    """Doctors at a clinic as (id, clinic_id, name, phone, specialization,
+    license_number, years_experience) rows."""
+    return directory_cache.get_or_load(('doctors', clinic_id), lambda: _load_doctors(clinic_id))
@@ -0,0 +1,219 @@
+"""Live appointment and slot events, pushed to open pages over SSE.
+
+    EVENTS_ENABLED    serve /events, have pages follow it and publish
+                      events (off; gunicorn.conf.py turns it on for
+                      gevent workers)
+    EVENTS_DIR        where the workers of one server pass events to each
+                      other (gunicorn.conf.py sets it); unset, events only
+                      reach streams in the same process
+    EVENTS_HEARTBEAT  seconds between keep-alive comments on an idle
+                      stream (15)
+    EVENTS_BACKLOG    events a stream may fall behind by before it is
+                      reset (100)
+
+Kinds: ``booked``, ``cancelled`` and ``completed`` (an appointment) and
+``slot`` (a doctor opened or closed a slot). An event names the doctor,
+clinic and slot and whether the slot is now open, nothing about the
+patient, so any signed-in user may follow any doctor or clinic.
+
+emit() only queues an event on the session: it is published when the
+transaction commits and dropped on rollback, so no page hears of a
+booking that did not happen. Publishing hands it to this process's
+streams following the doctor, the clinic or everything, and sends one
+datagram to each other worker's socket in EVENTS_DIR, whose receiver
+thread hands it to that worker's streams.
+
+An idle stream is a generator blocked on a condition variable: a thread
+under gthread workers, a greenlet under gevent workers (for thousands
+of them). It wakes for its own events and heartbeats only. As a gthread
+worker has a handful of threads, a few open pages would take them all:
+EVENTS_ENABLED stays off there unless a proxy sends /events to a gevent
+instance (see the README).
+"""
+import atexit
+import json
+import os
+import socket
+import threading
+from collections import deque
+
+from flask import current_app, has_app_context
+from sqlalchemy import event as sqlalchemy_event
+from local_db import db
+from local_models import Doctor
+
+KINDS = ('booked', 'cancelled', 'completed', 'slot')
+EVERYTHING = '*'
+SOCKET_PREFIX = 'events-'
+MAX_DATAGRAM = 65536
+
+
+def topics_of(event):
+    return (EVERYTHING, f"doctor:{event['doctor_id']}", f"clinic:{event['clinic_id']}")
+
+
+class Stream:
+    """One open /events connection's undelivered events, as SSE messages."""
+
+    def __init__(self, topics, backlog):
+        self.topics = tuple(topics)
+        self.overflowed = False
+        self._backlog = backlog
+        self._events = deque()
+        self._ready = threading.Condition()
+
+    def put(self, message):
+        with self._ready:
+            if len(self._events) < self._backlog:
+                self._events.append(message)
+            else:
+                self.overflowed = True
+            self._ready.notify()
+
+    def get(self, timeout):
+        """The waiting events, after up to ``timeout`` seconds for one ([] if none came)."""
+        with self._ready:
+            if not self._events and not self.overflowed:
+                self._ready.wait(timeout)
+            events = list(self._events)
+            self._events.clear()
+            return events
+
+
+class Broker:
+    """A worker's streams by topic, and its link to the other workers."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._streams = {}  # topic -> set of Streams
+        self._listening = None  # (pid, directory) the receiver was started for
+        self._sender = None
+        self.dropped = 0  # datagrams a busy or gone worker did not take
+
+    def subscribe(self, topics, backlog=100, directory=None):
+        stream = Stream(topics, backlog)
+        # Once per process (the master forks workers without the receiver),
+        # and only in a worker that has streams
+        listen = directory and self._listening != (os.getpid(), directory)
+        with self._lock:
+            for topic in stream.topics:
+                self._streams.setdefault(topic, set()).add(stream)
+            if listen:
+                listen = self._listening != (os.getpid(), directory)
+                self._listening = (os.getpid(), directory)
+        if listen:
+            # Outside the lock: under gevent starting a thread switches
+            # greenlets, and the lock may predate the patching (preload_app)
+            self._listen(directory)
+        return stream
+
+    def unsubscribe(self, stream):
+        with self._lock:
+            for topic in stream.topics:
+                streams = self._streams.get(topic)
+                if streams is not None:
+                    streams.discard(stream)
+                    if not streams:
+                        del self._streams[topic]
+
+    def deliver(self, events):
+        """Hand ``events`` to this process's streams, formatted once for all of them."""
+        for event in events:
+            with self._lock:
+                streams = {stream for topic in topics_of(event) for stream in self._streams.get(topic, ())}
+            if streams:
+                message = format_event(event)
+                for stream in streams:
+                    stream.put(message)
+
+    def publish(self, events, directory=None):
+        """Deliver ``events`` here and in every other worker listening in ``directory``."""
+        self.deliver(events)
+        if directory:
+            self._send(directory, json.dumps(events).encode())
+
+    def _path(self, directory, pid):
+        return os.path.join(directory, f'{SOCKET_PREFIX}{pid}.sock')
+
+    def _listen(self, directory):
+        path = self._path(directory, os.getpid())
+        receiver = socket.socket(socket.AF_UNIX, socket.SOCK_DGRAM)
+        if os.path.exists(path):
+            os.unlink(path)
+        receiver.bind(path)
+        atexit.register(_unlink, path)
+        threading.Thread(target=self._receive, args=(receiver,), name='events-receiver', daemon=True).start()
+
+    def _receive(self, receiver):
+        while True:
+            try:
+                self.deliver(json.loads(receiver.recv(MAX_DATAGRAM)))
+            except ValueError:
+                continue
+
+    def _send(self, directory, payload):
+        sender = self._sender
+        if sender is None or sender[0] != os.getpid():
+            sock = socket.socket(socket.AF_UNIX, socket.SOCK_DGRAM)
+            sock.setblocking(False)  # a worker that is behind misses events, it never holds up a request
+            sender = self._sender = (os.getpid(), sock)
+        own = self._path(directory, os.getpid())
+        try:
+            names = os.listdir(directory)
+        except FileNotFoundError:
+            return
+        for name in names:
+            path = os.path.join(directory, name)
+            if not name.startswith(SOCKET_PREFIX) or path == own:
+                continue
+            try:
+                sender[1].sendto(payload, path)
+            except (ConnectionRefusedError, FileNotFoundError):
+                _unlink(path)  # left behind by an exited worker
+            except BlockingIOError:
+                self.dropped += 1
+
+
+def _unlink(path):
+    try:
+        os.unlink(path)
+    except FileNotFoundError:
+        pass
+
+
+broker = Broker()
+
+
+def enabled():
+    return has_app_context() and current_app.config.get('EVENTS_ENABLED')
+
+
+def emit(kind, doctor_id, time_slot_id, available):
+    """Queue an event for when the current transaction commits."""
+    if not enabled():
+        return
+    # Usually already in the identity map (the route loaded the doctor)
+    doctor = db.session.get(Doctor, doctor_id)
+    db.session.info.setdefault('pending_events', []).append({
+        'kind': kind,
+        'doctor_id': doctor_id,
+        'clinic_id': doctor.clinic_id if doctor is not None else None,
+        'time_slot_id': time_slot_id,
+        'available': available,
+    })
+
+
+def format_event(event):
+    return f"event: {event['kind']}\ndata: {json.dumps(event)}\n\n"
+
+
+@sqlalchemy_event.listens_for(db.session, 'after_commit')
+def _publish(session):
+    events = session.info.pop('pending_events', None)
+    if events:
+        broker.publish(events, current_app.config.get('EVENTS_DIR') if has_app_context() else None)
+
+
+@sqlalchemy_event.listens_for(db.session, 'after_rollback')
+def _discard(session):
+    session.info.pop('pending_events', None)
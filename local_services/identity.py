@@ -0,0 +1,89 @@
+"""Who is making the request, resolved once per request.
+
+The session cookie carries user_id, user_role, user_name and, since
+login, profile_id (the Doctor or Patient row of that user). The guards
+of every blueprint go through current_user(), which checks those against
+the database in one query and keeps the result on ``g``:
+
+* with a profile id: the profile by primary key, joined to its user;
+* without one (sessions from before profile ids, admins): the user by
+  primary key, joined to the profile of its role.
+
+A session whose user is gone or whose role has changed is cleared, so a
+deleted doctor or a demoted admin is signed out on the next request
+instead of being trusted until the cookie expires.
+"""
+from flask import g, redirect, session, url_for
+from sqlalchemy.orm import contains_eager, joinedload
+
+from local_models import Doctor, Patient, User
+
+PROFILES = {'doctor': Doctor, 'patient': Patient}
+PROFILE_ATTRIBUTES = {'doctor': 'doctor_profile', 'patient': 'patient_profile'}
+
+def remember(user):
+    """Sign ``user`` in: the session keys the loader and templates read."""
+    session['user_id'] = user.id
+    session['user_role'] = user.role
+    session['user_name'] = user.full_name
+    profile = profile_of(user)
+    if profile is not None:
+        session['profile_id'] = profile.id
+    else:
+        session.pop('profile_id', None)
+
+
+def profile_of(user):
+    attribute = PROFILE_ATTRIBUTES.get(user.role)
+    return getattr(user, attribute) if attribute else None
+
+
+def _load(user_id, role, profile_id):
+    """(user, profile) in one query; (None, None) if there is no such user."""
+    model = PROFILES.get(role)
+    if model is not None and profile_id is not None:
+        profile = (model.query.join(model.user)
+                   .options(contains_eager(model.user))
+                   .filter(model.id == profile_id, model.user_id == user_id)
+                   .first())
+        return (profile.user, profile) if profile is not None else (None, None)
+    query = User.query
+    if model is not None:
+        query = query.options(joinedload(getattr(User, PROFILE_ATTRIBUTES[role])))
+    user = query.filter(User.id == user_id).first()
+    return user, profile_of(user) if user is not None else None
+
+
+def _identity():
+    identity = g.get('identity')
+    if identity is not None:
+        return identity
+    user = profile = None
+    user_id, role = session.get('user_id'), session.get('user_role')
+    if user_id is not None:
+        user, profile = _load(user_id, role, session.get('profile_id'))
+        if user is None or user.role != role:
+            session.clear()  # deleted, or the role changed since login
+            user = profile = None
+        elif profile is not None and 'profile_id' not in session:
+            session['profile_id'] = profile.id
+    g.identity = user, profile
+    return g.identity
+
+
+def current_user():
+    """The signed-in User, or None; one query per request."""
+    return _identity()[0]
+
+
+def current_profile():
+    """The signed-in user's Doctor or Patient row, or None."""
+    return _identity()[1]
+
+
+def require_role(*roles):
+    """None if the signed-in user has one of ``roles``, else a redirect to login."""
+    user = current_user()
+    if user is None or user.role not in roles:
+        return redirect(url_for('auth_bp.login'))
+    return None
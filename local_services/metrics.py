@@ -0,0 +1,317 @@
+"""Per-request metrics, exposed on /metrics in the Prometheus text format.
+
+Recorded for every request, by endpoint (the route name, never the raw
+URL, so the number of series stays bounded):
+
+    http_requests_total             counter, also by method and status
+    http_request_duration_seconds   histogram of wall time
+    http_request_db_statements      histogram of SQL statements run
+    http_request_db_seconds         histogram of time spent running them
+    http_request_db_pool_wait_seconds histogram of time spent waiting for
+                                    a pooled connection
+    http_requests_in_flight         gauge
+    db_pool_timeouts_total          counter of checkouts that gave up
+
+Each worker keeps its numbers in memory behind one lock; recording a
+request is a few dict updates. A scrape reaches a single gunicorn worker,
+so with several workers set METRICS_DIR: each worker then writes its
+totals there at most once a second (and on exit), and /metrics adds up
+every file. When a worker exits, the gunicorn master folds its file into
+retired.json (see retire), so a scrape reads one file per live worker
+plus that one however often workers are recycled. Exited workers'
+counters are kept; their in-flight gauge is not.
+
+In production /metrics needs METRICS_TOKEN: without one it answers 404
+rather than publish endpoint names and traffic to anyone.
+"""
+import atexit
+import json
+import os
+import threading
+import time
+from bisect import bisect_left
+
+from flask import current_app, g, has_app_context, request
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+CONTENT_TYPE = 'text/plain; version=0.0.4; charset=utf-8'
+
+# How often a worker writes its totals to METRICS_DIR, in seconds
+SNAPSHOT_INTERVAL = 1.0
+# Exited workers' totals, added up
+RETIRED = 'retired.json'
+
+HISTOGRAMS = {
+    'http_request_duration_seconds': (
+        'Request wall time in seconds, by endpoint.',
+        (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10),
+    ),
+    'http_request_db_statements': (
+        'SQL statements run per request, by endpoint.',
+        (0, 1, 2, 5, 10, 20, 50, 100, 200),
+    ),
+    'http_request_db_seconds': (
+        'Time spent running SQL per request in seconds, by endpoint.',
+        (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5),
+    ),
+    'http_request_db_pool_wait_seconds': (
+        'Time spent waiting to check out a database connection per request in seconds, by endpoint.',
+        (0.0001, 0.001, 0.005, 0.01, 0.05, 0.1, 0.5, 1, 5, 10),
+    ),
+}
+
+
+class RequestMetrics:
+    """One worker's request totals."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._written = 0.0
+        self._pending = None
+        self.reset()
+
+    def reset(self):
+        with self._lock:
+            # (endpoint, method, status) -> count
+            self.requests = {}
+            # histogram name -> endpoint -> [count per bucket..., count above the last, sum]
+            self.histograms = {name: {} for name in HISTOGRAMS}
+            self.in_flight = 0
+            self.pool_timeouts = 0
+
+    def started(self):
+        with self._lock:
+            self.in_flight += 1
+
+    def finished(self, endpoint, method, status, seconds, statements, db_seconds, pool_wait):
+        observed = (
+            ('http_request_duration_seconds', seconds),
+            ('http_request_db_statements', statements),
+            ('http_request_db_seconds', db_seconds),
+            ('http_request_db_pool_wait_seconds', pool_wait),
+        )
+        with self._lock:
+            self.in_flight -= 1
+            key = (endpoint, method, status)
+            self.requests[key] = self.requests.get(key, 0) + 1
+            for name, value in observed:
+                buckets = HISTOGRAMS[name][1]
+                series = self.histograms[name].get(endpoint)
+                if series is None:
+                    series = self.histograms[name][endpoint] = [0] * (len(buckets) + 2)
+                series[bisect_left(buckets, value)] += 1
+                series[-1] += value
+
+    def pool_timeout(self):
+        with self._lock:
+            self.pool_timeouts += 1
+
+    def snapshot(self):
+        with self._lock:
+            return {
+                'pid': os.getpid(),
+                'requests': [[*key, count] for key, count in self.requests.items()],
+                'histograms': {name: {endpoint: list(series) for endpoint, series in by_endpoint.items()}
+                               for name, by_endpoint in self.histograms.items()},
+                'in_flight': self.in_flight,
+                'pool_timeouts': self.pool_timeouts,
+            }
+
+    def write_snapshot(self, directory, force=False):
+        """Save this worker's totals for the other workers' scrapes."""
+        now = time.monotonic()
+        if not force and now - self._written < SNAPSHOT_INTERVAL:
+            # Written recently: flush once more when the interval is up, so
+            # the last requests before a quiet spell are not left out
+            with self._lock:
+                if self._pending is None:
+                    self._pending = threading.Timer(SNAPSHOT_INTERVAL, self.write_snapshot, (directory, True))
+                    self._pending.daemon = True
+                    self._pending.start()
+            return
+        if not self._written:
+            atexit.register(self.write_snapshot, directory, True)
+        self._written = now
+        with self._lock:
+            self._pending = None
+        os.makedirs(directory, exist_ok=True)
+        _write(os.path.join(directory, f'{os.getpid()}.json'), self.snapshot())
+
+
+request_metrics = RequestMetrics()
+
+
+def _alive(pid):
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        pass
+    return True
+
+
+def _read(path):
+    try:
+        with open(path) as handle:
+            return json.load(handle)
+    except (OSError, ValueError):
+        return None  # missing, or being replaced right now
+
+
+def _write(path, snapshot):
+    with open(f'{path}.tmp', 'w') as handle:
+        json.dump(snapshot, handle)
+    os.replace(f'{path}.tmp', path)
+
+
+def retire(directory, pid):
+    """Fold exited worker ``pid``'s totals into retired.json and drop its file.
+
+    Called by the gunicorn master (child_exit), the only writer of
+    retired.json.
+    """
+    path = os.path.join(directory, f'{pid}.json')
+    snapshot = _read(path)
+    if snapshot is None:
+        return
+    retired_path = os.path.join(directory, RETIRED)
+    retired = _read(retired_path)
+    requests, histograms, _, pool_timeouts = _merge([snapshot] + ([retired] if retired else []))
+    _write(retired_path, {
+        'pid': None,
+        'requests': [[*key, count] for key, count in requests.items()],
+        'histograms': histograms,
+        'in_flight': 0,
+        'pool_timeouts': pool_timeouts,
+    })
+    os.remove(path)
+
+
+def collect(directory=None):
+    """This worker's snapshot merged with every other one in ``directory``."""
+    snapshots = [request_metrics.snapshot()]
+    if directory and os.path.isdir(directory):
+        for filename in os.listdir(directory):
+            if not filename.endswith('.json') or filename == f'{os.getpid()}.json':
+                continue
+            snapshot = _read(os.path.join(directory, filename))
+            if snapshot is not None:  # else it is in the next scrape
+                snapshots.append(snapshot)
+    return _merge(snapshots)
+
+
+def _merge(snapshots):
+    requests, histograms, in_flight, pool_timeouts = {}, {name: {} for name in HISTOGRAMS}, 0, 0
+    for snapshot in snapshots:
+        for endpoint, method, status, count in snapshot['requests']:
+            key = (endpoint, method, status)
+            requests[key] = requests.get(key, 0) + count
+        for name, by_endpoint in snapshot['histograms'].items():
+            for endpoint, series in by_endpoint.items():
+                total = histograms[name].setdefault(endpoint, [0] * len(series))
+                for index, value in enumerate(series):
+                    total[index] += value
+        if snapshot['in_flight'] and (snapshot['pid'] == os.getpid() or _alive(snapshot['pid'])):
+            in_flight += snapshot['in_flight']
+        pool_timeouts += snapshot['pool_timeouts']
+    return requests, histograms, in_flight, pool_timeouts
+
+
+def _label(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def render(directory=None):
+    """All metrics in the Prometheus text exposition format."""
+    requests, histograms, in_flight, pool_timeouts = collect(directory)
+    lines = [
+        '# HELP http_requests_total Requests handled, by endpoint, method and status.',
+        '# TYPE http_requests_total counter',
+    ]
+    for (endpoint, method, status), count in sorted(requests.items()):
+        lines.append(f'http_requests_total{{endpoint="{_label(endpoint)}",method="{method}",'
+                     f'status="{status}"}} {count}')
+    for name, (help_text, buckets) in HISTOGRAMS.items():
+        lines += [f'# HELP {name} {help_text}', f'# TYPE {name} histogram']
+        for endpoint, series in sorted(histograms[name].items()):
+            label = f'endpoint="{_label(endpoint)}"'
+            cumulative = 0
+            for bound, count in zip(buckets, series):
+                cumulative += count
+                lines.append(f'{name}_bucket{{{label},le="{float(bound)!r}"}} {cumulative}')
+            cumulative += series[len(buckets)]
+            lines.append(f'{name}_bucket{{{label},le="+Inf"}} {cumulative}')
+            lines.append(f'{name}_sum{{{label}}} {float(series[-1])!r}')
+            lines.append(f'{name}_count{{{label}}} {cumulative}')
+    lines += [
+        '# HELP http_requests_in_flight Requests being handled right now.',
+        '# TYPE http_requests_in_flight gauge',
+        f'http_requests_in_flight {in_flight}',
+        '# HELP db_pool_timeouts_total Database connection checkouts that timed out waiting for the pool.',
+        '# TYPE db_pool_timeouts_total counter',
+        f'db_pool_timeouts_total {pool_timeouts}',
+    ]
+    return '\n'.join(lines) + '\n'
+
+
+def _before_request():
+    request_metrics.started()
+    # started, statements, db seconds, pool wait seconds, status
+    g.request_metrics = [time.perf_counter(), 0, 0.0, 0.0, 500]
+
+
+def _after_request(response):
+    timing = g.get('request_metrics')
+    if timing is not None:
+        timing[4] = response.status_code
+    return response
+
+
+def _teardown_request(exc):
+    timing = g.pop('request_metrics', None)
+    if timing is None:
+        return
+    started, statements, db_seconds, pool_wait, status = timing
+    # Unmatched URLs share one label so 404 probes cannot add series
+    endpoint = request.endpoint or 'unmatched'
+    request_metrics.finished(endpoint, request.method, status, time.perf_counter() - started,
+                             statements, db_seconds, pool_wait)
+    directory = current_app.config.get('METRICS_DIR')
+    if directory:
+        request_metrics.write_snapshot(directory)
+
+
+def record_pool_wait(seconds):
+    """Add a connection checkout's wait to the current request."""
+    timing = g.get('request_metrics') if has_app_context() else None
+    if timing is not None:
+        timing[3] += seconds
+
+
+def record_pool_timeout():
+    request_metrics.pool_timeout()
+
+
+@event.listens_for(Engine, 'before_cursor_execute')
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    if context is not None:
+        context.metrics_started = time.perf_counter()
+
+
+@event.listens_for(Engine, 'after_cursor_execute')
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    timing = g.get('request_metrics') if has_app_context() else None
+    if timing is not None and context is not None:
+        timing[1] += 1
+        timing[2] += time.perf_counter() - context.metrics_started
+
+
+def init_app(app):
+    """Record every request of ``app`` unless METRICS_ENABLED is off."""
+    if not app.config.get('METRICS_ENABLED', True):
+        return
+    app.before_request(_before_request)
+    app.after_request(_after_request)
+    app.teardown_request(_teardown_request)
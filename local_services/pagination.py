@@ -0,0 +1,97 @@
+import base64
+import json
+from datetime import datetime
+
+from flask_sqlalchemy.pagination import SelectPagination
+from sqlalchemy import tuple_
+from local_db import db
+
+
+class RowPagination(SelectPagination):
+    """SelectPagination that yields result rows instead of scalars.
+
+    For projected selects (several columns, no model entity), where
+    db.paginate() would keep only the first column of each row.
+    """
+
+    def _query_items(self):
+        select = self._query_args["select"]
+        select = select.limit(self.per_page).offset(self._query_offset)
+        session = self._query_args["session"]
+        return list(session.execute(select).all())
+
+
+def paginate_rows(select, page=None, per_page=None, max_per_page=None, error_out=True, count=True):
+    """Like db.paginate(), for column projections."""
+    return RowPagination(
+        select=select,
+        session=db.session(),
+        page=page,
+        per_page=per_page,
+        max_per_page=max_per_page,
+        error_out=error_out,
+        count=count,
+    )
+
+
+def encode_cursor(values):
+    """Opaque, URL-safe token for a row's sort key."""
+    payload = json.dumps([value.isoformat() if isinstance(value, datetime) else value for value in values])
+    return base64.urlsafe_b64encode(payload.encode()).decode().rstrip('=')
+
+
+def decode_cursor(token, key_types):
+    """Sort key from encode_cursor(), or None if the token is missing or bad."""
+    if not token:
+        return None
+    try:
+        values = json.loads(base64.urlsafe_b64decode(token + '=' * (-len(token) % 4)))
+        if len(values) != len(key_types):
+            return None
+        return tuple(datetime.fromisoformat(value) if key_type is datetime else key_type(value)
+                     for value, key_type in zip(values, key_types))
+    except (ValueError, TypeError):
+        return None
+
+
+class KeysetPage:
+    """One page of a keyset-paginated listing.
+
+    ``next_cursor``/``prev_cursor`` go into the ``after``/``before`` query
+    parameters of the links to the neighbouring pages.
+    """
+
+    def __init__(self, items, key, has_next, has_prev):
+        self.items = items
+        self.has_next = has_next
+        self.has_prev = has_prev
+        self.next_cursor = encode_cursor(key(items[-1])) if items and has_next else None
+        self.prev_cursor = encode_cursor(key(items[0])) if items and has_prev else None
+
+
+def keyset_paginate(query, columns, key, after=None, before=None, descending=False, per_page=10):
+    """Paginate ``query`` by a unique sort key instead of OFFSET.
+
+    ``columns`` are the sort key columns (the last one must be unique, e.g.
+    the primary key) and ``key(item)`` returns the same values for a loaded
+    item. ``after``/``before`` are decoded cursors. Every page costs one
+    index range scan of per_page + 1 rows, however deep it is, and no COUNT.
+    """
+    row = tuple_(*columns)
+    backwards = before is not None
+    if after is not None:
+        query = query.filter(row < after if descending else row > after)
+    elif backwards:
+        query = query.filter(row > before if descending else row < before)
+
+    # Walking backwards reads the rows just before the cursor in reverse order
+    reverse_scan = descending != backwards
+    query = query.order_by(*(column.desc() if reverse_scan else column.asc() for column in columns))
+    items = query.limit(per_page + 1).all()
+    has_more = len(items) > per_page
+    items = items[:per_page]
+
+    if backwards:
+        items.reverse()
+        return KeysetPage(items, key, has_next=True, has_prev=has_more)
+    return KeysetPage(items, key, has_next=has_more, has_prev=after is not None)
@@ -0,0 +1,96 @@
+"""Password hashing with a configurable cost.
+
+    PASSWORD_HASH_METHOD   Werkzeug method string with its cost, e.g.
+                           "scrypt:32768:8:1" (the default; n:r:p) or
+                           "pbkdf2:sha256:600000"
+    PASSWORD_HASH_WORKERS  hashes computed at once per worker process
+                           (one per CPU)
+
+Hashing is deliberately slow, so a morning rush of logins could take
+every CPU and starve the pages in between. Hashes are computed on a
+small thread pool instead: at most PASSWORD_HASH_WORKERS at a time per
+process, the other login threads wait their turn, and the rest of the
+worker's threads keep serving (hashlib releases the GIL while hashing).
+
+A stored hash made with other parameters still verifies; on the next
+successful login it is replaced with one made with the current method
+(see verify_password), so raising or lowering the cost needs no
+migration.
+"""
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from flask import current_app, has_app_context
+from werkzeug.security import DEFAULT_PBKDF2_ITERATIONS, check_password_hash, generate_password_hash
+
+DEFAULT_METHOD = 'scrypt:32768:8:1'
+SCRYPT_DEFAULTS = (32768, 8, 1)  # Werkzeug's n, r, p
+
+_executor = None
+_executor_key = None  # (pid, workers) it was made for
+_executor_lock = threading.Lock()
+
+
+def normalize_method(method):
+    """The method string Werkzeug stores for ``method``, with its defaults filled in.
+
+    'scrypt' -> 'scrypt:32768:8:1', 'scrypt:16384' -> 'scrypt:16384:8:1',
+    'pbkdf2' -> 'pbkdf2:sha256:<Werkzeug's iterations>'. Anything shorter
+    would never equal a stored hash's prefix and rehash on every login.
+    """
+    name, *args = method.split(':')
+    if name == 'scrypt' and len(args) <= len(SCRYPT_DEFAULTS):
+        n, r, p = (*map(int, args), *SCRYPT_DEFAULTS[len(args):])
+        return f'scrypt:{n}:{r}:{p}'
+    if name == 'pbkdf2':
+        hash_name = args[0] if args else 'sha256'
+        iterations = int(args[1]) if len(args) > 1 else DEFAULT_PBKDF2_ITERATIONS
+        return f'pbkdf2:{hash_name}:{iterations}'
+    return method
+
+
+def _config(key, default):
+    return current_app.config.get(key, default) if has_app_context() else default
+
+
+def _run(function, *args):
+    """Run ``function`` on this process's hashing pool and wait for it."""
+    global _executor, _executor_key
+    key = (os.getpid(), _config('PASSWORD_HASH_WORKERS', os.cpu_count() or 1))
+    with _executor_lock:
+        # A pool's threads do not survive a fork: one per worker process
+        if _executor_key != key:
+            if _executor is not None and _executor_key[0] == key[0]:
+                _executor.shutdown(wait=False)
+            _executor = ThreadPoolExecutor(max_workers=key[1], thread_name_prefix='password-hash')
+            _executor_key = key
+        executor = _executor
+    return executor.submit(function, *args).result()
+
+
+def hash_password(password):
+    method = normalize_method(_config('PASSWORD_HASH_METHOD', DEFAULT_METHOD))
+    return _run(generate_password_hash, password, method)
+
+
+def check_password(password_hash, password):
+    return _run(check_password_hash, password_hash, password)
+
+
+def needs_rehash(password_hash):
+    """True if ``password_hash`` was made with other parameters than the configured ones."""
+    stored = password_hash.split('$', 1)[0]
+    return stored != normalize_method(_config('PASSWORD_HASH_METHOD', DEFAULT_METHOD))
+
+
+def verify_password(user, password):
+    """Check ``user``'s password; on success upgrade an outdated hash.
+
+    The new hash is only set on the user: the caller commits it.
+    """
+    if not user.check_password(password):
+        return False
+    if needs_rehash(user.password_hash):
+        user.set_password(password)
+    return True
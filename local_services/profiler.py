@@ -0,0 +1,195 @@
+"""SQL statement profiler for development and tests.
+
+With SQL_PROFILE on (the default when FLASK_ENV is development or
+testing) every statement a request runs is recorded with where it came
+from: the template line rendering at the time, if any, and the innermost
+line of application code (a route, service or model property). At the
+end of the request statements are grouped by normalized SQL, literals
+and parameter lists stripped, and any shape that ran
+SQL_N_PLUS_ONE_THRESHOLD times or more is logged as a likely N+1 with
+those locations.
+
+Query budgets: decorate a view with @query_budget(n), or list endpoints
+in SQL_QUERY_BUDGETS. A request over budget is logged as an error, and
+with SQL_PROFILE_STRICT (the default under FLASK_ENV=testing) raises
+QueryBudgetExceeded, which fails the request and the test around it.
+Tests can also wrap any block:
+
+    with max_queries(3) as profile:
+        client.get('/admin/appointments')
+
+Walking the stack for every statement is not free, so keep it out of
+production.
+"""
+import logging
+import os
+import re
+import sys
+import threading
+import time
+from collections import Counter
+from contextlib import contextmanager
+
+from flask import current_app, g, has_app_context, request
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+logger = logging.getLogger(__name__)
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+_STRINGS = re.compile(r"'(?:[^']|'')*'")
+_NUMBERS = re.compile(r'\b\d+(?:\.\d+)?\b')
+_PARAM_LISTS = re.compile(r'\((?:\s*\?\s*,)+\s*\?\s*\)')
+_SPACES = re.compile(r'\s+')
+
+
+class QueryBudgetExceeded(AssertionError):
+    """A request or block ran more SQL statements than allowed."""
+
+
+def normalize(statement):
+    """The shape of a statement: literals become ?, IN lists collapse."""
+    shape = _STRINGS.sub('?', statement)
+    shape = _NUMBERS.sub('?', shape)
+    shape = _PARAM_LISTS.sub('(?...)', shape)
+    return _SPACES.sub(' ', shape).strip()
+
+
+def _location():
+    """(template line, code line) of the innermost frames that ran a statement."""
+    template_line = code_line = None
+    frame = sys._getframe(2)
+    while frame is not None and (template_line is None or code_line is None):
+        template = frame.f_globals.get('__jinja_template__')
+        filename = frame.f_code.co_filename
+        if template is not None:
+            if template_line is None:
+                template_line = f'templates/{template.name}:{template.get_corresponding_lineno(frame.f_lineno)}'
+        elif code_line is None and filename.startswith(ROOT) and filename != __file__:
+            code_line = f'{os.path.relpath(filename, ROOT)}:{frame.f_lineno} ({frame.f_code.co_name})'
+        frame = frame.f_back
+    return template_line, code_line
+
+
+class Profile:
+    """Statements recorded during a request or a max_queries() block."""
+
+    def __init__(self, label):
+        self.label = label
+        self.statements = []  # (shape, seconds, template line, code line)
+
+    def __len__(self):
+        return len(self.statements)
+
+    def groups(self):
+        """{shape: (count, seconds, Counter of (template line, code line))}, busiest first."""
+        grouped = {}
+        for shape, seconds, template_line, code_line in self.statements:
+            count, total, locations = grouped.get(shape, (0, 0.0, Counter()))
+            locations[(template_line, code_line)] += 1
+            grouped[shape] = (count + 1, total + seconds, locations)
+        return dict(sorted(grouped.items(), key=lambda item: -item[1][0]))
+
+    def repeated(self, threshold):
+        """Shapes run ``threshold`` times or more: the N+1 suspects."""
+        return {shape: group for shape, group in self.groups().items() if group[0] >= threshold}
+
+    def summary(self):
+        seconds = sum(statement[1] for statement in self.statements)
+        return f'{self.label}: {len(self)} statements, {seconds * 1000:.1f} ms'
+
+    def report(self, threshold=None):
+        lines = [self.summary()]
+        for shape, (count, total, locations) in self.groups().items():
+            flag = 'N+1 ' if threshold is not None and count >= threshold else ''
+            lines.append(f'  {flag}{count}x {total * 1000:.1f} ms  {shape[:160]}')
+            for (template_line, code_line), times in locations.most_common(3):
+                where = ' via '.join(part for part in (template_line, code_line) if part) or 'unknown'
+                lines.append(f'      {times}x at {where}')
+        return '\n'.join(lines)
+
+
+_blocks = threading.local()
+
+
+@contextmanager
+def max_queries(limit, label='block'):
+    """Raise QueryBudgetExceeded if the block runs more than ``limit`` statements."""
+    profile = Profile(label)
+    stack = _blocks.__dict__.setdefault('profiles', [])
+    stack.append(profile)
+    try:
+        yield profile
+    finally:
+        stack.remove(profile)
+    if len(profile) > limit:
+        raise QueryBudgetExceeded(f'over budget ({len(profile)} > {limit})\n{profile.report(2)}')
+
+
+def query_budget(limit):
+    """Decorator: the view may run at most ``limit`` SQL statements."""
+    def decorate(view):
+        view.query_budget = limit
+        return view
+    return decorate
+
+
+def _active_profiles():
+    profiles = list(getattr(_blocks, 'profiles', ()))
+    if has_app_context():
+        profile = g.get('sql_profile')
+        if profile is not None:
+            profiles.append(profile)
+    return profiles
+
+
+@event.listens_for(Engine, 'before_cursor_execute')
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    if context is not None:
+        context.profile_started = time.perf_counter()
+
+
+@event.listens_for(Engine, 'after_cursor_execute')
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    profiles = _active_profiles()
+    if not profiles or context is None:
+        return
+    seconds = time.perf_counter() - context.profile_started
+    record = (normalize(statement), seconds, *_location())
+    for profile in profiles:
+        profile.statements.append(record)
+
+
+def _before_request():
+    g.sql_profile = Profile(f'{request.method} {request.path} ({request.endpoint})')
+
+
+def _after_request(response):
+    profile = g.pop('sql_profile', None)
+    if profile is None:
+        return response
+    config = current_app.config
+    threshold = config['SQL_N_PLUS_ONE_THRESHOLD']
+    if profile.repeated(threshold):
+        logger.warning('Repeated queries (likely N+1) in %s', profile.report(threshold))
+    else:
+        logger.debug('%s', profile.summary())
+
+    view = current_app.view_functions.get(request.endpoint)
+    budget = getattr(view, 'query_budget', None)
+    budget = config['SQL_QUERY_BUDGETS'].get(request.endpoint, budget)
+    if budget is not None and len(profile) > budget:
+        message = f'over budget ({len(profile)} > {budget}) in {profile.report(threshold)}'
+        if config['SQL_PROFILE_STRICT']:
+            raise QueryBudgetExceeded(message)
+        logger.error('%s', message)
+    return response
+
+
+def init_app(app):
+    """Profile every request of ``app`` when SQL_PROFILE is on."""
+    if not app.config.get('SQL_PROFILE'):
+        return
+    app.before_request(_before_request)
+    app.after_request(_after_request)
@@ -0,0 +1,182 @@
+from collections import defaultdict
+from datetime import datetime, time, timedelta
+from sqlalchemy import select
+from local_db import db
+from local_models import ScheduleException, ScheduleTemplate, TimeSlot
+from local_services.versions import bump_version, slot_version_name
+
+# Longest range one generate call may cover, and how many rows go per INSERT batch
+MAX_GENERATE_DAYS = 366
+INSERT_BATCH_SIZE = 5000
+
+
+def parse_template_fields(weekdays, start_time, end_time, slot_minutes, breaks=''):
+    """Validate working-hour form values into ScheduleTemplate column values.
+
+    ``weekdays`` is a list of day numbers (Monday is 0), times are 'HH:MM'
+    strings and ``breaks`` is a comma separated list of 'HH:MM-HH:MM'.
+    Raises ValueError with a message fit to show the user.
+    """
+    try:
+        days = sorted({int(day) for day in weekdays})
+    except (TypeError, ValueError):
+        raise ValueError('Invalid working days.')
+    if not days or days[0] < 0 or days[-1] > 6:
+        raise ValueError('Select at least one working day.')
+    try:
+        start = datetime.strptime(start_time, '%H:%M').time()
+        end = datetime.strptime(end_time, '%H:%M').time()
+    except (TypeError, ValueError):
+        raise ValueError('Start and end time must be given as HH:MM.')
+    if end <= start:
+        raise ValueError('End time must be after start time.')
+    try:
+        minutes = int(slot_minutes)
+    except (TypeError, ValueError):
+        raise ValueError('Slot length must be a number of minutes.')
+    if not 5 <= minutes <= 480:
+        raise ValueError('Slot length must be between 5 and 480 minutes.')
+
+    parsed_breaks = parse_breaks(breaks)
+    return {
+        'weekdays': ','.join(str(day) for day in days),
+        'start_time': start,
+        'end_time': end,
+        'slot_minutes': minutes,
+        'breaks': ','.join(f"{b_start.strftime('%H:%M')}-{b_end.strftime('%H:%M')}"
+                           for b_start, b_end in parsed_breaks),
+    }
+
+
+def parse_breaks(value):
+    """'12:00-13:00, 15:30-15:45' -> sorted [(time, time), ...]."""
+    breaks = []
+    for part in (value or '').split(','):
+        part = part.strip()
+        if not part:
+            continue
+        try:
+            start, end = (datetime.strptime(piece.strip(), '%H:%M').time() for piece in part.split('-'))
+        except ValueError:
+            raise ValueError(f'Invalid break "{part}", use HH:MM-HH:MM.')
+        if end <= start:
+            raise ValueError(f'Break "{part}" must end after it starts.')
+        breaks.append((start, end))
+    return sorted(breaks)
+
+
+def day_slots(template, day, breaks=None):
+    """(starts_at, ends_at) pairs a template yields on ``day``, skipping breaks.
+
+    A slot that would run into a break is not cut short; the next slot
+    starts when the break ends.
+    """
+    if breaks is None:
+        breaks = parse_breaks(template.breaks)
+    length = timedelta(minutes=template.slot_minutes)
+    day_end = datetime.combine(day, template.end_time)
+    pauses = [(datetime.combine(day, start), datetime.combine(day, end)) for start, end in breaks]
+
+    slots = []
+    starts_at = datetime.combine(day, template.start_time)
+    while starts_at + length <= day_end:
+        ends_at = starts_at + length
+        pause = next((p for p in pauses if p[0] < ends_at and p[1] > starts_at), None)
+        if pause:
+            starts_at = pause[1]
+            continue
+        slots.append((starts_at, ends_at))
+        starts_at = ends_at
+    return slots
+
+
+def last_generate_day(date_from):
+    """The last day one generate_slots() call starting on ``date_from`` may cover."""
+    return date_from + timedelta(days=MAX_GENERATE_DAYS - 1)
+
+
+def generate_slots(date_from, date_to, doctor_ids=None, batch_size=INSERT_BATCH_SIZE):
+    """Materialize the working-hour templates into time slots for [date_from, date_to].
+
+    Works on whole sets rather than slot by slot: one query each for the
+    templates, the days off and the slots already in the range, then the
+    new slots go in through one executemany() of a Core INSERT per
+    ``batch_size`` rows. Any generated slot that overlaps an existing one
+    for the same doctor is skipped, so running it again over the same
+    range adds nothing. ``doctor_ids`` limits generation to those doctors.
+    The caller commits. Returns the number of slots created.
+
+    Raises ValueError for a range longer than MAX_GENERATE_DAYS; callers
+    check last_generate_day() first.
+    """
+    if date_to < date_from:
+        return 0
+    if date_to > last_generate_day(date_from):
+        raise ValueError(f'Slots can be generated for at most {MAX_GENERATE_DAYS} days at a time.')
+    range_start = datetime.combine(date_from, time.min)
+    range_end = datetime.combine(date_to + timedelta(days=1), time.min)
+
+    templates = ScheduleTemplate.query
+    if doctor_ids is not None:
+        templates = templates.filter(ScheduleTemplate.doctor_id.in_(doctor_ids))
+    templates = templates.all()
+    if not templates:
+        return 0
+    doctor_ids = {template.doctor_id for template in templates}
+
+    days_off = set(db.session.execute(
+        select(ScheduleException.doctor_id, ScheduleException.date).where(
+            ScheduleException.doctor_id.in_(doctor_ids),
+            ScheduleException.date >= date_from,
+            ScheduleException.date <= date_to,
+        )
+    ).tuples())
+
+    # Slots already in the range, per doctor and day, for the overlap check
+    taken = defaultdict(list)
+    existing = db.session.execute(
+        select(TimeSlot.doctor_id, TimeSlot.starts_at, TimeSlot.ends_at).where(
+            TimeSlot.doctor_id.in_(doctor_ids),
+            TimeSlot.starts_at < range_end,
+            TimeSlot.ends_at > range_start,
+        )
+    ).tuples()
+    for doctor_id, starts_at, ends_at in existing:
+        taken[doctor_id, starts_at.date()].append((starts_at, ends_at))
+
+    # Core INSERT on the session's connection: no ORM bookkeeping per row
+    insert = TimeSlot.__table__.insert()
+    connection = db.session.connection()
+    created_at = datetime.utcnow()
+    days = [date_from + timedelta(days=offset) for offset in range((date_to - date_from).days + 1)]
+    rows = []
+    created = 0
+    doctors_with_slots = set()
+    for template in templates:
+        breaks = parse_breaks(template.breaks)
+        weekdays = set(template.weekday_numbers)
+        for day in days:
+            if day.weekday() not in weekdays or (template.doctor_id, day) in days_off:
+                continue
+            # A template's own slots never overlap, so only what was there
+            # before it (existing slots, other templates) needs checking
+            booked = taken[template.doctor_id, day]
+            earlier = list(booked)
+            for starts_at, ends_at in day_slots(template, day, breaks):
+                if earlier and any(start < ends_at and end > starts_at for start, end in earlier):
+                    continue
+                booked.append((starts_at, ends_at))
+                rows.append({'doctor_id': template.doctor_id, 'starts_at': starts_at,
+                             'ends_at': ends_at, 'is_available': True, 'created_at': created_at})
+                doctors_with_slots.add(template.doctor_id)
+            if len(rows) >= batch_size:
+                connection.execute(insert, rows)
+                created += len(rows)
+                rows = []
+    if rows:
+        connection.execute(insert, rows)
+        created += len(rows)
+    # No flush hook sees Core INSERTs
+    bump_version(*(slot_version_name(doctor_id) for doctor_id in sorted(doctors_with_slots)),
+                 connection=connection)
+    return created
@@ -0,0 +1,213 @@
+"""Appointment search index for the admin and doctor search boxes.
+
+One row per appointment in ``appointment_search`` holding a document
+built from the patient's name, email and phone, the doctor's name and
+the clinic's name. Searching is a substring match per word, answered
+from a trigram index:
+
+    SQLite      FTS5 virtual table with the trigram tokenizer, keyed by
+                rowid = appointment.id; MATCH '"word"' uses the index
+    PostgreSQL  plain table keyed by appointment_id with a pg_trgm GIN
+                index; ILIKE '%word%' uses the index. Where the server
+                has no pg_trgm (or the role may not create it) the table
+                is created without the index and a warning logged: the
+                same ILIKE search then scans it
+
+The index follows ORM writes through a flush hook, in the same
+transaction: new or re-pointed appointments, and renames of patients,
+doctors and clinics, re-derive the affected rows with one
+INSERT ... SELECT. Bulk loads that bypass the ORM should finish with
+rebuild() (``flask rebuild-search-index``).
+"""
+import logging
+
+from sqlalchemy import and_, column, delete, event, exists, false, func, insert, inspect, literal, or_, select, table, true
+from sqlalchemy.exc import DBAPIError
+from local_db import db
+from local_models import Appointment, Clinic, Doctor, User
+
+logger = logging.getLogger(__name__)
+
+SEARCH_TABLE = 'appointment_search'
+
+# Words shorter than a trigram cannot use the index, so they still work but scan
+MAX_SEARCH_WORDS = 6
+
+# Above this many matches a term is "common" and searched differently (SQLite)
+SELECTIVE_MATCHES = 2000
+
+# Attributes that feed a document, per model
+_INDEXED_ATTRS = {
+    User: ('name', 'email', 'phone'),
+    Doctor: ('user_id', 'clinic_id'),
+    Clinic: ('name',),
+    Appointment: ('patient_id', 'doctor_id'),
+}
+
+
+def search_table(dialect_name):
+    key = 'rowid' if dialect_name == 'sqlite' else 'appointment_id'
+    return table(SEARCH_TABLE, column(key), column('document')), key
+
+
+def create_search_index(connection):
+    """Create the index table for this database if it is missing."""
+    if connection.dialect.name == 'sqlite':
+        connection.exec_driver_sql(
+            f"CREATE VIRTUAL TABLE IF NOT EXISTS {SEARCH_TABLE} USING fts5(document, tokenize='trigram')"
+        )
+    elif connection.dialect.name == 'postgresql':
+        trigrams = create_trigram_extension(connection)
+        connection.exec_driver_sql(
+            f'CREATE TABLE IF NOT EXISTS {SEARCH_TABLE} ('
+            'appointment_id INTEGER PRIMARY KEY REFERENCES appointment (id) ON DELETE CASCADE, '
+            'document TEXT NOT NULL)'
+        )
+        if trigrams:
+            connection.exec_driver_sql(
+                f'CREATE INDEX IF NOT EXISTS ix_{SEARCH_TABLE}_document_trgm '
+                f'ON {SEARCH_TABLE} USING gin (document gin_trgm_ops)'
+            )
+
+
+def create_trigram_extension(connection):
+    """Create pg_trgm if it is missing; False (and a warning) if it cannot be.
+
+    Tried in a savepoint, so a server without the extension, or a role
+    not allowed to create it, leaves the rest of the transaction usable.
+    """
+    try:
+        with connection.begin_nested():
+            connection.exec_driver_sql('CREATE EXTENSION IF NOT EXISTS pg_trgm')
+    except DBAPIError as exc:
+        logger.warning('pg_trgm is not available (%s); appointment search will scan %s without '
+                       'an index. Install the PostgreSQL contrib extensions, then run '
+                       '`flask rebuild-search-index` to index it.', exc.orig, SEARCH_TABLE)
+        return False
+    return True
+
+
+@event.listens_for(db.metadata, 'after_create')
+def _create_with_tables(target, connection, **kw):
+    create_search_index(connection)
+
+
+def document_select():
+    """(appointment id, document) for every appointment, ready to filter."""
+    patient = User.__table__.alias('patient')
+    doctor_user = User.__table__.alias('doctor_user')
+    parts = [patient.c.name, patient.c.email, patient.c.phone, doctor_user.c.name, Clinic.name]
+    document = func.coalesce(parts[0], '')
+    for part in parts[1:]:
+        document = document + literal(' ') + func.coalesce(part, '')
+    return (
+        select(Appointment.id, document)
+        .join(patient, Appointment.patient_id == patient.c.id)
+        .join(Doctor, Appointment.doctor_id == Doctor.id)
+        .join(doctor_user, Doctor.user_id == doctor_user.c.id)
+        .join(Clinic, Doctor.clinic_id == Clinic.id)
+    )
+
+
+def refresh(connection, condition, deleted_ids=()):
+    """Re-derive the index rows of the appointments matching ``condition``
+    and drop those of the appointments in ``deleted_ids``."""
+    search, key = search_table(connection.dialect.name)
+    stale = search.c[key].in_(select(Appointment.id).where(condition))
+    if deleted_ids:
+        stale = or_(stale, search.c[key].in_(deleted_ids))
+    connection.execute(delete(search).where(stale))
+    connection.execute(insert(search).from_select([key, 'document'], document_select().where(condition)))
+
+
+def rebuild(connection=None):
+    """Rebuild the whole index from the source tables. The caller commits."""
+    connection = connection if connection is not None else db.session.connection()
+    search, key = search_table(connection.dialect.name)
+    connection.execute(delete(search))
+    connection.execute(insert(search).from_select([key, 'document'], document_select()))
+
+
+def is_empty(connection=None):
+    connection = connection if connection is not None else db.session.connection()
+    search, key = search_table(connection.dialect.name)
+    return not connection.execute(select(exists().select_from(search))).scalar()
+
+
+def search_words(term):
+    """Split a search box value into the words that must all match."""
+    # % and _ are LIKE wildcards; treat them as separators
+    words = term.replace('%', ' ').replace('_', ' ').split()
+    return words[:MAX_SEARCH_WORDS]
+
+
+def _fts_conditions(search, words):
+    # Each word of three or more characters becomes a quoted FTS5 phrase,
+    # which the trigram tokenizer answers as a case-insensitive substring
+    # match straight from the index. Shorter words fall back to LIKE.
+    phrases = ['"' + word.replace('"', '""') + '"' for word in words if len(word) >= 3]
+    conditions = [search.c.document.like(f'%{word}%') for word in words if len(word) < 3]
+    if phrases:
+        conditions.insert(0, search.c.document.match(' '.join(phrases)))
+    return conditions
+
+
+def matching(term, dialect_name=None):
+    """Filter for appointments whose document contains every word of ``term``."""
+    dialect_name = dialect_name or db.session.get_bind().dialect.name
+    search, key = search_table(dialect_name)
+    words = search_words(term)
+    if not words:
+        return true()
+    if dialect_name != 'sqlite':
+        conditions = [search.c.document.ilike(f'%{word}%') for word in words]
+        return Appointment.id.in_(select(search.c[key]).where(and_(*conditions)))
+
+    # SQLite has no statistics to choose a plan, so probe the index: a few
+    # matches are fetched by primary key, while for a common term the
+    # listing walks its own index and checks each row's document until the
+    # page is full, instead of collecting every match first.
+    matches = select(search.c[key]).where(and_(*_fts_conditions(search, words)))
+    ids = db.session.execute(matches.limit(SELECTIVE_MATCHES + 1)).scalars().all()
+    if len(ids) <= SELECTIVE_MATCHES:
+        return Appointment.id.in_(ids)
+    # Wrapping the document hides the LIKE from FTS5, which would otherwise
+    # rerun it as an index query for every row instead of a rowid lookup
+    document = search.c.document.concat('')
+    return exists().where(search.c[key] == Appointment.id, *[document.like(f'%{word}%') for word in words])
+
+
+def _changed(obj):
+    state = inspect(obj)
+    return any(state.attrs[attr].history.has_changes() for attr in _INDEXED_ATTRS[type(obj)])
+
+
+@event.listens_for(db.session, 'after_flush')
+def _track_search_index(session, flush_context):
+    appointment_ids, deleted_ids, user_ids, doctor_ids, clinic_ids = set(), set(), set(), set(), set()
+    for obj in (*session.new, *session.dirty, *session.deleted):
+        if type(obj) not in _INDEXED_ATTRS:
+            continue
+        if obj not in session.new and obj not in session.deleted and not _changed(obj):
+            continue
+        if isinstance(obj, Appointment):
+            (deleted_ids if obj in session.deleted else appointment_ids).add(obj.id)
+        elif isinstance(obj, User) and obj not in session.new:
+            user_ids.add(obj.id)
+        elif isinstance(obj, Doctor) and obj not in session.new:
+            doctor_ids.add(obj.id)
+        elif isinstance(obj, Clinic) and obj not in session.new:
+            clinic_ids.add(obj.id)
+
+    conditions = []
+    if appointment_ids:
+        conditions.append(Appointment.id.in_(appointment_ids))
+    if user_ids:
+        conditions.append(Appointment.patient_id.in_(user_ids))
+        conditions.append(Appointment.doctor_id.in_(select(Doctor.id).where(Doctor.user_id.in_(user_ids))))
+    if doctor_ids:
+        conditions.append(Appointment.doctor_id.in_(doctor_ids))
+    if clinic_ids:
+        conditions.append(Appointment.doctor_id.in_(select(Doctor.id).where(Doctor.clinic_id.in_(clinic_ids))))
+    if conditions or deleted_ids:
+        refresh(session.connection(), or_(*conditions) if conditions else false(), deleted_ids)
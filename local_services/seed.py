@@ -0,0 +1,106 @@
+"""Schema creation and demo data, run explicitly rather than on import.
+
+    flask --app local_app init-db     create missing tables and backfill
+                                      the derived tables (counters, search)
+    flask --app local_app seed        default admin, sample clinic, doctor
+                                      and a week of slots
+
+Both are idempotent. The migrations start from the tables init-db
+creates, so a new database is init-db followed by
+``flask --app local_main db stamp head``; after that (and for existing
+databases) use ``flask --app local_main db upgrade``.
+"""
+from datetime import datetime, time, timedelta
+
+from local_db import db
+from local_models import Appointment, Clinic, Doctor, ScheduleTemplate, StatCounter, User
+from local_services import search
+from local_services.schedules import generate_slots
+from local_services.stats import reconcile
+
+
+def create_schema():
+    """Create any missing tables, then fill derived tables that are empty."""
+    db.create_all()  # the search index is created along with the tables
+
+    # Dashboard counters start from a full count on databases that predate them
+    if not StatCounter.query.first():
+        reconcile()
+        db.session.commit()
+
+    # Likewise the appointment search index
+    if search.is_empty() and Appointment.query.first():
+        search.rebuild()
+        db.session.commit()
+
+
+def seed_demo_data():
+    """Add the default admin, a sample clinic and doctor, and their slots."""
+    # Admin setup
+    if not User.query.filter_by(email='admin@clinic.com').first():
+        admin_user = User(
+            email='admin@clinic.com',
+            name='System Administrator',
+            username='admin',
+            phone='555-0123',
+            role='admin'
+        )
+        admin_user.set_password('admin123')
+        db.session.add(admin_user)
+        db.session.commit()
+        print("✅ Default admin created: admin@clinic.com / admin123")
+
+    # Clinic setup
+    clinic = Clinic.query.filter_by(name='General Medical Center').first()
+    if not clinic:
+        clinic = Clinic(
+            name='General Medical Center',
+            address='123 Health Street, Medical City',
+            phone='555-0100',
+            email='info@generalmedical.com'
+        )
+        db.session.add(clinic)
+        db.session.commit()
+        print("🏥 Sample clinic created.")
+
+    # Doctor setup
+    doctor_user = User.query.filter_by(email='doctor@clinic.com').first()
+    if not doctor_user:
+        doctor_user = User(
+            email='doctor@clinic.com',
+            name='Dr. Sarah Johnson',
+            username='drsarah',
+            phone='555-0124',
+            role='doctor'
+        )
+        doctor_user.set_password('doctor123')
+        db.session.add(doctor_user)
+        db.session.commit()
+
+    doctor_profile = Doctor.query.filter_by(user_id=doctor_user.id).first()
+    if not doctor_profile:
+        doctor_profile = Doctor(
+            user_id=doctor_user.id,
+            clinic_id=clinic.id,
+            specialization='General Medicine',
+            license_number='MD123456',
+            years_experience=8
+        )
+        db.session.add(doctor_profile)
+        db.session.commit()
+        print("👩‍⚕️ Sample doctor created: doctor@clinic.com / doctor123")
+
+        # Weekly hours 9-17 with a 12-14 lunch break, then the next 7 days of slots
+        db.session.add(ScheduleTemplate(
+            doctor_id=doctor_profile.id,
+            weekdays='0,1,2,3,4,5,6',
+            start_time=time(9, 0),
+            end_time=time(17, 0),
+            slot_minutes=60,
+            breaks='12:00-14:00'
+        ))
+        db.session.flush()
+        today = datetime.now().date()
+        generate_slots(today, today + timedelta(days=6), doctor_ids=[doctor_profile.id])
+        db.session.commit()
+        print("🕒 Sample time slots created for Dr. Sarah Johnson")
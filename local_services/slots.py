@@ -0,0 +1,131 @@
+from datetime import datetime, time, timedelta
+from sqlalchemy import and_, func, select
+from sqlalchemy.orm import aliased
+from local_models import Appointment, Clinic, Doctor, TimeSlot, User
+from local_services.pagination import decode_cursor, keyset_paginate
+
+# Default admin window when no dates are given, and the widest one allowed
+DEFAULT_WINDOW_DAYS = 14
+MAX_WINDOW_DAYS = 92
+
+
+def clamp_window(date_from, date_to, today):
+    """Resolve optional from/to dates into a bounded [from, to] day window."""
+    date_from = date_from or today
+    date_to = date_to or date_from + timedelta(days=DEFAULT_WINDOW_DAYS - 1)
+    if date_to < date_from:
+        date_to = date_from
+    if (date_to - date_from).days >= MAX_WINDOW_DAYS:
+        date_to = date_from + timedelta(days=MAX_WINDOW_DAYS - 1)
+    return date_from, date_to
+
+
+def slot_window_query(date_from, date_to, clinic_id=None, doctor_id=None, availability=None):
+    """Projected rows for the admin time-slot manager.
+
+    Selects only the columns the page shows, flattened into one row per slot
+    (doctor, clinic and the scheduled patient, if any), so a page never
+    builds ORM objects or lazy loads. Pass the result to db.paginate with
+    scalars=False.
+    """
+    doctor_user = aliased(User)
+    patient = aliased(User)
+    query = (
+        select(
+            TimeSlot.id,
+            TimeSlot.starts_at,
+            TimeSlot.ends_at,
+            TimeSlot.is_available,
+            TimeSlot.created_at,
+            Doctor.id.label('doctor_id'),
+            doctor_user.name.label('doctor_name'),
+            Doctor.specialization,
+            Clinic.name.label('clinic_name'),
+            patient.name.label('patient_name'),
+            patient.email.label('patient_email'),
+        )
+        .join(Doctor, TimeSlot.doctor_id == Doctor.id)
+        .join(doctor_user, Doctor.user_id == doctor_user.id)
+        .join(Clinic, Doctor.clinic_id == Clinic.id)
+        .outerjoin(Appointment, and_(Appointment.time_slot_id == TimeSlot.id,
+                                     Appointment.status == 'scheduled'))
+        .outerjoin(patient, Appointment.patient_id == patient.id)
+        .where(
+            TimeSlot.starts_at >= datetime.combine(date_from, time.min),
+            TimeSlot.starts_at < datetime.combine(date_to + timedelta(days=1), time.min),
+        )
+    )
+    if doctor_id:
+        query = query.where(TimeSlot.doctor_id == doctor_id)
+    if clinic_id:
+        query = query.where(Doctor.clinic_id == clinic_id)
+    if availability == 'available':
+        query = query.where(TimeSlot.is_available == True)
+    elif availability == 'booked':
+        query = query.where(TimeSlot.is_available == False)
+    return query.order_by(TimeSlot.starts_at, TimeSlot.id)
+
+
+def earliest_open_slots(specialization, starts_from, date_to, clinic_ids=None, limit=20):
+    """The ``limit`` earliest open slots across every doctor of a specialization.
+
+    One projected query for all matching doctors (optionally only those in
+    ``clinic_ids``), read in start order from the open-slot index so the
+    database stops after ``limit`` rows. ``starts_from`` is a datetime,
+    ``date_to`` the last day included. Specialization matches ignore case.
+    """
+    doctor_user = aliased(User)
+    query = (
+        select(
+            TimeSlot.id,
+            TimeSlot.starts_at,
+            TimeSlot.ends_at,
+            Doctor.id.label('doctor_id'),
+            doctor_user.name.label('doctor_name'),
+            Doctor.specialization,
+            Clinic.id.label('clinic_id'),
+            Clinic.name.label('clinic_name'),
+        )
+        .join(Doctor, TimeSlot.doctor_id == Doctor.id)
+        .join(doctor_user, Doctor.user_id == doctor_user.id)
+        .join(Clinic, Doctor.clinic_id == Clinic.id)
+        .where(
+            TimeSlot.is_available == True,
+            TimeSlot.starts_at >= starts_from,
+            TimeSlot.starts_at < datetime.combine(date_to + timedelta(days=1), time.min),
+            func.lower(Doctor.specialization) == specialization.strip().lower(),
+        )
+    )
+    if clinic_ids:
+        query = query.where(Doctor.clinic_id.in_(clinic_ids))
+    return query.order_by(TimeSlot.starts_at, TimeSlot.id).limit(limit)
+
+
+def doctor_choices(clinic_id=None):
+    """(id, name, specialization, clinic_id) rows for filter dropdowns."""
+    query = (
+        select(Doctor.id, User.name, Doctor.specialization, Doctor.clinic_id)
+        .join(User, Doctor.user_id == User.id)
+        .order_by(User.name)
+    )
+    if clinic_id:
+        query = query.where(Doctor.clinic_id == clinic_id)
+    return query
+
+
+def clinic_choices():
+    """(id, name) rows for filter dropdowns."""
+    return select(Clinic.id, Clinic.name).order_by(Clinic.name)
+
+
+def paginate_slots(query, after=None, before=None, per_page=10):
+    """Chronological keyset page of a TimeSlot query, keyed on (starts_at, id)."""
+    key_types = (datetime, int)
+    return keyset_paginate(
+        query,
+        (TimeSlot.starts_at, TimeSlot.id),
+        key=lambda slot: (slot.starts_at, slot.id),
+        after=decode_cursor(after, key_types),
+        before=decode_cursor(before, key_types),
+        per_page=per_page,
+    )
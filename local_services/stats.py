@@ -0,0 +1,151 @@
+"""Dashboard counters maintained in the same transaction as the data.
+
+Counters live in the ``stat_counter`` table, one row per name:
+
+    users.<role>            users per role (patient, doctor, admin)
+    clinics                 clinics
+    appointments.<status>   appointments per status
+    doctors.<id>.<status>   appointments per status for one doctor
+
+ORM inserts, deletes and role/status changes are picked up by a flush
+hook. Code that changes rows with Core UPDATEs (local_services.booking)
+calls bump() itself. reconcile() recounts everything from scratch and
+reports any drift.
+"""
+from collections import Counter
+
+from sqlalchemy import event, func, insert, inspect
+from local_db import db
+from local_models import Appointment, Clinic, StatCounter, User
+from local_services.database import increment
+
+APPOINTMENT_STATUSES = ('scheduled', 'completed', 'cancelled')
+
+
+def _committed_value(obj, attr):
+    history = inspect(obj).attrs[attr].history
+    if history.deleted:
+        return history.deleted[0]
+    return getattr(obj, attr)
+
+
+def appointment_counter_names(doctor_id, status):
+    """Counters that an appointment with this doctor and status counts towards."""
+    return (f'appointments.{status}', f'doctors.{doctor_id}.{status}')
+
+
+def _counter_names(obj, value=None):
+    if isinstance(obj, User):
+        return (f"users.{value or obj.role or 'patient'}",)
+    if isinstance(obj, Clinic):
+        return ('clinics',)
+    if isinstance(obj, Appointment):
+        return appointment_counter_names(obj.doctor_id, value or obj.status or 'scheduled')
+    return ()
+
+
+def _tracked_attr(obj):
+    if isinstance(obj, User):
+        return 'role'
+    if isinstance(obj, Appointment):
+        return 'status'
+    return None
+
+
+def _flush_deltas(session):
+    deltas = Counter()
+    for obj in session.new:
+        for name in _counter_names(obj):
+            deltas[name] += 1
+    for obj in session.deleted:
+        attr = _tracked_attr(obj)
+        for name in _counter_names(obj, _committed_value(obj, attr) if attr else None):
+            deltas[name] -= 1
+    for obj in session.dirty:
+        attr = _tracked_attr(obj)
+        if attr is None:
+            continue
+        history = inspect(obj).attrs[attr].history
+        # Without the old value (attribute never loaded) we cannot tell what
+        # to decrement; reconcile() will pick it up.
+        if history.deleted and history.added and history.deleted[0] != history.added[0]:
+            for name in _counter_names(obj, history.deleted[0]):
+                deltas[name] -= 1
+            for name in _counter_names(obj, history.added[0]):
+                deltas[name] += 1
+    return deltas
+
+
+def bump(deltas, connection=None):
+    """Apply ``{counter name: delta}`` inside the current transaction."""
+    connection = connection if connection is not None else db.session.connection()
+    deltas = {name: delta for name, delta in deltas.items() if delta}
+    if deltas:
+        # Rows such as doctors.<id>.<status> appear with their first event
+        increment(connection, StatCounter.__table__, 'value', deltas)
+
+
+@event.listens_for(db.session, 'after_flush')
+def _track_counters(session, flush_context):
+    deltas = _flush_deltas(session)
+    if deltas:
+        bump(deltas, session.connection())
+
+
+def dashboard_counts():
+    """The global counters in one small SELECT, with the totals the dashboard shows."""
+    counters = dict(db.session.query(StatCounter.name, StatCounter.value).filter(
+        ~StatCounter.name.startswith('doctors.')
+    ).all())
+    return {
+        'total_patients': counters.get('users.patient', 0),
+        'total_doctors': counters.get('users.doctor', 0),
+        'total_clinics': counters.get('clinics', 0),
+        'total_appointments': sum(counters.get(f'appointments.{status}', 0)
+                                  for status in APPOINTMENT_STATUSES),
+    }
+
+
+def doctor_counts(doctor_id):
+    """``{status: count}`` of one doctor's appointments, by primary key lookups."""
+    names = {f'doctors.{doctor_id}.{status}': status for status in APPOINTMENT_STATUSES}
+    counters = dict(db.session.query(StatCounter.name, StatCounter.value).filter(
+        StatCounter.name.in_(names)
+    ).all())
+    return {status: counters.get(name, 0) for name, status in names.items()}
+
+
+def actual_counts():
+    """Count every tracked total from the source tables."""
+    counts = Counter()
+    for role, total in db.session.query(User.role, func.count()).group_by(User.role):
+        counts[f'users.{role}'] = total
+    counts['clinics'] = db.session.query(func.count(Clinic.id)).scalar()
+    for doctor_id, status, total in db.session.query(
+        Appointment.doctor_id, Appointment.status, func.count()
+    ).group_by(Appointment.doctor_id, Appointment.status):
+        for name in appointment_counter_names(doctor_id, status):
+            counts[name] += total
+    return counts
+
+
+def reconcile():
+    """Rebuild the counters from scratch.
+
+    Returns ``{name: (stored, actual)}`` for every counter that had drifted.
+    The caller commits.
+    """
+    actual = actual_counts()
+    stored = dict(db.session.query(StatCounter.name, StatCounter.value).all())
+    drift = {
+        name: (stored.get(name, 0), actual.get(name, 0))
+        for name in set(stored) | set(actual)
+        if stored.get(name, 0) != actual.get(name, 0)
+    }
+    table = StatCounter.__table__
+    connection = db.session.connection()
+    connection.execute(table.delete())
+    rows = [{'name': name, 'value': value} for name, value in actual.items()]
+    if rows:
+        connection.execute(insert(table), rows)
+    return drift
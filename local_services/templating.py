@@ -0,0 +1,122 @@
+"""Compiled-template and rendered-fragment caches.
+
+    TEMPLATE_BYTECODE_CACHE  keep compiled templates on disk (on)
+    TEMPLATE_BYTECODE_DIR    where (instance/jinja-bytecode)
+    FRAGMENT_CACHE_ENABLED   serve {% cache %} blocks from memory (on,
+                             except in development, where templates
+                             change under a running server)
+    FRAGMENT_CACHE_SIZE      rendered fragments kept per worker (512)
+    FRAGMENT_CACHE_TTL       seconds one is kept at most (300)
+
+Jinja compiles a template to Python the first time it is used. With the
+bytecode cache a worker (or the gunicorn master, which compiles them all
+once before forking, see preload) loads the compiled code written by an
+earlier start instead; a template whose source changed is compiled again.
+
+``{% cache %}`` renders its block once and reuses the HTML:
+
+    {% cache 'navbar' %} ... {% endcache %}
+    {% cache 'doctor-list', clinic.id, versions=['directory'] %} ... {% endcache %}
+
+The key is the fragment name, the signed-in role (None when signed
+out), any further values given (hashable: ids, names) and the current
+data versions named in ``versions`` (local_services.versions), so a
+committed change to the data shown re-renders it on every worker. Only
+cache what follows from those: nothing per user that is not in the key,
+and never flashed messages.
+
+Each app keeps its own FragmentCache (app.extensions['fragment_cache']),
+so two apps in one process, with different assets or settings, never
+serve each other's fragments. /admin/cache-stats reports hits and misses
+per fragment.
+"""
+import os
+
+from flask import current_app, has_request_context, session
+from jinja2 import FileSystemBytecodeCache, nodes
+from jinja2.ext import Extension
+from local_services.cache import VersionedCache
+from local_services.versions import current_versions
+
+
+class FragmentCache(VersionedCache):
+    """Rendered fragments, counted per fragment name."""
+
+    def __init__(self, maxsize=512, ttl=300):
+        super().__init__('fragment', None, maxsize=maxsize, ttl=ttl)
+        self._by_name = {}  # name -> [hits, misses]
+
+    def render(self, name, key, render):
+        rendered = []
+
+        def load():
+            rendered.append(True)
+            return render()
+
+        html = self.get_or_load(key, load)
+        with self._lock:
+            self._by_name.setdefault(name, [0, 0])[1 if rendered else 0] += 1
+        return html
+
+    def clear(self):
+        super().clear()
+        with self._lock:
+            self._by_name.clear()
+
+    def stats(self):
+        stats = super().stats()
+        with self._lock:
+            stats['fragments'] = {
+                name: {'hits': hits, 'misses': misses, 'hit_rate': round(hits / (hits + misses), 4)}
+                for name, (hits, misses) in sorted(self._by_name.items())
+            }
+        return stats
+
+
+def _role():
+    if not has_request_context() or not session.get('user_id'):
+        return None
+    return session.get('user_role')
+
+
+class FragmentCacheExtension(Extension):
+    """``{% cache name[, value...][, versions=[...]] %}...{% endcache %}``"""
+
+    tags = {'cache'}
+
+    def parse(self, parser):
+        lineno = next(parser.stream).lineno
+        name = parser.parse_expression()
+        values = []
+        versions = nodes.List([])
+        while parser.stream.skip_if('comma'):
+            if parser.stream.current.test('name:versions') and parser.stream.look().test('assign'):
+                parser.stream.skip(2)
+                versions = parser.parse_expression()
+            else:
+                values.append(parser.parse_expression())
+        body = parser.parse_statements(('name:endcache',), drop_needle=True)
+        call = self.call_method('_render', [name, nodes.List(values), versions])
+        return nodes.CallBlock(call, [], [], body).set_lineno(lineno)
+
+    def _render(self, name, values, versions, caller):
+        if not current_app.config.get('FRAGMENT_CACHE_ENABLED', True):
+            return caller()
+        key = (name, _role(), *values, *current_versions(*versions))
+        return current_app.extensions['fragment_cache'].render(name, key, caller)
+
+
+def preload(app):
+    """Compile every template now, e.g. in the gunicorn master before it forks."""
+    for name in app.jinja_env.list_templates(extensions=('html',)):
+        app.jinja_env.get_template(name)
+
+
+def init_app(app):
+    """Give the app's Jinja environment the bytecode cache and {% cache %}."""
+    app.extensions['fragment_cache'] = FragmentCache()
+    if app.config['TEMPLATE_BYTECODE_CACHE']:
+        directory = app.config['TEMPLATE_BYTECODE_DIR'] or os.path.join(app.instance_path, 'jinja-bytecode')
+        os.makedirs(directory, exist_ok=True)
+        app.jinja_env.bytecode_cache = FileSystemBytecodeCache(directory)
+    app.jinja_env.add_extension(FragmentCacheExtension)
@@ -0,0 +1,92 @@
+"""Data version stamps shared by all workers.
+
+Each kind of cached data has a row in ``data_version``. Writes bump it in
+the same transaction as the change, so once they commit every worker
+sees the new version on its next read and stops using what it cached
+under the old one:
+
+    directory   clinics and doctors as patients browse them (names,
+                addresses, specializations, contact details)
+    dashboard   what the doctor and admin dashboards show: appointments,
+                their slots' times, and the account and clinic totals
+    slots:<id>  one doctor's slots as the time picker lists them (see
+                slot_version_name)
+
+ORM changes are picked up by a flush hook. Code that writes with Core
+statements calls bump_version() itself.
+"""
+from flask import g, has_app_context
+from sqlalchemy import event
+from local_db import db
+from local_models import Appointment, Clinic, DataVersion, Doctor, TimeSlot, User
+from local_services.database import increment
+
+
+def bump_version(*names, connection=None):
+    """Advance the given versions inside the current transaction."""
+    connection = connection if connection is not None else db.session.connection()
+    if names:
+        increment(connection, DataVersion.__table__, 'version', dict.fromkeys(names, 1))
+
+
+def current_version(name):
+    """The committed version of ``name``, read once per request (or app context)."""
+    versions = g.setdefault('data_versions', {})
+    if name not in versions:
+        versions[name] = db.session.query(DataVersion.version).filter(
+            DataVersion.name == name
+        ).scalar() or 0
+    return versions[name]
+
+
+def current_versions(*names):
+    """``current_version`` for several names, read in one query."""
+    versions = g.setdefault('data_versions', {})
+    missing = [name for name in names if name not in versions]
+    if missing:
+        stored = dict(db.session.query(DataVersion.name, DataVersion.version).filter(
+            DataVersion.name.in_(missing)
+        ).all())
+        versions.update({name: stored.get(name, 0) for name in missing})
+    return tuple(versions[name] for name in names)
+
+
+def slot_version_name(doctor_id):
+    return f'slots:{doctor_id}'
+
+
+def _touches_directory(obj):
+    if isinstance(obj, (Clinic, Doctor)):
+        return True
+    # Doctor names and phone numbers come from their user row
+    return isinstance(obj, User) and obj.role == 'doctor'
+
+
+def _touches_dashboard(obj, new=False):
+    # New slots are not on a dashboard until booked; edited ones may be
+    if isinstance(obj, TimeSlot):
+        return not new
+    # Patient and doctor names, clinic names and the per-role totals
+    return isinstance(obj, (Appointment, User, Clinic))
+
+
+@event.listens_for(db.session, 'after_flush')
+def _track_versions(session, flush_context):
+    changed = (*session.new, *session.dirty, *session.deleted)
+    names = []
+    if any(_touches_directory(obj) for obj in changed):
+        names.append('directory')
+    if (any(_touches_dashboard(obj, new=True) for obj in session.new)
+            or any(_touches_dashboard(obj) for obj in (*session.dirty, *session.deleted))):
+        names.append('dashboard')
+    names += sorted({slot_version_name(obj.doctor_id) for obj in changed
+                     if isinstance(obj, TimeSlot) and obj.doctor_id is not None})
+    if names:
+        bump_version(*names, connection=session.connection())
+
+
+@event.listens_for(db.session, 'after_commit')
+def _forget_versions(session):
+    # This request's own writes must not be served from the version it read earlier
+    if has_app_context():
+        g.pop('data_versions', None)
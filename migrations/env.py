@@ -90,13 +90,28 @@ def run_migrations_online():
                 directives[:] = []
                 logger.info('No changes in schema detected.')
 
+    # The appointment search index (and its FTS5 shadow tables on SQLite)
+    # is managed by hand, see local_services/search.py
+    def include_name(name, type_, parent_names):
+        if type_ == 'table':
+            return not name.startswith('appointment_search')
+        return True
+
     conf_args = current_app.extensions['migrate'].configure_args
     if conf_args.get("process_revision_directives") is None:
         conf_args["process_revision_directives"] = process_revision_directives
+    if conf_args.get("include_name") is None:
+        conf_args["include_name"] = include_name
 
     connectable = get_engine()
 
     with connectable.connect() as connection:
+        if connection.dialect.name == 'sqlite':
+            # Batch operations rebuild tables by copy, drop and rename; with
+            # foreign keys enforced (SQLITE_FOREIGN_KEYS) dropping a table
+            # other rows point at would fail. Set outside any transaction.
+            connection.exec_driver_sql('PRAGMA foreign_keys = OFF')
+            connection.commit()
         context.configure(
             connection=connection,
             target_metadata=get_metadata(),
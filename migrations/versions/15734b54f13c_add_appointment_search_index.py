@@ -0,0 +1,70 @@
+"""add appointment_search full-text index
+
+Revision ID: 15734b54f13c
+Revises: 76606bd1399a
+Create Date: 2026-10-17 17:05:37.882140
+
+"""
+import logging
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '15734b54f13c'
+down_revision = '76606bd1399a'
+branch_labels = None
+depends_on = None
+
+# Same document as local_services.search.document_select()
+DOCUMENT_SELECT = """
+    SELECT appointment.id,
+           coalesce(patient.name, '') || ' ' || coalesce(patient.email, '') || ' ' ||
+           coalesce(patient.phone, '') || ' ' || coalesce(doctor_user.name, '') || ' ' ||
+           coalesce(clinic.name, '')
+    FROM appointment
+    JOIN "user" AS patient ON appointment.patient_id = patient.id
+    JOIN doctor ON appointment.doctor_id = doctor.id
+    JOIN "user" AS doctor_user ON doctor.user_id = doctor_user.id
+    JOIN clinic ON doctor.clinic_id = clinic.id
+"""
+
+
+def _create_trigram_extension(conn):
+    # As local_services.search: without pg_trgm (or the right to create it)
+    # the table is searched unindexed, and the rest of the upgrade goes on
+    try:
+        with conn.begin_nested():
+            conn.exec_driver_sql('CREATE EXTENSION IF NOT EXISTS pg_trgm')
+    except sa.exc.DBAPIError as exc:
+        logging.getLogger('alembic.runtime.migration').warning(
+            'pg_trgm is not available (%s); appointment_search is created without its trigram '
+            'index. Install it, then run `flask rebuild-search-index`.', exc.orig)
+        return False
+    return True
+
+
+def upgrade():
+    conn = op.get_bind()
+    # `flask init-db` runs db.create_all(), which creates (and may have
+    # filled) the index already; start from scratch either way.
+    if conn.dialect.name == 'sqlite':
+        op.execute("CREATE VIRTUAL TABLE IF NOT EXISTS appointment_search USING fts5(document, tokenize='trigram')")
+        op.execute('DELETE FROM appointment_search')
+        op.execute('INSERT INTO appointment_search (rowid, document)' + DOCUMENT_SELECT)
+    elif conn.dialect.name == 'postgresql':
+        trigrams = _create_trigram_extension(conn)
+        op.execute('CREATE TABLE IF NOT EXISTS appointment_search ('
+                   'appointment_id INTEGER PRIMARY KEY REFERENCES appointment (id) ON DELETE CASCADE, '
+                   'document TEXT NOT NULL)')
+        op.execute('DELETE FROM appointment_search')
+        op.execute('INSERT INTO appointment_search (appointment_id, document)' + DOCUMENT_SELECT)
+        # Built after the backfill: one pass instead of per-row GIN updates
+        if trigrams:
+            op.execute('CREATE INDEX IF NOT EXISTS ix_appointment_search_document_trgm '
+                       'ON appointment_search USING gin (document gin_trgm_ops)')
+
+
+def downgrade():
+    op.execute('DROP TABLE IF EXISTS appointment_search')
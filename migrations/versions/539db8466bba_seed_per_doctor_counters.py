@@ -0,0 +1,36 @@
+"""seed per-doctor appointment counters
+
+Revision ID: 539db8466bba
+Revises: 6532d305320a
+Create Date: 2026-10-17 12:41:37.092215
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '539db8466bba'
+down_revision = '6532d305320a'
+branch_labels = None
+depends_on = None
+
+stat_counter = sa.table(
+    'stat_counter',
+    sa.column('name', sa.String),
+    sa.column('value', sa.Integer),
+)
+
+
+def upgrade():
+    conn = op.get_bind()
+    # Replace rather than add, in case the app already created some of them
+    conn.execute(stat_counter.delete().where(stat_counter.c.name.like('doctors.%')))
+    rows = [{'name': f'doctors.{doctor_id}.{status}', 'value': total} for doctor_id, status, total in
+            conn.execute(sa.text('SELECT doctor_id, status, COUNT(*) FROM appointment GROUP BY doctor_id, status'))]
+    if rows:
+        op.bulk_insert(stat_counter, rows)
+
+
+def downgrade():
+    op.get_bind().execute(stat_counter.delete().where(stat_counter.c.name.like('doctors.%')))
@@ -0,0 +1,48 @@
+"""extend listing indexes with id for keyset pagination
+
+Revision ID: 5574d61cf40c
+Revises: abd8929f4351
+Create Date: 2026-10-17 14:48:13.529046
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '5574d61cf40c'
+down_revision = 'abd8929f4351'
+branch_labels = None
+depends_on = None
+
+# name -> (table, columns before, columns after)
+INDEXES = {
+    'ix_time_slot_doctor_starts_at': ('time_slot', ['doctor_id', 'starts_at'], ['doctor_id', 'starts_at', 'id']),
+    'ix_appointment_patient_created': ('appointment', ['patient_id', 'created_at'], ['patient_id', 'created_at', 'id']),
+    'ix_appointment_created': ('appointment', ['created_at'], ['created_at', 'id']),
+    'ix_appointment_doctor_created': ('appointment', None, ['doctor_id', 'created_at', 'id']),
+}
+
+
+def _existing_columns(table, name):
+    for index in sa.inspect(op.get_bind()).get_indexes(table):
+        if index['name'] == name:
+            return index['column_names']
+    return None
+
+
+def upgrade():
+    for name, (table, _, columns) in INDEXES.items():
+        existing = _existing_columns(table, name)
+        if existing == columns:  # created by db.create_all() already
+            continue
+        if existing is not None:
+            op.drop_index(name, table_name=table)
+        op.create_index(name, table, columns, unique=False)
+
+
+def downgrade():
+    for name, (table, columns, _) in INDEXES.items():
+        op.drop_index(name, table_name=table, if_exists=True)
+        if columns:
+            op.create_index(name, table, columns, unique=False)
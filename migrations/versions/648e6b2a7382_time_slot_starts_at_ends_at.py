@@ -0,0 +1,142 @@
+"""time slot starts_at/ends_at timestamps
+
+Replaces time_slot.date + start_time/end_time (strings) with real
+starts_at/ends_at timestamps, backfilled in chunks so large slot tables are
+never loaded into memory at once.
+
+Databases created from scratch by db.create_all() already have the new
+schema; stamp those with ``flask db stamp head`` instead of upgrading.
+
+Revision ID: 648e6b2a7382
+Revises: 8a4319f5a970
+Create Date: 2026-10-17 10:03:21.874410
+
+"""
+from datetime import datetime, time, timedelta
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '648e6b2a7382'
+down_revision = '8a4319f5a970'
+branch_labels = None
+depends_on = None
+
+BACKFILL_CHUNK = 1000
+
+time_slot = sa.table(
+    'time_slot',
+    sa.column('id', sa.Integer),
+    sa.column('date', sa.Date),
+    sa.column('start_time', sa.String),
+    sa.column('end_time', sa.String),
+    sa.column('starts_at', sa.DateTime),
+    sa.column('ends_at', sa.DateTime),
+)
+
+
+def _parse_time(value):
+    # Seeded rows hold "09:00"; rows written by doctor.schedule hold str(time), "09:00:00"
+    value = value.strip()
+    try:
+        return time.fromisoformat(value)
+    except ValueError:
+        return datetime.strptime(value, '%I:%M %p').time()
+
+
+def _chunks(conn, columns):
+    last_id = 0
+    while True:
+        rows = conn.execute(
+            sa.select(time_slot.c.id, *columns)
+            .where(time_slot.c.id > last_id)
+            .order_by(time_slot.c.id)
+            .limit(BACKFILL_CHUNK)
+        ).all()
+        if not rows:
+            return
+        yield rows
+        last_id = rows[-1].id
+
+
+def upgrade():
+    with op.batch_alter_table('time_slot', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('starts_at', sa.DateTime(), nullable=True))
+        batch_op.add_column(sa.Column('ends_at', sa.DateTime(), nullable=True))
+
+    conn = op.get_bind()
+    backfill = (
+        sa.update(time_slot)
+        .where(time_slot.c.id == sa.bindparam('slot_id'))
+        .values(starts_at=sa.bindparam('new_starts_at'), ends_at=sa.bindparam('new_ends_at'))
+    )
+    for rows in _chunks(conn, (time_slot.c.date, time_slot.c.start_time, time_slot.c.end_time)):
+        params = []
+        for row in rows:
+            starts_at = datetime.combine(row.date, _parse_time(row.start_time))
+            ends_at = datetime.combine(row.date, _parse_time(row.end_time))
+            if ends_at <= starts_at:  # slot runs past midnight
+                ends_at += timedelta(days=1)
+            params.append({'slot_id': row.id, 'new_starts_at': starts_at, 'new_ends_at': ends_at})
+        conn.execute(backfill, params)
+
+    op.drop_index('ix_time_slot_open_doctor_date_start', table_name='time_slot', if_exists=True)
+    op.drop_index('ix_time_slot_doctor_date_start', table_name='time_slot', if_exists=True)
+
+    with op.batch_alter_table('time_slot', schema=None) as batch_op:
+        batch_op.alter_column('starts_at', existing_type=sa.DateTime(), nullable=False)
+        batch_op.alter_column('ends_at', existing_type=sa.DateTime(), nullable=False)
+        batch_op.drop_column('end_time')
+        batch_op.drop_column('start_time')
+        batch_op.drop_column('date')
+
+    with op.batch_alter_table('time_slot', schema=None) as batch_op:
+        batch_op.create_index('ix_time_slot_doctor_starts_at', ['doctor_id', 'starts_at'], unique=False)
+        batch_op.create_index('ix_time_slot_open_doctor_starts_at', ['doctor_id', 'starts_at'], unique=False,
+                              sqlite_where=sa.text('is_available = 1'),
+                              postgresql_where=sa.text('is_available = true'))
+        batch_op.create_index('ix_time_slot_open_starts_at', ['starts_at'], unique=False,
+                              sqlite_where=sa.text('is_available = 1'),
+                              postgresql_where=sa.text('is_available = true'))
+
+
+def downgrade():
+    with op.batch_alter_table('time_slot', schema=None) as batch_op:
+        batch_op.drop_index('ix_time_slot_open_starts_at')
+        batch_op.drop_index('ix_time_slot_open_doctor_starts_at')
+        batch_op.drop_index('ix_time_slot_doctor_starts_at')
+        batch_op.add_column(sa.Column('date', sa.Date(), nullable=True))
+        batch_op.add_column(sa.Column('start_time', sa.String(length=10), nullable=True))
+        batch_op.add_column(sa.Column('end_time', sa.String(length=10), nullable=True))
+
+    conn = op.get_bind()
+    backfill = (
+        sa.update(time_slot)
+        .where(time_slot.c.id == sa.bindparam('slot_id'))
+        .values(date=sa.bindparam('old_date'),
+                start_time=sa.bindparam('old_start_time'),
+                end_time=sa.bindparam('old_end_time'))
+    )
+    for rows in _chunks(conn, (time_slot.c.starts_at, time_slot.c.ends_at)):
+        conn.execute(backfill, [
+            {'slot_id': row.id,
+             'old_date': row.starts_at.date(),
+             'old_start_time': row.starts_at.strftime('%H:%M'),
+             'old_end_time': row.ends_at.strftime('%H:%M')}
+            for row in rows
+        ])
+
+    with op.batch_alter_table('time_slot', schema=None) as batch_op:
+        batch_op.alter_column('date', existing_type=sa.Date(), nullable=False)
+        batch_op.alter_column('start_time', existing_type=sa.String(length=10), nullable=False)
+        batch_op.alter_column('end_time', existing_type=sa.String(length=10), nullable=False)
+        batch_op.drop_column('ends_at')
+        batch_op.drop_column('starts_at')
+
+    with op.batch_alter_table('time_slot', schema=None) as batch_op:
+        batch_op.create_index('ix_time_slot_doctor_date_start', ['doctor_id', 'date', 'start_time'], unique=False)
+        batch_op.create_index('ix_time_slot_open_doctor_date_start', ['doctor_id', 'date', 'start_time'], unique=False,
+                              sqlite_where=sa.text('is_available = 1'),
+                              postgresql_where=sa.text('is_available = true'))
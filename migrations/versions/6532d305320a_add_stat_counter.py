@@ -0,0 +1,43 @@
+"""add stat_counter for dashboard totals
+
+Revision ID: 6532d305320a
+Revises: 648e6b2a7382
+Create Date: 2026-10-17 11:26:05.310927
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '6532d305320a'
+down_revision = '648e6b2a7382'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    conn = op.get_bind()
+    # `flask init-db` runs db.create_all(), which may have created (and
+    # seeded) the table already.
+    if sa.inspect(conn).has_table('stat_counter'):
+        return
+
+    stat_counter = op.create_table(
+        'stat_counter',
+        sa.Column('name', sa.String(length=50), nullable=False),
+        sa.Column('value', sa.Integer(), nullable=False),
+        sa.PrimaryKeyConstraint('name')
+    )
+
+    # Seed the counters from the current totals (same as `flask reconcile-stats`)
+    rows = [{'name': f'users.{role}', 'value': total} for role, total in
+            conn.execute(sa.text('SELECT role, COUNT(*) FROM "user" GROUP BY role'))]
+    rows.append({'name': 'clinics', 'value': conn.execute(sa.text('SELECT COUNT(*) FROM clinic')).scalar()})
+    rows += [{'name': f'appointments.{status}', 'value': total} for status, total in
+             conn.execute(sa.text('SELECT status, COUNT(*) FROM appointment GROUP BY status'))]
+    op.bulk_insert(stat_counter, rows)
+
+
+def downgrade():
+    op.drop_table('stat_counter')
@@ -0,0 +1,32 @@
+"""add data_version for cache invalidation across workers
+
+Revision ID: 76606bd1399a
+Revises: b94ca71dc7f7
+Create Date: 2026-10-17 16:22:41.518302
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '76606bd1399a'
+down_revision = 'b94ca71dc7f7'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # `flask init-db` runs db.create_all(), which may have created it already.
+    if sa.inspect(op.get_bind()).has_table('data_version'):
+        return
+    op.create_table(
+        'data_version',
+        sa.Column('name', sa.String(length=50), nullable=False),
+        sa.Column('version', sa.Integer(), nullable=False),
+        sa.PrimaryKeyConstraint('name')
+    )
+
+
+def downgrade():
+    op.drop_table('data_version')
@@ -0,0 +1,50 @@
+"""add booking hot path indexes
+
+Revision ID: 8a4319f5a970
+Revises: 
+Create Date: 2026-10-17 09:12:44.512093
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '8a4319f5a970'
+down_revision = None
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # Databases bootstrapped with db.create_all() already have these, so
+    # every create is guarded with if_not_exists.
+    with op.batch_alter_table('time_slot', schema=None) as batch_op:
+        batch_op.create_index('ix_time_slot_doctor_date_start',
+                              ['doctor_id', 'date', 'start_time'], unique=False, if_not_exists=True)
+        batch_op.create_index('ix_time_slot_open_doctor_date_start',
+                              ['doctor_id', 'date', 'start_time'], unique=False, if_not_exists=True,
+                              sqlite_where=sa.text('is_available = 1'),
+                              postgresql_where=sa.text('is_available = true'))
+
+    with op.batch_alter_table('appointment', schema=None) as batch_op:
+        batch_op.create_index('ix_appointment_doctor_status',
+                              ['doctor_id', 'status'], unique=False, if_not_exists=True)
+        batch_op.create_index('ix_appointment_time_slot',
+                              ['time_slot_id'], unique=False, if_not_exists=True)
+        batch_op.create_index('ix_appointment_patient_created',
+                              ['patient_id', 'created_at'], unique=False, if_not_exists=True)
+        batch_op.create_index('ix_appointment_created',
+                              ['created_at'], unique=False, if_not_exists=True)
+
+
+def downgrade():
+    with op.batch_alter_table('appointment', schema=None) as batch_op:
+        batch_op.drop_index('ix_appointment_created', if_exists=True)
+        batch_op.drop_index('ix_appointment_patient_created', if_exists=True)
+        batch_op.drop_index('ix_appointment_time_slot', if_exists=True)
+        batch_op.drop_index('ix_appointment_doctor_status', if_exists=True)
+
+    with op.batch_alter_table('time_slot', schema=None) as batch_op:
+        batch_op.drop_index('ix_time_slot_open_doctor_date_start', if_exists=True)
+        batch_op.drop_index('ix_time_slot_doctor_date_start', if_exists=True)
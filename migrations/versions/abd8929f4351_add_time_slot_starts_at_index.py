@@ -0,0 +1,26 @@
+"""add time_slot.starts_at index for the admin slot window
+
+Revision ID: abd8929f4351
+Revises: 539db8466bba
+Create Date: 2026-10-17 13:30:52.660118
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'abd8929f4351'
+down_revision = '539db8466bba'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    with op.batch_alter_table('time_slot', schema=None) as batch_op:
+        batch_op.create_index('ix_time_slot_starts_at', ['starts_at'], unique=False, if_not_exists=True)
+
+
+def downgrade():
+    with op.batch_alter_table('time_slot', schema=None) as batch_op:
+        batch_op.drop_index('ix_time_slot_starts_at', if_exists=True)
@@ -0,0 +1,57 @@
+"""add schedule_template and schedule_exception for bulk slot generation
+
+Revision ID: b94ca71dc7f7
+Revises: 5574d61cf40c
+Create Date: 2026-10-17 15:40:12.204417
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'b94ca71dc7f7'
+down_revision = '5574d61cf40c'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    inspector = sa.inspect(op.get_bind())
+    # `flask init-db` runs db.create_all(), which may have created these already.
+    if not inspector.has_table('schedule_template'):
+        op.create_table(
+            'schedule_template',
+            sa.Column('id', sa.Integer(), nullable=False),
+            sa.Column('doctor_id', sa.Integer(), nullable=False),
+            sa.Column('weekdays', sa.String(length=20), nullable=False),
+            sa.Column('start_time', sa.Time(), nullable=False),
+            sa.Column('end_time', sa.Time(), nullable=False),
+            sa.Column('slot_minutes', sa.Integer(), nullable=False),
+            sa.Column('breaks', sa.String(length=200), nullable=False),
+            sa.Column('created_at', sa.DateTime(), nullable=True),
+            sa.ForeignKeyConstraint(['doctor_id'], ['doctor.id']),
+            sa.PrimaryKeyConstraint('id')
+        )
+        with op.batch_alter_table('schedule_template', schema=None) as batch_op:
+            batch_op.create_index(batch_op.f('ix_schedule_template_doctor_id'), ['doctor_id'], unique=False)
+
+    if not inspector.has_table('schedule_exception'):
+        op.create_table(
+            'schedule_exception',
+            sa.Column('id', sa.Integer(), nullable=False),
+            sa.Column('doctor_id', sa.Integer(), nullable=False),
+            sa.Column('date', sa.Date(), nullable=False),
+            sa.Column('reason', sa.String(length=200), nullable=True),
+            sa.Column('created_at', sa.DateTime(), nullable=True),
+            sa.ForeignKeyConstraint(['doctor_id'], ['doctor.id']),
+            sa.PrimaryKeyConstraint('id'),
+            sa.UniqueConstraint('doctor_id', 'date', name='uq_schedule_exception_doctor_date')
+        )
+
+
+def downgrade():
+    op.drop_table('schedule_exception')
+    with op.batch_alter_table('schedule_template', schema=None) as batch_op:
+        batch_op.drop_index(batch_op.f('ix_schedule_template_doctor_id'))
+    op.drop_table('schedule_template')
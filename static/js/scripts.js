@@ -13,6 +13,9 @@ document.addEventListener('DOMContentLoaded', function() {
     
     // Initialize auto-refresh for certain pages
     setupAutoRefresh();
+    
+    // Live booking and slot events
+    setupLiveEvents();
 });
 
 // Initialize Bootstrap tooltips
@@ -248,25 +251,55 @@ function setupAutoRefresh() {
         const interval = parseInt(element.getAttribute('data-auto-refresh')) * 1000;
         if (interval > 0) {
             setInterval(() => {
-                refreshElement(element);
+                // Nothing to see in a background tab
+                if (!document.hidden) {
+                    refreshElement(element);
+                }
             }, interval);
         }
     });
 }
 
-// Refresh element content
+// Refresh element content. With data-refresh-url the server sends just the
+// widget's HTML and answers 304 while it is unchanged; without one the whole
+// page is fetched and the matching element taken from it.
 function refreshElement(element) {
-    const url = element.getAttribute('data-refresh-url') || window.location.href;
+    const fragmentUrl = element.getAttribute('data-refresh-url');
+    const headers = {
+        'X-Requested-With': 'XMLHttpRequest'
+    };
+    if (fragmentUrl && element.dataset.etag) {
+        headers['If-None-Match'] = element.dataset.etag;
+    }
     
-    fetch(url, {
-        headers: {
-            'X-Requested-With': 'XMLHttpRequest'
+    fetch(fragmentUrl || window.location.href, {
+        headers: headers,
+        cache: 'no-store'
+    })
+    .then(response => {
+        if (response.status === 304) {
+            return null;
+        }
+        if (response.redirected) {
+            // Signed out in the meantime
+            window.location.href = response.url;
+            return null;
+        }
+        if (fragmentUrl) {
+            element.dataset.etag = response.headers.get('ETag') || '';
         }
+        return response.text();
     })
-    .then(response => response.text())
     .then(html => {
+        if (html === null) {
+            return;
+        }
+        if (fragmentUrl) {
+            element.innerHTML = html;
+            return;
+        }
         const parser = new DOMParser();
-        const doc = parser.parseFromEntries(html, 'text/html');
+        const doc = parser.parseFromString(html, 'text/html');
         const newContent = doc.querySelector(`[data-auto-refresh="${element.getAttribute('data-auto-refresh')}"]`);
         
         if (newContent) {
@@ -278,6 +311,51 @@ function refreshElement(element) {
     });
 }
 
+// Live events: an element with data-events-url follows that /events
+// stream. Slots on the page (data-slot-id) are greyed out or reopened as
+// they are booked, cancelled or toggled; any other change to what an
+// element with data-events-notice shows offers a reload.
+function setupLiveEvents() {
+    if (!window.EventSource) {
+        return;
+    }
+    
+    document.querySelectorAll('[data-events-url]').forEach(element => {
+        const source = new EventSource(element.getAttribute('data-events-url'));
+        ['booked', 'cancelled', 'completed', 'slot'].forEach(kind => {
+            source.addEventListener(kind, event => {
+                applyLiveEvent(element, JSON.parse(event.data));
+            });
+        });
+        // Sent when the page fell too far behind to patch up
+        source.addEventListener('reset', () => {
+            source.close();
+            showStaleNotice(element);
+        });
+    });
+}
+
+function applyLiveEvent(element, data) {
+    const slot = element.querySelector(`[data-slot-id="${data.time_slot_id}"]`);
+    if (slot) {
+        slot.classList.toggle('disabled', !data.available);
+        slot.setAttribute('aria-disabled', data.available ? 'false' : 'true');
+        return;
+    }
+    if (element.hasAttribute('data-events-notice')) {
+        showStaleNotice(element);
+    }
+}
+
+function showStaleNotice(element) {
+    if (element.dataset.stale) {
+        return;
+    }
+    element.dataset.stale = 'true';
+    const message = element.getAttribute('data-events-notice') || 'This page has changed.';
+    showNotification(`${message} <a href="javascript:location.reload()" class="alert-link">Reload</a>`, 'info', 0);
+}
+
 // AJAX error handling
 function setupAjaxErrorHandling() {
     // Global error handler for fetch requests
@@ -285,7 +363,8 @@ function setupAjaxErrorHandling() {
     window.fetch = function(...args) {
         return originalFetch.apply(this, args)
             .then(response => {
-                if (!response.ok) {
+                // 304 answers a conditional request (see refreshElement)
+                if (!response.ok && response.status !== 304) {
                     throw new Error(`HTTP ${response.status}: ${response.statusText}`);
                 }
                 return response;
@@ -317,12 +396,14 @@ function showNotification(message, type = 'info', duration = 5000) {
     
     document.body.appendChild(notification);
     
-    // Auto-remove after duration
-    setTimeout(() => {
-        if (notification.parentNode) {
-            notification.remove();
-        }
-    }, duration);
+    // Auto-remove after duration (0 keeps it until dismissed)
+    if (duration > 0) {
+        setTimeout(() => {
+            if (notification.parentNode) {
+                notification.remove();
+            }
+        }, duration);
+    }
     
     return notification;
 }